@@ -0,0 +1,218 @@
+"""
+Packet encode/decode microbenchmark, run from the repo root with:
+    PYTHONPATH=src python benchmarks/packet_bench.py
+It mimics the per-packet work of the acceptor (decode, protocol and
+handshake checks) and of GoBackN (build and encode data packets and ACKs,
+check the flags of the ACKs received). Each one is also run on
+BaselinePacket, the representation Packet had before, to compare.
+"""
+
+import argparse
+import struct
+import time
+from typing import Callable, List, NamedTuple
+
+from lib.common.skt.packet import (
+    HEADER_PACK_FORMAT,
+    HEADER_SIZE,
+    MAX_SEQ_NUM,
+    HeaderFlags,
+    HeaderMasks,
+    Packet,
+    payload_buffer,
+    payload_view,
+)
+
+PAYLOAD: bytes = bytes(1000)
+
+
+class HeaderData(NamedTuple):
+    flags: int
+    length: int
+    seq_num: int
+    ack_num: int
+
+
+class BaselinePacket:
+    """
+    Packet before the slotted representation: a HeaderData NamedTuple plus
+    an instance __dict__, flags tested through Enum lookups (and an Enum
+    constructor call for the protocol), the header packed with struct.pack
+    and concatenated with the payload, payloads copied out of datagrams.
+    """
+
+    @classmethod
+    def from_bytes(cls, packet: bytes) -> "BaselinePacket":
+        flags_and_length, seq_num, ack_num = struct.unpack(
+            HEADER_PACK_FORMAT, packet[:HEADER_SIZE]
+        )
+        flags = flags_and_length & (~HeaderMasks.LEN.value)
+        length = flags_and_length & HeaderMasks.LEN.value
+        return cls(seq_num, ack_num, packet[HEADER_SIZE:], flags, length)
+
+    def __init__(
+        self,
+        seq_num: int = 0,
+        ack_num: int = 0,
+        data: bytes = b"",
+        flags: int = 0,
+        length: int = 0,
+    ) -> None:
+        self.header_data = HeaderData(
+            flags=flags,
+            length=length if length else len(data),
+            seq_num=seq_num,
+            ack_num=ack_num,
+        )
+        self.data = data
+
+    def to_bytes(self) -> bytes:
+        packed_header = struct.pack(
+            HEADER_PACK_FORMAT,
+            self.header_data.flags | len(self.data),
+            self.header_data.seq_num,
+            self.header_data.ack_num,
+        )
+        return packed_header + self.data
+
+    def is_syn(self) -> bool:
+        return bool(self.header_data.flags & HeaderMasks.SYN.value)
+
+    def is_fin(self) -> bool:
+        return bool(self.header_data.flags & HeaderMasks.FIN.value)
+
+    def is_ack(self) -> bool:
+        return bool(self.header_data.flags & HeaderMasks.ACK.value)
+
+    def get_protocol_type(self) -> HeaderFlags:
+        return HeaderFlags(self.header_data.flags & HeaderMasks.PROTOCOLTYPE.value)
+
+    def get_ack_num(self) -> int:
+        return self.header_data.ack_num
+
+    def get_window(self) -> int:
+        return self.header_data.seq_num
+
+
+def bench_decode(datagrams: List[bytes]) -> None:
+    # AcceptorSocket.accept / _dispatch
+    for datagram in datagrams:
+        pkt = Packet.from_bytes(datagram)
+        if pkt.get_protocol_type() != HeaderFlags.GBN:
+            raise ValueError("Unexpected protocol")
+        if pkt.is_syn() or pkt.is_fin():
+            raise ValueError("Unexpected flags")
+
+
+def bench_encode(count: int) -> None:
+    # Protocol._read_data_packet and ConnectionSocket.send_batch
+    flags = HeaderFlags.GBN.value | HeaderFlags.UPLOAD.value
+    for i in range(count):
+        buffer = payload_buffer(len(PAYLOAD))
+        payload_view(buffer)[:] = PAYLOAD
+        Packet.from_payload_buffer(
+            buffer, len(PAYLOAD), seq_num=i % MAX_SEQ_NUM, flags=flags
+        ).to_buffer()
+
+
+def bench_acks(acks: List[bytes]) -> None:
+    # GoBackN._process_acks
+    for datagram in acks:
+        pkt = Packet.from_bytes(datagram)
+        if pkt.is_fin() or not pkt.is_ack():
+            raise ValueError("Unexpected flags")
+        pkt.get_ack_num()
+        pkt.get_window()
+
+
+def baseline_decode(datagrams: List[bytes]) -> None:
+    for datagram in datagrams:
+        pkt = BaselinePacket.from_bytes(datagram)
+        if pkt.get_protocol_type() != HeaderFlags.GBN:
+            raise ValueError("Unexpected protocol")
+        if pkt.is_syn() or pkt.is_fin():
+            raise ValueError("Unexpected flags")
+
+
+def baseline_encode(count: int) -> None:
+    # Each chunk was read into bytes of its own (copied once, as read()
+    # does), then concatenated behind its header
+    flags = HeaderFlags.GBN.value | HeaderFlags.UPLOAD.value
+    for i in range(count):
+        chunk = bytes(memoryview(PAYLOAD))
+        BaselinePacket(seq_num=i % MAX_SEQ_NUM, data=chunk, flags=flags).to_bytes()
+
+
+def baseline_acks(acks: List[bytes]) -> None:
+    for datagram in acks:
+        pkt = BaselinePacket.from_bytes(datagram)
+        if pkt.is_fin() or not pkt.is_ack():
+            raise ValueError("Unexpected flags")
+        pkt.get_ack_num()
+        pkt.get_window()
+
+
+def run(
+    name: str,
+    count: int,
+    func: Callable[[], None],
+    baseline: Callable[[], None],
+    repeat: int,
+) -> None:
+    best = min(_timed(func) for _ in range(repeat))
+    baseline_best = min(_timed(baseline) for _ in range(repeat))
+    print(
+        f"{name:<8} {count / baseline_best:>12,.0f} {count / best:>12,.0f}"
+        f" {baseline_best / best:>7.2f}x"
+    )
+
+
+def _timed(func: Callable[[], None]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Packet microbenchmark")
+    parser.add_argument("-n", "--count", type=int, default=200_000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data_flags = HeaderFlags.GBN.value | HeaderFlags.UPLOAD.value
+    ack_flags = data_flags | HeaderFlags.ACK.value
+    datagrams = [
+        Packet(seq_num=i % MAX_SEQ_NUM, data=PAYLOAD, flags=data_flags).to_bytes()
+        for i in range(args.count)
+    ]
+    acks = [
+        Packet(seq_num=256, ack_num=i % MAX_SEQ_NUM, flags=ack_flags).to_bytes()
+        for i in range(args.count)
+    ]
+
+    print(f"{'packets/s':<8} {'baseline':>12} {'current':>12} {'speedup':>8}")
+    run(
+        "decode",
+        args.count,
+        lambda: bench_decode(datagrams),
+        lambda: baseline_decode(datagrams),
+        args.repeat,
+    )
+    run(
+        "encode",
+        args.count,
+        lambda: bench_encode(args.count),
+        lambda: baseline_encode(args.count),
+        args.repeat,
+    )
+    run(
+        "acks",
+        args.count,
+        lambda: bench_acks(acks),
+        lambda: baseline_acks(acks),
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()
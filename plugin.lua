@@ -11,7 +11,8 @@ local fields = {
     ProtoField.uint16("fiuba_atp.length", "Length", base.DEC, nil, 0x03FF),
     ProtoField.uint16("fiuba_atp.seq_num", "Sequence Number", base.DEC),
     ProtoField.uint16("fiuba_atp.ack_num", "ACK Number", base.DEC),
-    ProtoField.string("fiuba_atp.data", "Data", base.STRING)
+    ProtoField.string("fiuba_atp.data", "Data", base.STRING),
+    ProtoField.uint16("fiuba_atp.ext_length", "Extended Length", base.DEC)
 }
 
 my_protocol.fields = fields
@@ -23,13 +24,20 @@ function my_protocol.dissector(tvbuf, pinfo, tree)
     end
 
     local data_length = bit.band(tvbuf(0, 2):uint(), 0x03FF)
-    local total_length = 6 + data_length
-
-    if data_length > 1024 then
-        pinfo.cols.info:set(string.format("Longitud inválida: %d (>1024)", data_length))
-        return {}
+    local header_length = 6
+
+    -- Longitud extendida: todos los bits de LEN en 1, la longitud real sigue al header
+    if data_length == 0x03FF then
+        if tvbuf:len() < 8 then
+            pinfo.cols.info:set("Paquete demasiado corto")
+            return {}
+        end
+        data_length = tvbuf(6, 2):uint()
+        header_length = 8
     end
 
+    local total_length = header_length + data_length
+
     if tvbuf:len() < total_length then
         pinfo.cols.info:set(string.format("Truncado (esperados %d bytes)", total_length))
         return {}
@@ -46,12 +54,16 @@ function my_protocol.dissector(tvbuf, pinfo, tree)
     flags_subtree:add(fields[4], tvbuf(0, 2)) -- FIN
     flags_subtree:add(fields[5], tvbuf(0, 2)) -- ACK
 
-    subtree:add(fields[6], tvbuf(0, 2))       -- Length
+    if header_length == 8 then
+        subtree:add(fields[10], tvbuf(6, 2))  -- Extended Length
+    else
+        subtree:add(fields[6], tvbuf(0, 2))   -- Length
+    end
     subtree:add(fields[7], tvbuf(2, 2))       -- Seq Num
     subtree:add(fields[8], tvbuf(4, 2))       -- ACK Num
 
     if data_length > 0 then
-        local data = tvbuf(6, data_length)
+        local data = tvbuf(header_length, data_length)
         subtree:add(fields[9], data)
     end
 
@@ -62,9 +74,11 @@ function my_protocol.dissector(tvbuf, pinfo, tree)
         protocol_name = "SW"
     elseif protocol_byte == 1 then
         protocol_name = "GBN"
+    elseif protocol_byte == 2 then
+        protocol_name = "SR"
     end
 
-    local len = bit.band(flags_and_length, 0x03FF)
+    local len = data_length
     local seq = tvbuf(2, 2):uint()
     local ack = tvbuf(4, 2):uint()
 
@@ -97,10 +111,6 @@ local function heuristic(buf, pkt, root)
         return false
     end
 
-    if ret["data_length"] > 1024 then
-        return false
-    end
-
     if ret["flow"]["dst_port"] == 2357 then
         conversation[ret["flow"]["src_port"]] = true
         return true
@@ -1,3 +1,5 @@
+import sys
+
 from lib.client.client import Client
 from lib.common.args_parser import ArgsParser
 from lib.common.timer import timer
@@ -12,7 +14,8 @@ def download() -> None:
         include_filename=True,
     )
     client = Client(args_parser.get_arguments(), "download")
-    client.run()
+    if not client.run():
+        sys.exit(1)
     print(f"[DOWNLOAD] successfully downloaded {args_parser.get_arguments().name}.")
 
 
@@ -1,10 +1,22 @@
 import asyncio
+import os
+import secrets
+import tempfile
 from argparse import Namespace
 
 from lib.common.config import Config
+from lib.common.file_ops.batch import BATCH_FILE, extract_batch, write_batch
+from lib.common.file_ops.delta import DELTA_FILE, SIGNATURES_FILE, write_delta
+from lib.common.file_ops.stripes import (
+    SIZE_FILE,
+    read_size,
+    remove_staging,
+    staging_name,
+)
 from lib.common.logger import Logger
 from lib.common.protocol.protocol import Protocol
 from lib.common.skt.connection_socket import ConnectionSocket
+from lib.common.skt.packet import Codec, FileRequest, HeaderFlags
 
 
 class Client:
@@ -14,7 +26,10 @@ class Client:
             self.config.verbose, self.config.quiet, self.config.log_file
         )
 
-    def run(self) -> None:
+    def run(self) -> bool:
+        """
+        Returns whether the transfer completed.
+        """
         self.logger.debug(
             "Starting client with the following parameters:\n"
             f"Host: {self.config.host}\n"
@@ -28,9 +43,10 @@ class Client:
 
         loop = asyncio.get_event_loop()
 
+        completed = False
         try:
-            loop.run_until_complete(self.start_client())
-        except (KeyboardInterrupt, TimeoutError) as e:
+            completed = loop.run_until_complete(self.start_client())
+        except (KeyboardInterrupt, TimeoutError, ValueError) as e:
             if str(e) != "":
                 self.logger.error(str(e))
             self.logger.info("[Client] Stopping client...")
@@ -43,17 +59,153 @@ class Client:
         finally:
             loop.run_until_complete(loop.shutdown_asyncgens())
             loop.close()
+        return completed
 
-    async def start_client(self) -> None:
+    async def start_client(self) -> bool:
+        if self.config.delta:
+            return await self._upload_delta()
+        if self.config.streams > 1:
+            return await self._transfer_striped()
+        if self.config.recursive:
+            return await self._transfer_batch()
+        protocol = await self._connect()
+        if not await protocol.initiate_transaction():
+            self.logger.error("[Client] Server refused the transfer")
+            return False
+        return True
+
+    async def _upload_delta(self) -> bool:
+        """
+        Uploads only what the server's copy of the file lacks, over two
+        connections: the first downloads the signatures of its blocks, the
+        second uploads the delta the server rebuilds the file from.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            protocol = await self._connect()
+            if not await protocol.request_file(
+                FileRequest.SIGNATURES, tmp_dir, SIGNATURES_FILE
+            ):
+                self.logger.error("[Client] Server refused the signatures request")
+                return False
+
+            reused, sent = await asyncio.get_running_loop().run_in_executor(
+                None,
+                write_delta,
+                os.path.join(self.config.client_dst, self.config.client_filename),
+                os.path.join(tmp_dir, SIGNATURES_FILE),
+                os.path.join(tmp_dir, DELTA_FILE),
+            )
+            self.logger.info(
+                f"[Client] Delta reuses {reused} bytes of the server's copy, "
+                f"sending {sent}"
+            )
+
+            protocol = await self._connect()
+            if not await protocol.request_file(FileRequest.DELTA, tmp_dir, DELTA_FILE):
+                self.logger.error("[Client] Server refused the delta")
+                return False
+            return True
+
+    async def _transfer_striped(self) -> bool:
+        """
+        Transfers the file as config.streams byte ranges (stripes), each on
+        its own connection, all at once. Downloads ask for the size of the
+        file first, on a connection of its own.
+        """
+        filepath = os.path.join(self.config.client_dst, self.config.client_filename)
+        if self.config.client_mode == HeaderFlags.UPLOAD:
+            size = os.path.getsize(filepath)
+        else:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                protocol = await self._connect()
+                if not await protocol.request_file(
+                    FileRequest.SIZE, tmp_dir, SIZE_FILE
+                ):
+                    self.logger.error("[Client] Server refused the size request")
+                    return False
+                size = read_size(os.path.join(tmp_dir, SIZE_FILE))
+
+        transfer_id = secrets.randbits(64)
+        count = self.config.streams
+        protocols = await asyncio.gather(*(self._connect() for _ in range(count)))
+        completed = False
+        try:
+            results = await asyncio.gather(
+                *(
+                    protocol.transfer_stripe((index, count, size, transfer_id))
+                    for index, protocol in enumerate(protocols)
+                )
+            )
+            completed = all(results)
+        finally:
+            if not completed and self.config.client_mode == HeaderFlags.DOWNLOAD:
+                remove_staging(
+                    os.path.join(
+                        self.config.client_dst,
+                        staging_name(self.config.client_filename, transfer_id),
+                    )
+                )
+        if not completed:
+            self.logger.error("[Client] Server refused a stripe of the file")
+        return completed
+
+    async def _transfer_batch(self) -> bool:
+        """
+        Transfers the files under the directory config.client_filename as a
+        single batch (see file_ops.batch), over one connection.
+        """
+        loop = asyncio.get_running_loop()
+        dir_path = os.path.join(self.config.client_dst, self.config.client_filename)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            batch_path = os.path.join(tmp_dir, BATCH_FILE)
+            if self.config.client_mode == HeaderFlags.UPLOAD:
+                try:
+                    count = await loop.run_in_executor(
+                        None, write_batch, dir_path, batch_path
+                    )
+                except (FileNotFoundError, ValueError) as e:
+                    self.logger.error(f"[Client] {e}")
+                    return False
+                protocol = await self._connect()
+                if not await protocol.request_file(
+                    FileRequest.BATCH, tmp_dir, BATCH_FILE
+                ):
+                    self.logger.error("[Client] Server refused the batch")
+                    return False
+                self.logger.info(f"[Client] Uploaded {count} files")
+                return True
+
+            protocol = await self._connect()
+            if not await protocol.request_file(FileRequest.BATCH, tmp_dir, BATCH_FILE):
+                self.logger.error("[Client] Server refused the batch request")
+                return False
+            count = await loop.run_in_executor(
+                None, extract_batch, batch_path, dir_path
+            )
+            self.logger.info(f"[Client] Downloaded {count} files")
+            return True
+
+    async def _connect(self) -> Protocol:
         if not self.config.quiet:
             self.logger.info(
                 f"[Client] Connecting to {self.config.host}:{self.config.port}"
             )
 
         connection_skt = ConnectionSocket.for_client(
-            (self.config.host, self.config.port), self.config.protocol_type, self.logger
+            (self.config.host, self.config.port),
+            self.config.protocol_type,
+            self.logger,
+            self.config.mss,
+            self.config.io_backend,
+            self.config.checksum,
+            (
+                None
+                if self.config.compression == Codec.NONE
+                else (self.config.compression, self.config.compression_level)
+            ),
         )
-        await connection_skt.connect()
+        if not self.config.fast_open:
+            # Otherwise the protocol connects with its request in the SYN
+            await connection_skt.connect(self.config.pmtu_discovery)
 
-        protocol = Protocol.from_connection(connection_skt, self.config, self.logger)
-        await protocol.initiate_transaction()
+        return Protocol.from_connection(connection_skt, self.config, self.logger)
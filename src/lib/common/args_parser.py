@@ -1,6 +1,9 @@
 import argparse
 from typing import Any, List, Mapping, Tuple
 
+from lib.common.file_ops.compression import DEFAULT_LEVEL
+from lib.common.protocol.rtt_estimator import INITIAL_RTO, MAX_RTO, MIN_RTO
+
 
 class ArgsParser:
     def __init__(
@@ -49,6 +52,76 @@ class ArgsParser:
                     "help": "error recovery protocol",
                 },
             ),
+            (
+                ["--mss"],
+                {
+                    "type": int,
+                    "default": 1464,
+                    "metavar": "",
+                    "help": "maximum segment size in bytes (negotiated on connect)",
+                },
+            ),
+            (
+                ["--congestion-control"],
+                {
+                    "type": str,
+                    "default": "reno",
+                    "metavar": "",
+                    "help": "congestion control algorithm (reno | cubic)",
+                },
+            ),
+            (
+                ["--initial-rto"],
+                {
+                    "type": float,
+                    "default": INITIAL_RTO,
+                    "metavar": "",
+                    "help": "retransmission timeout before any RTT sample, in seconds",
+                },
+            ),
+            (
+                ["--min-rto"],
+                {
+                    "type": float,
+                    "default": MIN_RTO,
+                    "metavar": "",
+                    "help": "lowest retransmission timeout, in seconds",
+                },
+            ),
+            (
+                ["--max-rto"],
+                {
+                    "type": float,
+                    "default": MAX_RTO,
+                    "metavar": "",
+                    "help": "highest retransmission timeout (backoff), in seconds",
+                },
+            ),
+            (
+                ["--io-backend"],
+                {
+                    "type": str,
+                    "default": "socket",
+                    "metavar": "",
+                    "help": "datagram I/O backend (socket | transport)",
+                },
+            ),
+            (
+                ["--mmap"],
+                {
+                    "action": "store_true",
+                    "help": "memory-map transferred files",
+                },
+            ),
+            (
+                ["--read-ahead"],
+                {
+                    "type": int,
+                    "default": 32,
+                    "metavar": "",
+                    "help": "chunks read ahead of the sender (0 reads inline)",
+                },
+            ),
             (
                 ["--log-file"],
                 {
@@ -71,6 +144,26 @@ class ArgsParser:
                     },
                 )
             )
+            common_args.append(
+                (
+                    ["--no-shared-socket"],
+                    {
+                        "action": "store_true",
+                        "help": "give each server connection its own socket",
+                    },
+                )
+            )
+            common_args.append(
+                (
+                    ["--workers"],
+                    {
+                        "type": int,
+                        "default": 1,
+                        "metavar": "",
+                        "help": "server processes sharing the port",
+                    },
+                )
+            )
         if self.include_destination:
             common_args.append(
                 (
@@ -95,6 +188,82 @@ class ArgsParser:
                     },
                 )
             )
+            common_args.extend(
+                [
+                    (
+                        ["--no-pmtu-discovery"],
+                        {
+                            "action": "store_true",
+                            "help": "do not probe the path MTU before connecting",
+                        },
+                    ),
+                    (
+                        ["--resume"],
+                        {
+                            "action": "store_true",
+                            "help": (
+                                "resume an interrupted --resume transfer of the"
+                                " same file, or keep this one to be resumed"
+                            ),
+                        },
+                    ),
+                    (
+                        ["--checksum"],
+                        {
+                            "action": "store_true",
+                            "help": "checksum every packet and verify the whole file",
+                        },
+                    ),
+                    (
+                        ["--compression"],
+                        {
+                            "type": str,
+                            "default": "none",
+                            "metavar": "",
+                            "help": "compress on the fly (none | zlib | lzma)",
+                        },
+                    ),
+                    (
+                        ["--compression-level"],
+                        {
+                            "type": int,
+                            "default": DEFAULT_LEVEL,
+                            "metavar": "",
+                            "help": "compression level, 0 (fastest) to 9 (smallest)",
+                        },
+                    ),
+                    (
+                        ["--fast-open"],
+                        {
+                            "action": "store_true",
+                            "help": "send the request in the SYN, saving a round trip",
+                        },
+                    ),
+                    (
+                        ["--streams"],
+                        {
+                            "type": int,
+                            "default": 1,
+                            "metavar": "",
+                            "help": "connections a file is striped across",
+                        },
+                    ),
+                    (
+                        ["--delta"],
+                        {
+                            "action": "store_true",
+                            "help": "upload only the blocks the server's copy lacks",
+                        },
+                    ),
+                    (
+                        ["--recursive"],
+                        {
+                            "action": "store_true",
+                            "help": "transfer the files under the directory NAME",
+                        },
+                    ),
+                ]
+            )
 
         for flags, options in common_args:
             self.parser.add_argument(*flags, **options)
@@ -1,11 +1,26 @@
 import os
 from argparse import Namespace
+from typing import Tuple, Type
 
-from lib.common.skt.packet import HeaderFlags
+from lib.common.file_ops.compression import MAX_LEVEL
+from lib.common.protocol.congestion_control import (
+    CongestionControl,
+    congestion_control_mapping,
+)
+from lib.common.skt.packet import (
+    MAX_SEGMENT_SIZE,
+    MAX_STRIPES,
+    MIN_SEGMENT_SIZE,
+    Codec,
+    HeaderFlags,
+)
+from lib.common.skt.udp_socket import UDPSocket
+from lib.common.skt.udp_transport import io_backend_mapping
 
 protocol_mapping = {
     "SW": HeaderFlags.SW,
     "GBN": HeaderFlags.GBN,
+    "SR": HeaderFlags.SR,
 }
 
 mode_mapping = {
@@ -13,6 +28,12 @@ mode_mapping = {
     "download": HeaderFlags.DOWNLOAD,
 }
 
+compression_mapping = {
+    "none": Codec.NONE,
+    "zlib": Codec.ZLIB,
+    "lzma": Codec.LZMA,
+}
+
 
 class Config:
     def __init__(
@@ -28,12 +49,22 @@ class Config:
         self.verbose: bool = args.verbose
         self.quiet: bool = args.quiet
         self.log_file: str = args.log_file
+        self.congestion_control = self._map_congestion_control(args.congestion_control)
+        self.mss: int = self._validate_mss(args.mss)
+        self.initial_rto, self.min_rto, self.max_rto = self._validate_rto(
+            args.initial_rto, args.min_rto, args.max_rto
+        )
+        self.io_backend: Type[UDPSocket] = self._map_io_backend(args.io_backend)
+        self.mmap: bool = args.mmap
+        self.read_ahead: int = self._validate_read_ahead(args.read_ahead)
 
         storage: str = ""
 
         # Server only
         if server:
             self.server_dirpath: str = args.storage
+            self.shared_socket: bool = not args.no_shared_socket
+            self.workers: int = self._validate_workers(args.workers)
             storage = self.server_dirpath
 
         # Client only
@@ -41,6 +72,17 @@ class Config:
             self.client_dst: str = args.dst
             self.client_filename: str = args.name
             self.client_mode: HeaderFlags = self._map_mode(client_mode)
+            self.pmtu_discovery: bool = not args.no_pmtu_discovery
+            self.resume: bool = args.resume
+            self.checksum: bool = args.checksum
+            self.compression: Codec = self._map_compression(args.compression)
+            self.compression_level: int = self._validate_compression_level(
+                args.compression_level
+            )
+            self.fast_open: bool = self._validate_fast_open(args.fast_open)
+            self.delta: bool = self._validate_delta(args.delta)
+            self.streams: int = self._validate_streams(args.streams)
+            self.recursive: bool = self._validate_recursive(args.recursive)
             storage = self.client_dst
 
         # Create the directory if it doesn't exist
@@ -56,3 +98,72 @@ class Config:
         if mode not in mode_mapping:
             raise ValueError(f"Invalid mode: {mode}")
         return mode_mapping[mode]
+
+    def _map_congestion_control(self, algorithm: str) -> Type[CongestionControl]:
+        if algorithm not in congestion_control_mapping:
+            raise ValueError(f"Invalid congestion control algorithm: {algorithm}")
+        return congestion_control_mapping[algorithm]
+
+    def _map_io_backend(self, backend: str) -> Type[UDPSocket]:
+        if backend not in io_backend_mapping:
+            raise ValueError(f"Invalid I/O backend: {backend}")
+        return io_backend_mapping[backend]
+
+    def _map_compression(self, codec: str) -> Codec:
+        if codec not in compression_mapping:
+            raise ValueError(f"Invalid compression codec: {codec}")
+        return compression_mapping[codec]
+
+    def _validate_compression_level(self, level: int) -> int:
+        if not 0 <= level <= MAX_LEVEL:
+            raise ValueError(f"Invalid compression level: {level}")
+        return level
+
+    def _validate_fast_open(self, fast_open: bool) -> bool:
+        if fast_open and self.resume:
+            # The server tells where a resumed transfer starts in its ACK
+            raise ValueError("Resumed transfers cannot use fast open")
+        return fast_open
+
+    def _validate_delta(self, delta: bool) -> bool:
+        if delta and self.client_mode != HeaderFlags.UPLOAD:
+            raise ValueError("Delta transfers are only supported for uploads")
+        return delta
+
+    def _validate_streams(self, streams: int) -> int:
+        if not 0 < streams <= MAX_STRIPES:
+            raise ValueError(f"Invalid number of streams: {streams}")
+        if streams > 1 and (self.resume or self.delta):
+            raise ValueError("Striped transfers cannot be resumed nor delta")
+        return streams
+
+    def _validate_recursive(self, recursive: bool) -> bool:
+        if recursive and (self.resume or self.delta or self.streams > 1):
+            raise ValueError("Batch transfers cannot be resumed, delta nor striped")
+        return recursive
+
+    def _validate_workers(self, workers: int) -> int:
+        if workers < 1:
+            raise ValueError(f"Invalid number of workers: {workers}")
+        return workers
+
+    def _validate_read_ahead(self, depth: int) -> int:
+        if depth < 0:
+            raise ValueError(f"Invalid read-ahead depth: {depth}")
+        return depth
+
+    def _validate_rto(
+        self, initial: float, low: float, high: float
+    ) -> Tuple[float, float, float]:
+        if not 0 < low <= high or not 0 < initial <= high:
+            raise ValueError(
+                f"Invalid RTO bounds: initial {initial}, min {low}, max {high}"
+            )
+        return initial, low, high
+
+    def _validate_mss(self, mss: int) -> int:
+        if not MIN_SEGMENT_SIZE <= mss <= MAX_SEGMENT_SIZE:
+            raise ValueError(
+                f"Invalid MSS: {mss} (must be {MIN_SEGMENT_SIZE}-{MAX_SEGMENT_SIZE})"
+            )
+        return mss
@@ -0,0 +1,115 @@
+import errno
+import os
+import struct
+from typing import BinaryIO, List
+
+from lib.common.file_ops.file_manager import create_temp_file
+
+# Batch transfers: the files under a directory go as a single stream over
+# one connection, each one as its path (relative to the directory, with
+# "/" separators), its size and its content. An empty path ends the batch.
+BATCH_FILE = "batch"
+ENTRY_FORMAT = "!HQ"  # Length of the path and size of the file that follow
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+
+# Piece copied at a time between the batch and the files
+COPY_CHUNK = 1 << 20
+
+
+def list_files(root_dir: str) -> List[str]:
+    """
+    Paths of the files under root_dir, relative to it. Hidden files and
+    directories are skipped, partial and staging files are hidden. So are
+    symbolic links, which could point out of root_dir.
+    """
+    paths: List[str] = []
+    for dir_path, dir_names, file_names in os.walk(root_dir):
+        dir_names[:] = sorted(name for name in dir_names if not name.startswith("."))
+        relative = os.path.relpath(dir_path, root_dir)
+        for name in sorted(file_names):
+            if name.startswith(".") or os.path.islink(os.path.join(dir_path, name)):
+                continue
+            path = name if relative == os.curdir else os.path.join(relative, name)
+            paths.append(path.replace(os.sep, "/"))
+    return paths
+
+
+def write_batch(root_dir: str, batch_path: str) -> int:
+    """
+    Writes the batch of the files under root_dir, returns how many there
+    are. Raises FileNotFoundError if root_dir is not a directory, or
+    ValueError if a file is truncated or replaced by a symbolic link while
+    being written.
+    """
+    if not os.path.isdir(root_dir):
+        raise FileNotFoundError(f"Directory {root_dir} not found.")
+    paths = list_files(root_dir)
+    with open(batch_path, "wb") as out:
+        for path in paths:
+            name = path.encode()
+            with _open_regular(os.path.join(root_dir, path)) as f:
+                size = os.fstat(f.fileno()).st_size
+                out.write(struct.pack(ENTRY_FORMAT, len(name), size) + name)
+                try:
+                    _copy_exact(f, out, size)
+                except ValueError:
+                    raise ValueError(f"{path} changed while being sent") from None
+        out.write(struct.pack(ENTRY_FORMAT, 0, 0))
+    return len(paths)
+
+
+def extract_batch(batch_path: str, root_dir: str) -> int:
+    """
+    Stores the files of a batch under root_dir, each one replaced only once
+    it is complete. Returns how many there were, raises ValueError if the
+    batch is malformed or a path leaves root_dir.
+    """
+    count = 0
+    with open(batch_path, "rb") as batch:
+        while True:
+            entry = batch.read(ENTRY_SIZE)
+            if len(entry) != ENTRY_SIZE:
+                raise ValueError("Unexpected end of batch")
+            name_length, size = struct.unpack(ENTRY_FORMAT, entry)
+            if not name_length:
+                return count
+            filepath = os.path.join(root_dir, _validate_path(batch.read(name_length)))
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            fd, tmp_path = create_temp_file(
+                os.path.dirname(filepath), f".{os.path.basename(filepath)}.", ".part"
+            )
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    _copy_exact(batch, out, size)
+                os.replace(tmp_path, filepath)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            count += 1
+
+
+def _validate_path(name: bytes) -> str:
+    path = name.decode()
+    parts = path.split("/")
+    if path.startswith("/") or any(part in ("", ".", "..") for part in parts):
+        raise ValueError(f"Invalid path in batch: {path!r}")
+    return os.path.join(*parts)
+
+
+def _open_regular(path: str) -> BinaryIO:
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW)
+    except OSError as e:
+        if e.errno != errno.ELOOP:
+            raise
+        raise ValueError(f"{path} is a symbolic link") from None
+    return os.fdopen(fd, "rb")
+
+
+def _copy_exact(source: BinaryIO, out: BinaryIO, size: int) -> None:
+    while size:
+        chunk = source.read(min(size, COPY_CHUNK))
+        if not chunk:
+            raise ValueError("Unexpected end of batch")
+        out.write(chunk)
+        size -= len(chunk)
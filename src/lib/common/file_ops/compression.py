@@ -0,0 +1,134 @@
+import lzma
+import zlib
+from typing import Callable, Iterator
+
+from lib.common.skt.packet import Codec
+
+# Streaming compression of the transferred data: the sender compresses the
+# chunks it reads from the file and slices the stream into packets, the
+# receiver decompresses what it gets before writing it. The stream starts
+# with a byte telling its codec, NONE when the data is sent as it is.
+
+# Before compressing, a sample of the data is: it is sent as it is unless
+# it shrinks by at least MIN_SAVING (already compressed media, archives)
+SAMPLE_SIZE = 64 << 10
+MIN_SAVING = 0.1
+
+DEFAULT_LEVEL = 6
+MAX_LEVEL = 9
+
+# Largest piece a packet is decompressed into at once, however much it
+# expands (highly compressible data, or a decompression bomb)
+MAX_OUTPUT = 1 << 20
+
+
+class Compressor:
+    def __init__(
+        self, source: Callable[[], bytes | memoryview], codec: Codec, level: int
+    ) -> None:
+        """
+        Compressed stream of the chunks returned by source, b"" at its end.
+        """
+        self.source = source
+        self.compressor = _compressor(codec, level)
+        # Compressed bytes not yet read
+        self.pending = bytearray([codec.value])
+        self.eof: bool = False
+
+    def read_into(self, buffer: memoryview) -> int:
+        """
+        Fills buffer with the next bytes of the stream, returns how many,
+        0 at its end.
+        """
+        while len(self.pending) < len(buffer) and not self.eof:
+            chunk = self.source()
+            self.eof = not chunk
+            if self.compressor is None:
+                self.pending += chunk
+            elif self.eof:
+                self.pending += self.compressor.flush()
+            else:
+                self.pending += self.compressor.compress(chunk)
+        length = min(len(buffer), len(self.pending))
+        buffer[:length] = self.pending[:length]
+        del self.pending[:length]
+        return length
+
+
+class Decompressor:
+    """
+    Undoes Compressor, the codec is told by the stream.
+    """
+
+    def __init__(self) -> None:
+        self.codec: Codec | None = None
+        self.decompressor: zlib._Decompress | lzma.LZMADecompressor | None = None
+
+    def decompress(self, data: bytes | memoryview) -> Iterator[bytes | memoryview]:
+        """
+        Yields the data of the next piece of the stream, at most MAX_OUTPUT
+        bytes at a time. Raises ValueError if it is corrupt.
+        """
+        try:
+            if self.codec is None and data:
+                self.codec = Codec(data[0])
+                self.decompressor = _decompressor(self.codec)
+                data = data[1:]
+            decompressor = self.decompressor
+            if decompressor is None:
+                yield data
+                return
+            while True:
+                out = decompressor.decompress(data, MAX_OUTPUT)
+                if out:
+                    yield out
+                if decompressor.eof:
+                    return
+                if isinstance(decompressor, lzma.LZMADecompressor):
+                    # Input it could not turn into output yet is kept inside
+                    data = b""
+                    if decompressor.needs_input:
+                        return
+                else:
+                    data = decompressor.unconsumed_tail
+                    if not data and len(out) < MAX_OUTPUT:
+                        return
+        except (zlib.error, lzma.LZMAError, EOFError) as e:
+            raise ValueError(f"Corrupt compressed data: {e}") from e
+
+    def is_done(self) -> bool:
+        """
+        Whether the whole stream was received.
+        """
+        if self.codec is None:
+            return False
+        return self.decompressor is None or self.decompressor.eof
+
+
+def is_compressible(sample: bytes, codec: Codec, level: int) -> bool:
+    compressor = _compressor(codec, level)
+    if not sample or compressor is None:
+        return False
+    size = len(compressor.compress(sample)) + len(compressor.flush())
+    return size <= len(sample) * (1 - MIN_SAVING)
+
+
+# The zlib object types only exist for type checkers
+def _compressor(
+    codec: Codec, level: int
+) -> "zlib._Compress | lzma.LZMACompressor | None":
+    if codec == Codec.ZLIB:
+        return zlib.compressobj(level)
+    if codec == Codec.LZMA:
+        return lzma.LZMACompressor(preset=level)
+    return None
+
+
+def _decompressor(
+    codec: Codec,
+) -> "zlib._Decompress | lzma.LZMADecompressor | None":
+    if codec == Codec.ZLIB:
+        return zlib.decompressobj()
+    if codec == Codec.LZMA:
+        return lzma.LZMADecompressor()
+    return None
@@ -0,0 +1,345 @@
+import contextlib
+import hashlib
+import math
+import mmap
+import os
+import struct
+from itertools import accumulate
+from typing import BinaryIO, ContextManager, Dict, List, Tuple
+
+from lib.common.file_ops.file_manager import create_temp_file
+
+# rsync-style delta uploads: the server describes the copy it has with one
+# signature per block, the client answers with the blocks of its file found
+# there (by index) and the bytes that are not, the server rebuilds the file.
+
+# Names of the signatures and delta files in the temporary directories
+SIGNATURES_FILE = "signatures"
+DELTA_FILE = "delta"
+
+# Block size, sqrt of the file size bounded to these (as rsync does)
+MIN_BLOCK_SIZE = 1024
+MAX_BLOCK_SIZE = 1 << 17
+
+# Signatures file: block size and file size, then per block the weak
+# (rolling) checksum and a prefix of its BLAKE2b digest
+SIGNATURES_HEADER_FORMAT = "!IQ"
+WEAK_FORMAT = "!I"
+STRONG_SIZE = 16
+
+# Delta file: block size, then operations until OP_END
+DELTA_HEADER_FORMAT = "!I"
+OP_COPY = b"C"  # First block and number of blocks of the server's copy
+OP_COPY_FORMAT = "!QI"
+OP_DATA = b"D"  # Length, followed by that many bytes
+OP_DATA_FORMAT = "!I"
+OP_END = b"E"  # Size and digest of the whole file, checked by the server
+OP_END_FORMAT = "!Q"
+FILE_DIGEST_SIZE = 32
+
+# Largest DATA operation and piece copied at a time when applying
+LITERAL_CHUNK = 1 << 20
+
+# Bytes the window rolls over (in Python, a byte at a time) without finding
+# a block, past them it only rolls over a block's worth of positions (every
+# shift of the blocks) in every ROLL_SKIP + 1 blocks, sending the rest as is
+MAX_ROLL = 1 << 19
+ROLL_SKIP = 16
+
+
+class Signatures:
+    def __init__(self, block_size: int, size: int) -> None:
+        self.block_size = block_size
+        self.size = size
+        self.weak: List[int] = []
+        self.strong: List[bytes] = []
+
+    def full_blocks(self) -> int:
+        return self.size // self.block_size
+
+
+def delta_block_size(size: int) -> int:
+    return min(MAX_BLOCK_SIZE, max(MIN_BLOCK_SIZE, math.isqrt(size) // 8 * 8))
+
+
+def write_signatures(basis_path: str, signatures_path: str) -> None:
+    """
+    Writes the signatures of basis_path, of no blocks if it does not exist.
+    """
+    size = os.path.getsize(basis_path) if os.path.isfile(basis_path) else 0
+    block_size = delta_block_size(size)
+    with open(signatures_path, "wb") as out:
+        out.write(struct.pack(SIGNATURES_HEADER_FORMAT, block_size, size))
+        if not size:
+            return
+        with open(basis_path, "rb") as basis:
+            while block := basis.read(block_size):
+                out.write(struct.pack(WEAK_FORMAT, _weak(block)) + _strong(block))
+
+
+def read_signatures(signatures_path: str) -> Signatures:
+    with open(signatures_path, "rb") as f:
+        block_size, size = struct.unpack(
+            SIGNATURES_HEADER_FORMAT,
+            _read_exact(f, struct.calcsize(SIGNATURES_HEADER_FORMAT)),
+        )
+        signatures = Signatures(block_size, size)
+        entry_size = struct.calcsize(WEAK_FORMAT) + STRONG_SIZE
+        for _ in range(math.ceil(size / block_size)):
+            entry = _read_exact(f, entry_size)
+            (weak,) = struct.unpack_from(WEAK_FORMAT, entry)
+            signatures.weak.append(weak)
+            signatures.strong.append(entry[-STRONG_SIZE:])
+    return signatures
+
+
+def write_delta(
+    source_path: str, signatures_path: str, delta_path: str
+) -> Tuple[int, int]:
+    """
+    Writes the delta that turns the file described by signatures_path into
+    source_path. Returns how many bytes it reuses and how many it carries.
+    """
+    signatures = read_signatures(signatures_path)
+    block_size = signatures.block_size
+    # Only whole blocks are looked up while rolling, a short last block can
+    # only match the end of the file
+    table: Dict[int, List[int]] = {}
+    for block in range(signatures.full_blocks()):
+        table.setdefault(signatures.weak[block], []).append(block)
+
+    with open(source_path, "rb") as source, open(delta_path, "wb") as out:
+        data = _map(source)
+        view = memoryview(data)
+        size = len(data)
+        writer = _DeltaWriter(out, block_size)
+        position = literal_start = 0
+        expected = 0
+        # Bytes rolled over since the last match
+        rolled = 0
+        while position + block_size <= size:
+            # Unchanged files match block after block, a single digest each
+            index: int | None = None
+            if expected < signatures.full_blocks() and (
+                _strong(view[position : position + block_size])
+                == signatures.strong[expected]
+            ):
+                index = expected
+            elif not table:
+                break
+            elif rolled < MAX_ROLL:
+                last = min(size - block_size, position + MAX_ROLL - rolled)
+                start = position
+                position, index = _roll(view, position, last, signatures, table)
+                rolled += position - start
+            else:
+                last = min(size - block_size, position + block_size - 1)
+                position, index = _roll(view, position, last, signatures, table)
+                if index is None:
+                    position += ROLL_SKIP * block_size
+            if index is None:
+                continue
+            writer.literal(view[literal_start:position])
+            writer.copy(index)
+            position += block_size
+            literal_start = position
+            expected = index + 1
+            rolled = 0
+
+        last = len(signatures.strong) - 1
+        tail = size - position
+        if (
+            0 < tail < block_size
+            and signatures.size - last * block_size == tail
+            and _strong(view[position:]) == signatures.strong[last]
+        ):
+            writer.literal(view[literal_start:position])
+            writer.copy(last)
+            literal_start = size
+        writer.literal(view[literal_start:])
+        writer.end(size, hashlib.blake2b(data, digest_size=FILE_DIGEST_SIZE).digest())
+        view.release()
+        if isinstance(data, mmap.mmap):
+            data.close()
+    return writer.copied, writer.sent
+
+
+def apply_delta(basis_path: str, delta_path: str, target_path: str) -> int:
+    """
+    Rebuilds target_path from basis_path (may be the same file) and a
+    delta, replacing it only once the whole file checks out. Returns its
+    size, raises ValueError if the delta is malformed or does not match.
+    """
+    dir_path = os.path.dirname(target_path)
+    fd, tmp_path = create_temp_file(
+        dir_path, f".{os.path.basename(target_path)}.", ".part"
+    )
+    try:
+        with os.fdopen(fd, "wb") as out, open(delta_path, "rb") as delta:
+            # A delta against a file the server does not have only has data
+            basis_file: ContextManager[BinaryIO | None] = contextlib.nullcontext()
+            if os.path.isfile(basis_path):
+                basis_file = open(basis_path, "rb")
+            with basis_file as basis:
+                size = _apply(delta, basis, out)
+        os.replace(tmp_path, target_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return size
+
+
+def _apply(delta: BinaryIO, basis: BinaryIO | None, out: BinaryIO) -> int:
+    digest = hashlib.blake2b(digest_size=FILE_DIGEST_SIZE)
+    (block_size,) = _unpack(delta, DELTA_HEADER_FORMAT)
+    while True:
+        op = delta.read(1)
+        if op == OP_COPY:
+            index, count = _unpack(delta, OP_COPY_FORMAT)
+            if basis is None:
+                raise ValueError("Delta copies from a file that does not exist")
+            basis.seek(index * block_size)
+            remaining = count * block_size
+            # The last block of the basis may be short
+            while remaining and (chunk := basis.read(min(remaining, LITERAL_CHUNK))):
+                out.write(chunk)
+                digest.update(chunk)
+                remaining -= len(chunk)
+        elif op == OP_DATA:
+            (length,) = _unpack(delta, OP_DATA_FORMAT)
+            chunk = _read_exact(delta, length)
+            out.write(chunk)
+            digest.update(chunk)
+        elif op == OP_END:
+            (size,) = _unpack(delta, OP_END_FORMAT)
+            expected = _read_exact(delta, FILE_DIGEST_SIZE)
+            if out.tell() != size or digest.digest() != expected:
+                raise ValueError("Rebuilt file does not match the delta's digest")
+            return size
+        else:
+            raise ValueError(f"Malformed delta operation {op!r}")
+
+
+def _roll(
+    data: memoryview,
+    position: int,
+    last: int,
+    signatures: Signatures,
+    table: Dict[int, List[int]],
+) -> Tuple[int, int | None]:
+    """
+    Slides a block-sized window one byte at a time from position until it
+    matches a block, up to last. Returns where it did and the block, or
+    the position after last and None.
+    """
+    block_size = signatures.block_size
+    a, b = _weak_parts(data[position : position + block_size])
+    while True:
+        index = _find(data, position, a | b << 16, signatures, table)
+        if index is not None:
+            return position, index
+        if position == last:
+            return position + 1, None
+        out, into = data[position], data[position + block_size]
+        a = (a - out + into) & 0xFFFF
+        b = (b - block_size * out + a) & 0xFFFF
+        position += 1
+
+
+def _find(
+    data: memoryview,
+    position: int,
+    weak: int,
+    signatures: Signatures,
+    table: Dict[int, List[int]],
+) -> int | None:
+    """
+    Block the window at position, of weak checksum weak, matches if any.
+    """
+    candidates = table.get(weak)
+    if candidates is None:
+        return None
+    strong = _strong(data[position : position + signatures.block_size])
+    for index in candidates:
+        if signatures.strong[index] == strong:
+            return index
+    return None
+
+
+def _weak_parts(block: bytes | memoryview) -> Tuple[int, int]:
+    # rsync's checksum: a is the sum of the bytes, b weights each byte by
+    # its distance to the end of the block (the sum of the prefix sums)
+    return sum(block) & 0xFFFF, sum(accumulate(block)) & 0xFFFF
+
+
+def _weak(block: bytes | memoryview) -> int:
+    a, b = _weak_parts(block)
+    return a | b << 16
+
+
+def _strong(block: bytes | memoryview) -> bytes:
+    return hashlib.blake2b(block, digest_size=STRONG_SIZE).digest()
+
+
+def _map(f: BinaryIO) -> mmap.mmap | bytes:
+    if os.fstat(f.fileno()).st_size == 0:
+        # Empty files cannot be mapped
+        return b""
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _read_exact(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of delta file")
+    return data
+
+
+def _unpack(f: BinaryIO, format: str) -> Tuple[int, ...]:
+    return struct.unpack(format, _read_exact(f, struct.calcsize(format)))
+
+
+class _DeltaWriter:
+    """
+    Writes delta operations, merging runs of consecutive blocks into one.
+    """
+
+    def __init__(self, out: BinaryIO, block_size: int) -> None:
+        self.out = out
+        self.block_size = block_size
+        self.copy_start: int = 0
+        self.copy_count: int = 0
+        self.copied: int = 0
+        self.sent: int = 0
+        out.write(struct.pack(DELTA_HEADER_FORMAT, block_size))
+
+    def copy(self, index: int) -> None:
+        if self.copy_count and index == self.copy_start + self.copy_count:
+            self.copy_count += 1
+            return
+        self._flush_copy()
+        self.copy_start, self.copy_count = index, 1
+
+    def literal(self, data: memoryview) -> None:
+        if not data:
+            return
+        self._flush_copy()
+        for start in range(0, len(data), LITERAL_CHUNK):
+            chunk = data[start : start + LITERAL_CHUNK]
+            self.out.write(OP_DATA + struct.pack(OP_DATA_FORMAT, len(chunk)))
+            self.out.write(chunk)
+            self.sent += len(chunk)
+
+    def end(self, size: int, digest: bytes) -> None:
+        self._flush_copy()
+        self.out.write(OP_END + struct.pack(OP_END_FORMAT, size) + digest)
+        # The last block of the server's copy may be short
+        self.copied = size - self.sent
+
+    def _flush_copy(self) -> None:
+        if not self.copy_count:
+            return
+        self.out.write(
+            OP_COPY + struct.pack(OP_COPY_FORMAT, self.copy_start, self.copy_count)
+        )
+        self.copy_count = 0
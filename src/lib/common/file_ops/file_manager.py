@@ -1,5 +1,23 @@
+import asyncio
+import fcntl
+import hashlib
+import io
+import mmap
 import os
+import secrets
+import struct
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
 from enum import Enum
+from typing import Callable, Dict, List, Tuple, cast
+
+from lib.common.file_ops.compression import (
+    SAMPLE_SIZE,
+    Compressor,
+    Decompressor,
+    is_compressible,
+)
+from lib.common.skt.packet import Codec, FileIdentity
 
 
 class FileOperation(Enum):
@@ -8,25 +26,588 @@ class FileOperation(Enum):
 
 
 BLOCK_SIZE = 1000
+# Chunks a written mapping is pre-sized for, it doubles whenever it fills up
+MMAP_INITIAL_CHUNKS = 1024
+
+# Received chunks are buffered and written out by a thread pool once this
+# many bytes are buffered, or the oldest one has waited this many seconds
+WRITE_BEHIND_SIZE = 1 << 20
+WRITE_BEHIND_DELAY = 0.2
+WRITE_BEHIND_THREADS = 4
+# Writes in flight at most, receiving waits for the oldest beyond that
+MAX_PENDING_WRITES = 2 * WRITE_BEHIND_THREADS
+
+# Partially received files are kept as .<name>.part next to the target with
+# a .<name>.part.ckpt sidecar holding the offset they can be resumed from and
+# the identity of the file they are a copy of
+PARTIAL_SUFFIX = ".part"
+CHECKPOINT_SUFFIX = ".ckpt"
+CHECKPOINT_FORMAT = "!QQQ"
+# Bytes received between two checkpoints (besides the one on failure)
+CHECKPOINT_INTERVAL = 16 << 20
+
+# Received files are created with this mode (less the umask), temporary
+# ones too since they end up replacing them
+FILE_MODE = 0o644
+
+# BLAKE2b digest of the transferred chunks (see track_digest)
+DIGEST_SIZE = 32
+
+# Positional vectored reads, Linux and most BSDs
+HAS_PREADV: bool = hasattr(os, "preadv")
+
+# Shared by every FileManager, created on first use (after workers fork)
+_write_executor: ThreadPoolExecutor | None = None
+
+# FileManagers of this process holding the lock of a .part file, by its path
+_partial_owners: Dict[str, "FileManager"] = {}
+
+
+def _get_write_executor() -> ThreadPoolExecutor:
+    global _write_executor
+    if _write_executor is None:
+        _write_executor = ThreadPoolExecutor(
+            max_workers=WRITE_BEHIND_THREADS, thread_name_prefix="write-behind"
+        )
+    return _write_executor
+
+
+def create_temp_file(dir_path: str, prefix: str, suffix: str) -> Tuple[int, str]:
+    """
+    Like tempfile.mkstemp, but the file is created with FILE_MODE instead
+    of 0600. Returns its file descriptor (open for reading and writing)
+    and its path.
+    """
+    while True:
+        path = os.path.join(dir_path, f"{prefix}{secrets.token_hex(8)}{suffix}")
+        try:
+            return os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, FILE_MODE), path
+        except FileExistsError:
+            continue
+
+
+def _pwrite_all(fd: int, data: bytearray, offset: int) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
 
 
 class FileManager:
-    def __init__(self, dir_path: str, file_name: str, mode: FileOperation) -> None:
+    def __init__(
+        self,
+        dir_path: str,
+        file_name: str,
+        mode: FileOperation,
+        block_size: int = BLOCK_SIZE,
+        use_mmap: bool = False,
+        resume: bool = False,
+        in_place: bool = False,
+        identity: FileIdentity | None = None,
+    ) -> None:
+        """
+        Written files are created under a temporary name and only moved to
+        filepath by close(), so transfers running concurrently (possibly in
+        other server workers) never see or interleave with a partial file.
+        With resume, the temporary file is a locked .part file kept with a
+        checkpoint when the transfer fails, writing continues from its
+        checkpoint (see get_offset) if it is a copy of the same file: the
+        one of the given identity, or any if None (see get_identity). A
+        .part still locked by a transfer of this process, most likely of a
+        client that dropped, is taken over (see set_abort_handler); locked
+        by another process, a throwaway temporary file is used. Other
+        transfers always use one, and replacing filepath they remove the
+        .part left over by a resumable one.
+        With use_mmap the file is memory-mapped: chunks are read as views of
+        the mapping and written into it, with no syscall per chunk. Like
+        other reads and writes they go on from position, not from the
+        sequence number: the protocols hand chunks over in order, and a
+        packet in flight holds its view of the mapping to be sent again.
+        Otherwise written chunks are coalesced in memory and written behind
+        by a thread pool, await flush() (or wait_writes() if the transfer
+        failed) before close() to wait for them.
+        With in_place, filepath itself is written from the seek()ed offset:
+        the stripe of a file others write theirs into (see file_ops.stripes),
+        it is never truncated nor moved and is not mapped.
+        """
         self.mode = mode
+        self.block_size = block_size
         self.filepath = self._validate_file(dir_path, file_name)
         os.makedirs(dir_path, exist_ok=True)
-        self.file = open(self.filepath, mode.value)
+        self.tmp_filepath: str | None = None
+        self.checkpoint_path: str | None = None
+        self.identity = identity
+        # Stops the transfer of a .part taken over, see set_abort_handler
+        self.abort_handler: Callable[[], object] | None = None
+        # Offset of the next chunk in the file (where the write buffer starts)
+        self.position: int = 0
+        # Offset reads stop at, for a stripe of the file
+        self.end: int | None = None
+        self.in_place = in_place
+        # Buffered either way, the mode just is not a literal for the type checker
+        self.file: io.BufferedIOBase
+        if mode == FileOperation.WRITE and in_place:
+            fd = os.open(self.filepath, os.O_RDWR | os.O_CREAT, FILE_MODE)
+            self.file = cast(io.BufferedIOBase, os.fdopen(fd, mode.value))
+        elif mode == FileOperation.WRITE:
+            if resume:
+                fd = self._open_partial()
+            else:
+                fd, self.tmp_filepath = create_temp_file(
+                    dir_path, f".{os.path.basename(self.filepath)}.", PARTIAL_SUFFIX
+                )
+            self.file = cast(io.BufferedIOBase, os.fdopen(fd, mode.value))
+        else:
+            self.file = cast(io.BufferedIOBase, open(self.filepath, mode.value))
+
+        self.checkpointed: int = self.position
+        self.write_buffer = bytearray()
+        # Writes the buffer out once its first chunk has waited long enough
+        self.write_timer: asyncio.TimerHandle | None = None
+        # Background writes and the offset each one starts at
+        self.pending_writes: List[Tuple[int, Future[None]]] = []
+        self.digest: hashlib.blake2b | None = None
+        # Streams the transferred data is (de)compressed through, if any
+        self.compressor: Compressor | None = None
+        self.decompressor: Decompressor | None = None
+        self.mapping: mmap.mmap | None = None
+        if use_mmap and not in_place:
+            self.mapping = self._map_file()
 
     def __exit__(self) -> None:
         if self.file:
             self.file.close()
 
-    def read_chunk(self) -> bytes:
-        return self.file.read(BLOCK_SIZE)
+    def is_mapped(self) -> bool:
+        """
+        Whether read_chunk returns views of a mapping (see read_chunk).
+        """
+        return self.mapping is not None and self.compressor is None
+
+    def get_offset(self) -> int:
+        """
+        Offset of the next chunk. Before the transfer, where it starts.
+        """
+        return self.position
+
+    def get_identity(self) -> FileIdentity | None:
+        """
+        Identity of a read file, or of the one a resumed written file is a
+        copy of (from its checkpoint, or set_identity) if known.
+        """
+        if self.mode == FileOperation.READ:
+            stat = os.fstat(self.file.fileno())
+            return stat.st_size, stat.st_mtime_ns
+        return self.identity
+
+    def set_identity(self, identity: FileIdentity) -> None:
+        """
+        Identity of the file written, saved with its checkpoints.
+        """
+        self.identity = identity
+
+    def set_abort_handler(self, handler: Callable[[], object]) -> None:
+        """
+        Has handler stop the transfer if a resumed transfer of the same file
+        takes its .part over. Called before the file is closed (as failed),
+        the transfer must not touch it anymore.
+        """
+        self.abort_handler = handler
+
+    def track_digest(self) -> None:
+        """
+        Hashes the chunks read or written from now on, in file order, so a
+        transfer can be verified as it goes instead of in a second pass.
+        """
+        self.digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+
+    def get_digest(self) -> bytes:
+        """
+        Digest of the chunks read or written so far, b"" if not tracked.
+        """
+        return b"" if self.digest is None else self.digest.digest()
+
+    def get_size(self) -> int:
+        return os.fstat(self.file.fileno()).st_size
+
+    def seek(self, offset: int) -> None:
+        """
+        Moves to offset before the transfer starts. A written file is
+        truncated there when closed, unless in_place.
+        """
+        self.position = offset
+        if self.mode == FileOperation.READ and not HAS_PREADV:
+            self.file.seek(offset)
+
+    def set_block_size(self, block_size: int) -> None:
+        """
+        Chunks read from now on are at most block_size bytes.
+        """
+        self.block_size = block_size
+
+    def set_compression(self, codec: Codec, level: int) -> None:
+        """
+        Chunks read from now on are of the stream of the file's data
+        compressed with codec at level (see file_ops.compression), or of it
+        as it is if a sample barely compresses. Chunks written are of such a
+        stream, decompressed before being written. Offsets, digests and
+        checkpoints stay those of the file's data.
+        """
+        if self.mode == FileOperation.WRITE:
+            self.decompressor = Decompressor()
+            return
+        size = SAMPLE_SIZE
+        if self.end is not None:
+            size = max(0, min(size, self.end - self.position))
+        sample = os.pread(self.file.fileno(), size, self.position)
+        if not is_compressible(sample, codec, level):
+            codec = Codec.NONE
+        self.compressor = Compressor(self._read_file_chunk, codec, level)
+
+    def set_end(self, end: int) -> None:
+        """
+        Reads stop at end, the file then ends there for the transfer.
+        """
+        self.end = end
+
+    def read_chunk(self) -> bytes | memoryview:
+        """
+        Returns the next chunk, b"" at the end of the file. Mapped files
+        return a view of the mapping: holding it costs no memory, and the
+        chunk can be sent again without keeping a copy.
+        """
+        if self.compressor is not None:
+            buffer = bytearray(self.block_size)
+            return bytes(buffer[: self.compressor.read_into(memoryview(buffer))])
+        return self._read_file_chunk()
+
+    def _read_file_chunk(self) -> bytes | memoryview:
+        chunk: bytes | memoryview
+        size = self._read_size()
+        if self.mapping is None:
+            if not HAS_PREADV:
+                chunk = self.file.read(size)
+            else:
+                # Same offset bookkeeping as read_chunk_into
+                chunk = os.pread(self.file.fileno(), size, self.position)
+        elif self.position >= len(self.mapping) or not size:
+            return b""
+        else:
+            chunk = memoryview(self.mapping)[self.position : self.position + size]
+        self.position += len(chunk)
+        if self.digest is not None:
+            self.digest.update(chunk)
+        return chunk
+
+    def read_chunk_into(self, buffer: memoryview) -> int:
+        """
+        Reads the next chunk straight into buffer (which must hold
+        block_size bytes), returns its length, 0 at the end of the file.
+        """
+        if self.compressor is not None:
+            return self.compressor.read_into(buffer[: self.block_size])
+        if self.mapping is None:
+            size = self._read_size()
+            if not HAS_PREADV:
+                length = self.file.readinto(buffer[:size])
+            else:
+                # Positional read straight into buffer, bypassing the copy
+                # through the buffered reader (chunks are smaller than its buffer)
+                length = os.preadv(self.file.fileno(), [buffer[:size]], self.position)
+            self.position += length
+            if self.digest is not None:
+                self.digest.update(buffer[:length])
+            return length
+        chunk = self.read_chunk()
+        buffer[: len(chunk)] = chunk
+        return len(chunk)
+
+    async def write_chunk(self, content: bytes | memoryview) -> None:
+        if self.decompressor is None:
+            await self._write_data(content)
+            return
+        for data in self.decompressor.decompress(content):
+            await self._write_data(data)
+
+    async def _write_data(self, content: bytes | memoryview) -> None:
+        if self.digest is not None:
+            self.digest.update(content)
+        if self.mapping is None:
+            if not self.write_buffer and content:
+                self.write_timer = asyncio.get_running_loop().call_later(
+                    WRITE_BEHIND_DELAY, self._write_behind_timeout
+                )
+            self.write_buffer += content
+            if len(self.write_buffer) >= WRITE_BEHIND_SIZE:
+                await self._write_behind()
+            return
+
+        end = self.position + len(content)
+        if end > len(self.mapping):
+            # Also grows the file (ftruncate)
+            self.mapping.resize(max(2 * len(self.mapping), end))
+        self.mapping[self.position : end] = content
+        self.position = end
+        self._maybe_checkpoint(end)
+
+    async def flush(self) -> None:
+        """
+        Writes out the buffered chunks and waits for every pending write,
+        without blocking the event loop. Raises ValueError if a compressed
+        stream was cut short.
+        """
+        if self.decompressor is not None and not self.decompressor.is_done():
+            raise ValueError("Compressed data ended early")
+        if self.write_buffer:
+            await self._write_behind()
+        for _, future in self.pending_writes:
+            await asyncio.wrap_future(future)
+        self.pending_writes = []
+
+    async def wait_writes(self) -> None:
+        """
+        Waits for every pending write without blocking the event loop, their
+        errors are left for close() to account for.
+        """
+        await asyncio.gather(
+            *(asyncio.wrap_future(future) for _, future in self.pending_writes),
+            return_exceptions=True,
+        )
+
+    def close(self, commit: bool = True, resumable: bool = True) -> None:
+        """
+        Closes the file. A written file replaces filepath if commit is set,
+        otherwise (failed transfer) it is kept with a checkpoint to be
+        resumed if it was opened to resume, or discarded if nothing was
+        written or it cannot be resumed (e.g. its data is known to be
+        corrupt, then resumable is unset).
+        """
+        if self.file.closed:
+            return
+        if self.write_timer is not None:
+            self.write_timer.cancel()
+            self.write_timer = None
+        # The file descriptor must outlive the writes still in flight, there
+        # are none left if flush() or wait_writes() was awaited
+        wait_futures([future for _, future in self.pending_writes])
+        if self.mode == FileOperation.WRITE:
+            # Buffered chunks and failed writes are lost, start after them
+            self.position = self._written_offset()
+        self.pending_writes = []
+        if self.mapping is not None:
+            self._unmap_file()
+        elif self.mode == FileOperation.WRITE and not self.in_place:
+            # Data past position is stale, from a checkpointed attempt
+            os.ftruncate(self.file.fileno(), self.position)
+
+        keep = (
+            not commit
+            and resumable
+            and self.checkpoint_path is not None
+            and self.identity is not None
+            and self.position > 0
+        )
+        if keep:
+            self._save_checkpoint(self.position)
+        self.file.close()
+        if self.tmp_filepath is None:
+            return
+        if _partial_owners.get(self.tmp_filepath) is self:
+            del _partial_owners[self.tmp_filepath]
+        if commit:
+            os.replace(self.tmp_filepath, self.filepath)
+            if self.checkpoint_path is None:
+                self._remove_partial()
+        elif not keep:
+            os.remove(self.tmp_filepath)
+        if not keep and self.checkpoint_path is not None:
+            try:
+                os.remove(self.checkpoint_path)
+            except FileNotFoundError:
+                pass
+
+    async def _write_behind(self) -> None:
+        self._reap_writes()
+        while len(self.pending_writes) >= MAX_PENDING_WRITES:
+            # The disk is behind, stop receiving into memory until it catches up
+            await asyncio.wrap_future(self.pending_writes[0][1])
+            self._reap_writes()
+        self._submit_write()
+
+    def _write_behind_timeout(self) -> None:
+        self.write_timer = None
+        # Errors of the writes are raised to the receiving protocol by the
+        # next write_chunk() or flush(), not from the event loop callback
+        self._submit_write()
+
+    def _reap_writes(self) -> None:
+        # Surface the errors of earlier writes to the receiving protocol
+        for _, future in self.pending_writes:
+            error = future.exception() if future.done() else None
+            if error is not None:
+                raise error
+        self.pending_writes = [
+            (offset, future)
+            for offset, future in self.pending_writes
+            if not future.done()
+        ]
+        self._maybe_checkpoint(self._written_offset())
+
+    def _submit_write(self) -> None:
+        if self.write_timer is not None:
+            self.write_timer.cancel()
+            self.write_timer = None
+        # Each buffer is written at its own offset, in any order
+        buffer, self.write_buffer = self.write_buffer, bytearray()
+        future = _get_write_executor().submit(
+            _pwrite_all, self.file.fileno(), buffer, self.position
+        )
+        self.pending_writes.append((self.position, future))
+        self.position += len(buffer)
+
+    def _read_size(self) -> int:
+        if self.end is None:
+            return self.block_size
+        return max(0, min(self.block_size, self.end - self.position))
+
+    def _written_offset(self) -> int:
+        """
+        Offset up to which every chunk handed to the thread pool is written.
+        """
+        return min(
+            (
+                offset
+                for offset, future in self.pending_writes
+                if not future.done() or future.exception() is not None
+            ),
+            default=self.position,
+        )
+
+    def _partial_path(self) -> str:
+        return os.path.join(
+            os.path.dirname(self.filepath),
+            f".{os.path.basename(self.filepath)}{PARTIAL_SUFFIX}",
+        )
+
+    def _open_partial(self) -> int:
+        """
+        Opens and locks the .part file of filepath, sets position to its
+        checkpoint if it is of the same file. Returns its file descriptor.
+        """
+        partial = self._partial_path()
+        fd = os.open(partial, os.O_RDWR | os.O_CREAT, FILE_MODE)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            owner = _partial_owners.get(partial)
+            if owner is None:
+                # Being written by another process, this one cannot be resumed
+                os.close(fd)
+                fd, self.tmp_filepath = create_temp_file(
+                    os.path.dirname(self.filepath),
+                    f".{os.path.basename(self.filepath)}.",
+                    PARTIAL_SUFFIX,
+                )
+                return fd
+            # The other transfer would keep it until it times out
+            owner._give_up()
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        _partial_owners[partial] = self
+        self.tmp_filepath = partial
+        self.checkpoint_path = partial + CHECKPOINT_SUFFIX
+        offset, identity = self._load_checkpoint()
+        if self.identity is None:
+            self.identity = identity
+        if identity is not None and identity == self.identity:
+            self.position = min(offset, os.fstat(fd).st_size)
+        # Writes may have landed past the checkpoint, they are not trusted
+        os.ftruncate(fd, self.position)
+        return fd
+
+    def _give_up(self) -> None:
+        """
+        Stops the transfer and closes the file as failed, releasing its
+        .part for a resumed transfer to take over.
+        """
+        if self.abort_handler is not None:
+            self.abort_handler()
+        self.close(commit=False)
+
+    def _remove_partial(self) -> None:
+        """
+        Removes the .part of filepath and its checkpoint, unless locked: a
+        copy of an older version of the file now replaced.
+        """
+        partial = self._partial_path()
+        try:
+            fd = os.open(partial, os.O_RDWR)
+        except FileNotFoundError:
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            for path in (partial, partial + CHECKPOINT_SUFFIX):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        except BlockingIOError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _load_checkpoint(self) -> Tuple[int, FileIdentity | None]:
+        assert self.checkpoint_path is not None
+        try:
+            with open(self.checkpoint_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0, None
+        if len(data) != struct.calcsize(CHECKPOINT_FORMAT):
+            return 0, None
+        offset, size, mtime = struct.unpack(CHECKPOINT_FORMAT, data)
+        return int(offset), (int(size), int(mtime))
+
+    def _maybe_checkpoint(self, offset: int) -> None:
+        if (
+            self.checkpoint_path is not None
+            and self.identity is not None
+            and offset - self.checkpointed >= CHECKPOINT_INTERVAL
+        ):
+            self._save_checkpoint(offset)
+
+    def _save_checkpoint(self, offset: int) -> None:
+        assert self.checkpoint_path is not None and self.identity is not None
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(struct.pack(CHECKPOINT_FORMAT, offset, *self.identity))
+        os.replace(tmp_path, self.checkpoint_path)
+        self.checkpointed = offset
+
+    def _map_file(self) -> mmap.mmap | None:
+        fd = self.file.fileno()
+        if self.mode == FileOperation.READ:
+            if os.fstat(fd).st_size == 0:
+                # Empty files cannot be mapped, there is nothing to read anyway
+                return None
+            return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+
+        os.ftruncate(fd, self.position + MMAP_INITIAL_CHUNKS * self.block_size)
+        return mmap.mmap(fd, 0, access=mmap.ACCESS_WRITE)
 
-    def write_chunk(self, content: bytes) -> None:
-        self.file.write(content)
-        self.file.flush()
+    def _unmap_file(self) -> None:
+        assert self.mapping is not None
+        try:
+            self.mapping.close()
+        except BufferError:
+            # Chunks read from the mapping are still referenced (e.g. by
+            # packets of an aborted transfer), it is unmapped once collected
+            pass
+        self.mapping = None
+        if self.mode == FileOperation.WRITE:
+            # Drop the room reserved past the last written chunk
+            os.ftruncate(self.file.fileno(), self.position)
 
     def _validate_file(self, dir_path: str, file_name: str) -> str:
         filepath = os.path.join(dir_path, file_name)
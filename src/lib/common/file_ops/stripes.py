@@ -0,0 +1,103 @@
+import fcntl
+import os
+import struct
+from typing import Tuple
+
+# Striped transfers: a file is split in byte ranges (stripes), each carried
+# by its own connection. The receiver writes every stripe in place into one
+# staging file, named after the transfer, that is moved to the file's name
+# once all of them are in.
+STAGING_SUFFIX = ".stripes"
+# One byte per stripe, set once it is written or has failed
+DONE_SUFFIX = ".done"
+STRIPE_DONE = b"\x01"
+STRIPE_FAILED = b"\x02"
+
+# Downloads learn the size of the file first, as a tiny file of its own
+SIZE_FILE = "size"
+SIZE_FORMAT = "!Q"
+
+
+def stripe_range(size: int, index: int, count: int) -> Tuple[int, int]:
+    """
+    Start and end offsets of stripe index of count, of a file of size bytes.
+    """
+    return size * index // count, size * (index + 1) // count
+
+
+def write_size(file_path: str, size_path: str) -> None:
+    """
+    Writes the size of file_path, raises FileNotFoundError if it is missing.
+    """
+    with open(size_path, "wb") as out:
+        out.write(struct.pack(SIZE_FORMAT, os.path.getsize(file_path)))
+
+
+def read_size(size_path: str) -> int:
+    with open(size_path, "rb") as f:
+        (size,) = struct.unpack(SIZE_FORMAT, f.read())
+    return int(size)
+
+
+def staging_name(file_name: str, transfer_id: int) -> str:
+    dir_name, base_name = os.path.split(file_name)
+    return os.path.join(dir_name, f".{base_name}.{transfer_id:016x}{STAGING_SUFFIX}")
+
+
+def complete_stripe(
+    staging_path: str, target_path: str, index: int, count: int, size: int
+) -> bool:
+    """
+    Records that stripe index of the file reassembled at staging_path is
+    written. The one completing the file truncates it to size and moves it
+    to target_path, returns whether it was this one. Stripes may complete
+    in different processes (server workers), the record is locked.
+    """
+    return _record_stripe(staging_path, index, count, STRIPE_DONE, target_path, size)
+
+
+def fail_stripe(staging_path: str, index: int, count: int) -> None:
+    """
+    Records that stripe index of the file reassembled at staging_path
+    failed. The last stripe to finish then removes the staging file.
+    """
+    _record_stripe(staging_path, index, count, STRIPE_FAILED)
+
+
+def _record_stripe(
+    staging_path: str,
+    index: int,
+    count: int,
+    status: bytes,
+    target_path: str | None = None,
+    size: int = 0,
+) -> bool:
+    done_path = staging_path + DONE_SUFFIX
+    fd = os.open(done_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.pwrite(fd, status, index)
+        record = os.pread(fd, count, 0)
+        if len(record) < count or 0 in record:
+            # Stripes still on their way
+            return False
+        if target_path is None or record != STRIPE_DONE * count:
+            remove_staging(staging_path)
+            return False
+        os.truncate(staging_path, size)
+        os.replace(staging_path, target_path)
+        os.remove(done_path)
+        return True
+    finally:
+        os.close(fd)
+
+
+def remove_staging(staging_path: str) -> None:
+    """
+    Removes what a failed striped transfer left behind.
+    """
+    for path in (staging_path, staging_path + DONE_SUFFIX):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
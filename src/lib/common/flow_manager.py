@@ -3,14 +3,37 @@ from typing import Dict, Tuple
 
 from lib.common.skt.packet import Packet
 
+MAX_FLOW_QUEUE_SIZE: int = 1024
 
-class FlowManager:
+
+class FlowStats:
     def __init__(self) -> None:
+        """
+        Per-flow counters, so a misbehaving client can be spotted.
+        """
+        self.received: int = 0
+        self.dropped: int = 0
+        self.max_occupancy: int = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"FlowStats(received={self.received}, "
+            f"dropped={self.dropped}, "
+            f"max_occupancy={self.max_occupancy})"
+        )
+
+
+class FlowManager:
+    def __init__(self, max_queue_size: int = MAX_FLOW_QUEUE_SIZE) -> None:
         """
         FlowManager is responsible for managing the flow of packets in a network application.
         It pushes packets to their respective queue.
+        Queues are bounded, a flow that does not keep up loses its own packets
+        instead of growing memory or stalling the other flows.
         """
+        self.max_queue_size = max_queue_size
         self.flow_table: Dict[Tuple[str, int], asyncio.Queue[Packet]] = dict()
+        self.flow_stats: Dict[Tuple[str, int], FlowStats] = dict()
 
     def does_flow_exist(self, flow: Tuple[str, int]) -> bool:
         return flow in self.flow_table
@@ -21,8 +44,9 @@ class FlowManager:
         """
         if flow in self.flow_table:
             raise ValueError(f"Flow {flow} already exists in flow table")
-        flow_queue: asyncio.Queue[Packet] = asyncio.Queue()
+        flow_queue: asyncio.Queue[Packet] = asyncio.Queue(maxsize=self.max_queue_size)
         self.flow_table[flow] = flow_queue
+        self.flow_stats[flow] = FlowStats()
         return flow_queue
 
     def remove_flow(self, flow: Tuple[str, int]) -> None:
@@ -31,12 +55,38 @@ class FlowManager:
         """
         if flow in self.flow_table:
             del self.flow_table[flow]
+            del self.flow_stats[flow]
 
-    async def demultiplex_packet(self, flow: Tuple[str, int], pkt: Packet) -> None:
+    def get_stats(self, flow: Tuple[str, int]) -> FlowStats:
+        if flow not in self.flow_stats:
+            raise ValueError(f"Flow {flow} not found in flow table")
+        return self.flow_stats[flow]
+
+    def get_occupancy(self, flow: Tuple[str, int]) -> int:
+        if flow not in self.flow_table:
+            raise ValueError(f"Flow {flow} not found in flow table")
+        return self.flow_table[flow].qsize()
+
+    def demultiplex_packet(self, flow: Tuple[str, int], pkt: Packet) -> bool:
         """
-        Demultiplexes a packet to the appropriate flow queue.
+        Demultiplexes a packet to the appropriate flow queue without blocking.
+        When the queue is full data packets are tail dropped (the sender will
+        retransmit them), while a FIN evicts the oldest queued packet so the
+        connection always learns that it was closed.
+        Returns whether the packet was queued.
         """
         if flow not in self.flow_table:
             raise ValueError(f"Flow {flow} not found in flow table")
         flow_queue = self.flow_table[flow]
-        await flow_queue.put(pkt)
+        stats = self.flow_stats[flow]
+        stats.received += 1
+
+        if flow_queue.full():
+            stats.dropped += 1
+            if not pkt.is_fin():
+                return False
+            flow_queue.get_nowait()
+
+        flow_queue.put_nowait(pkt)
+        stats.max_occupancy = max(stats.max_occupancy, flow_queue.qsize())
+        return True
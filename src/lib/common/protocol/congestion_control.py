@@ -0,0 +1,117 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Type
+
+INITIAL_CWND: float = 1.0
+INITIAL_SSTHRESH: float = 64.0
+MIN_SSTHRESH: float = 2.0
+
+CUBIC_C: float = 0.4
+CUBIC_BETA: float = 0.7
+
+
+class CongestionControl(ABC):
+    def __init__(self) -> None:
+        """
+        Congestion window in packets. The sender keeps at most get_window()
+        packets in flight and reports every ACK, triple duplicate ACK and
+        retransmission timeout so the algorithm can resize the window.
+        """
+        self.cwnd: float = INITIAL_CWND
+        self.ssthresh: float = INITIAL_SSTHRESH
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(cwnd={self.cwnd:.2f}, "
+            f"ssthresh={self.ssthresh:.2f})"
+        )
+
+    def get_window(self) -> int:
+        return max(1, int(self.cwnd))
+
+    def in_slow_start(self) -> bool:
+        return self.cwnd < self.ssthresh
+
+    @abstractmethod
+    def on_ack(self, acked: int) -> None:
+        raise NotImplementedError("Must implement on_ack method")
+
+    @abstractmethod
+    def on_triple_dup_ack(self) -> None:
+        raise NotImplementedError("Must implement on_triple_dup_ack method")
+
+    @abstractmethod
+    def on_timeout(self) -> None:
+        raise NotImplementedError("Must implement on_timeout method")
+
+
+class Reno(CongestionControl):
+    def on_ack(self, acked: int) -> None:
+        for _ in range(acked):
+            if self.in_slow_start():
+                self.cwnd += 1
+            else:
+                # Additive increase: one packet per window worth of ACKs
+                self.cwnd += 1 / self.cwnd
+
+    def on_triple_dup_ack(self) -> None:
+        self.ssthresh = max(self.cwnd / 2, MIN_SSTHRESH)
+        self.cwnd = self.ssthresh
+
+    def on_timeout(self) -> None:
+        self.ssthresh = max(self.cwnd / 2, MIN_SSTHRESH)
+        self.cwnd = INITIAL_CWND
+
+
+class Cubic(CongestionControl):
+    def __init__(self) -> None:
+        """
+        CUBIC (RFC 9438): after a loss the window grows along a cubic curve
+        of the time elapsed since the reduction, plateauing around w_max.
+        """
+        super().__init__()
+        self.w_max: float = 0.0
+        self.k: float = 0.0
+        self.epoch_start: float | None = None
+
+    def on_ack(self, acked: int) -> None:
+        for _ in range(acked):
+            if self.in_slow_start():
+                self.cwnd += 1
+                continue
+
+            now = time.monotonic()
+            if self.epoch_start is None:
+                self.epoch_start = now
+                if self.cwnd < self.w_max:
+                    self.k = ((self.w_max - self.cwnd) / CUBIC_C) ** (1 / 3)
+                else:
+                    self.k = 0.0
+                    self.w_max = self.cwnd
+
+            t = now - self.epoch_start
+            target = CUBIC_C * (t - self.k) ** 3 + self.w_max
+            if target > self.cwnd:
+                self.cwnd += (target - self.cwnd) / self.cwnd
+            else:
+                # Stay TCP friendly on the concave plateau
+                self.cwnd += 0.01 / self.cwnd
+
+    def on_triple_dup_ack(self) -> None:
+        self._reduce()
+        self.cwnd = self.ssthresh
+
+    def on_timeout(self) -> None:
+        self._reduce()
+        self.cwnd = INITIAL_CWND
+
+    def _reduce(self) -> None:
+        self.w_max = self.cwnd
+        self.ssthresh = max(self.cwnd * CUBIC_BETA, MIN_SSTHRESH)
+        self.epoch_start = None
+
+
+congestion_control_mapping: Dict[str, Type[CongestionControl]] = {
+    "reno": Reno,
+    "cubic": Cubic,
+}
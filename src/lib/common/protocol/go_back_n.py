@@ -1,16 +1,25 @@
 import asyncio
+import time
 from asyncio.tasks import Task
 from collections import deque
-from typing import Any
+from typing import Any, Dict, List, Set
 
 from lib.common.config import Config
 from lib.common.file_ops.file_manager import FileManager
 from lib.common.logger import Logger
-from lib.common.protocol.protocol import TIMEOUT_INTERVAL, Protocol
+from lib.common.protocol.congestion_control import CongestionControl
+from lib.common.protocol.protocol import Protocol
 from lib.common.skt.connection_socket import ConnectionSocket
-from lib.common.skt.packet import MAX_SEQ_NUM, HeaderFlags, Packet
+from lib.common.skt.packet import (
+    MAX_SEQ_NUM,
+    Packet,
+    SackBlocks,
+    encode_sack_blocks,
+    seq_distance,
+)
 
-WINDOW_SIZE: int = 8
+MAX_WINDOW_SIZE: int = 256
+DUP_ACK_THRESHOLD: int = 3
 
 
 class GoBackN(Protocol):
@@ -22,7 +31,17 @@ class GoBackN(Protocol):
         self.base_seq_num = 1
         self.next_seq_num = 1
         self.unacked_pkts: deque[Packet] = deque()
+        self.sacked_seqs: Set[int] = set()
+        self.send_times: Dict[int, float] = dict()
+        self.out_of_order: Dict[int, bytes | memoryview] = dict()
         self.timer: Task[Any] | None = None
+        self.congestion: CongestionControl = config.congestion_control()
+        self.dup_acks = 0
+        # Highest seq_num in flight when the window was last reduced, the
+        # window is not reduced again until it is acknowledged
+        self.recover_seq: int | None = None
+        # Receive window advertised by the peer in its last ACK
+        self.rwnd: int = MAX_WINDOW_SIZE
 
     async def recv_file(self, file_manager: FileManager) -> None:
         try:
@@ -30,18 +49,23 @@ class GoBackN(Protocol):
                 packet = await self.socket.recv()
                 if self.socket.is_closed():
                     break
-                elif packet.get_seq_num() == self.ack_num:
+                if await self._ack_handshake_retry(packet):
+                    continue
+                seq_num = packet.get_seq_num()
+                if seq_num == self.ack_num:
                     self.logger.debug(f"Received valid packet seq={self.ack_num}")
-                    file_manager.write_chunk(packet.get_data())
-                    await self._send_ack(self.ack_num)
+                    await file_manager.write_chunk(packet.get_data())
                     self.ack_num = (self.ack_num + 1) % MAX_SEQ_NUM
-                elif packet.get_seq_num() == 0:
-                    # ACK for filename packet in case it was lost and resent
-                    await self._send_ack(0)
-                else:
+                    await self._deliver_buffered(file_manager)
+                    await self._send_ack((self.ack_num - 1) % MAX_SEQ_NUM)
+                elif 0 < seq_distance(self.ack_num, seq_num) < MAX_WINDOW_SIZE:
                     self.logger.debug(
-                        f"Received out-of-order packet seq={packet.get_seq_num()}"
+                        f"Received out-of-order packet seq={seq_num}, buffering"
                     )
+                    self.out_of_order.setdefault(seq_num, packet.get_data())
+                    await self._send_ack((self.ack_num - 1) % MAX_SEQ_NUM)
+                else:
+                    self.logger.debug(f"Received duplicate packet seq={seq_num}")
                     await self._send_ack((self.ack_num - 1) % MAX_SEQ_NUM)
 
         except Exception as e:
@@ -51,37 +75,59 @@ class GoBackN(Protocol):
     async def send_file(self, file_manager: FileManager) -> None:
         try:
             while True:
-                if (self.next_seq_num - self.base_seq_num) % MAX_SEQ_NUM < WINDOW_SIZE:
-                    block = file_manager.read_chunk()
-                    if not block:
+                if seq_distance(self.base_seq_num, self.next_seq_num) < self._window():
+                    batch = await self._fill_window(file_manager)
+                    if not batch:
                         break
 
-                    packet = Packet(
-                        seq_num=self.next_seq_num,
-                        data=block,
-                        flags=HeaderFlags.GBN.value | self.mode.value,
-                    )
-                    await self.socket.send(packet)
-
-                    self.unacked_pkts.append(packet)
+                    await self.socket.send_batch(batch)
 
-                    if self.base_seq_num == self.next_seq_num:
+                    if self.timer is None:
                         self._start_timer()
-
-                    self.next_seq_num = (self.next_seq_num + 1) % MAX_SEQ_NUM
+                elif not self.unacked_pkts and self.rwnd == 0:
+                    await self._probe_window()
                 else:
                     await self._process_acks()
 
             while self.unacked_pkts:
                 await self._process_acks()
 
+            # The FIN marks the end of the file, a failed transfer must not
+            # send it or the receiver would keep a truncated file
+            await self.socket.disconnect(file_manager.get_digest())
         except Exception as e:
             self.logger.error(f"Send failed: {e}")
             raise
         finally:
             self.unacked_pkts.clear()
+            self.sacked_seqs.clear()
+            self.send_times.clear()
             self._stop_timer()
-            await self.socket.disconnect()
+
+    async def _fill_window(self, file_manager: FileManager) -> List[Packet]:
+        """
+        Reads as many chunks as the window allows and returns them as packets,
+        already accounted as in flight, to be sent in a single batch.
+        Waits on the read-ahead only if nothing could be read yet, otherwise
+        the chunks ready so far are sent right away.
+        An empty batch means the whole file was sent.
+        """
+        batch: List[Packet] = []
+        while seq_distance(self.base_seq_num, self.next_seq_num) < self._window():
+            if batch and not self._is_data_ready():
+                break
+            packet = await self._read_data_packet(
+                file_manager, self.next_seq_num, self.data_flags
+            )
+            if packet is None:
+                break
+
+            self.send_times[self.next_seq_num] = time.monotonic()
+            self.unacked_pkts.append(packet)
+            batch.append(packet)
+
+            self.next_seq_num = (self.next_seq_num + 1) % MAX_SEQ_NUM
+        return batch
 
     async def _process_acks(self) -> None:
         ack_packet = await self.socket.recv()
@@ -89,8 +135,13 @@ class GoBackN(Protocol):
             return
 
         ack_num = ack_packet.get_ack_num()
+        self.rwnd = ack_packet.get_window()
+        self._mark_sacked(ack_packet.get_sack_blocks())
 
         if self._is_within_window(ack_num):
+            sent_at = self.send_times.get(ack_num)
+            acked = 0
+
             while self.unacked_pkts and is_before_or_equal(
                 self.unacked_pkts[0].get_seq_num(), ack_num
             ):
@@ -98,17 +149,118 @@ class GoBackN(Protocol):
                 self.logger.debug(
                     f"Removing packet seq={self.unacked_pkts[0].get_seq_num()}"
                 )
-                self.unacked_pkts.popleft()
+                acked_seq_num = self.unacked_pkts.popleft().get_seq_num()
+                acked += 1
+                self.sacked_seqs.discard(acked_seq_num)
+                if self.send_times.pop(acked_seq_num, None) is None:
+                    # A retransmitted packet was part of this cumulative ACK,
+                    # so the ACK may have been delayed by it (Karn's rule)
+                    sent_at = None
+
+            if sent_at is not None:
+                self.rtt.add_sample(time.monotonic() - sent_at)
 
             self.base_seq_num = (ack_num + 1) % MAX_SEQ_NUM
+            self.dup_acks = 0
+            self.congestion.on_ack(acked)
+            if self.recover_seq is not None and is_before_or_equal(
+                self.recover_seq, ack_num
+            ):
+                self.recover_seq = None
+            elif self.recover_seq is not None and acked:
+                # Partial ACK while recovering: the next hole was lost too
+                # (NewReno), it is not left waiting for another timeout
+                await self._retransmit_hole()
 
             if self.unacked_pkts:
                 self._start_timer()
             else:
                 self._stop_timer()
+        elif self.unacked_pkts and ack_num == (self.base_seq_num - 1) % MAX_SEQ_NUM:
+            self.dup_acks += 1
+            if self.dup_acks == DUP_ACK_THRESHOLD:
+                await self._fast_retransmit()
+
+    async def _fast_retransmit(self) -> None:
+        if self.recover_seq is None:
+            self.congestion.on_triple_dup_ack()
+            self.recover_seq = (self.next_seq_num - 1) % MAX_SEQ_NUM
+            self.logger.debug(f"[CC] Triple duplicate ACK, {self.congestion}")
+
+        await self._retransmit_hole()
+        self._start_timer()
+
+    async def _retransmit_hole(self) -> None:
+        """
+        Sends again the first packet in flight the receiver has not SACKed.
+        """
+        for pkt in self.unacked_pkts:
+            if pkt.get_seq_num() not in self.sacked_seqs:
+                self.logger.debug(f"Retransmitting packet seq={pkt.get_seq_num()}")
+                # Karn's rule: never sample the RTT of a retransmitted packet
+                self.send_times.pop(pkt.get_seq_num(), None)
+                await self.socket.send(pkt)
+                return
+
+    async def _probe_window(self) -> None:
+        """
+        The receiver advertised a zero window and there is nothing in flight
+        whose ACK could reopen it. Wait for a window update for one RTO (the
+        persist timer), then let a single packet through as a window probe.
+        """
+        try:
+            await asyncio.wait_for(self._process_acks(), timeout=self.rtt.get_rto())
+        except asyncio.TimeoutError:
+            self.logger.debug("[FLOW] Zero window, sending a window probe")
+            self.rtt.backoff()
+            self.rwnd = 1
+
+    def _window(self) -> int:
+        return self.socket.cap_window(
+            min(self.congestion.get_window(), self.rwnd, MAX_WINDOW_SIZE)
+        )
+
+    def _advertised_window(self) -> int:
+        """
+        Free receive buffer space in packets: packets already queued on the
+        socket but not yet processed and the out-of-order ones buffered until
+        the gap before them is filled are taking up room.
+        """
+        used = self.socket.backlog() + len(self.out_of_order)
+        return max(MAX_WINDOW_SIZE - used, 0)
+
+    def _mark_sacked(self, blocks: SackBlocks) -> None:
+        for start, end in blocks:
+            block_len = seq_distance(start, end) + 1
+            if block_len > MAX_WINDOW_SIZE:
+                continue
+            for offset in range(block_len):
+                seq_num = (start + offset) % MAX_SEQ_NUM
+                if self._is_within_window(seq_num):
+                    self.sacked_seqs.add(seq_num)
+
+    async def _deliver_buffered(self, file_manager: FileManager) -> None:
+        while self.ack_num in self.out_of_order:
+            self.logger.debug(f"Delivering buffered packet seq={self.ack_num}")
+            await file_manager.write_chunk(self.out_of_order.pop(self.ack_num))
+            self.ack_num = (self.ack_num + 1) % MAX_SEQ_NUM
+
+    def _sack_blocks(self) -> SackBlocks:
+        """
+        Groups the buffered out-of-order packets into contiguous ranges.
+        """
+        blocks: SackBlocks = []
+        for seq_num in sorted(
+            self.out_of_order, key=lambda seq: seq_distance(self.ack_num, seq)
+        ):
+            if blocks and blocks[-1][1] == (seq_num - 1) % MAX_SEQ_NUM:
+                blocks[-1] = (blocks[-1][0], seq_num)
+            else:
+                blocks.append((seq_num, seq_num))
+        return blocks
 
     def _is_within_window(self, seq_num: int) -> bool:
-        wrap_around = (self.base_seq_num + WINDOW_SIZE) % MAX_SEQ_NUM
+        wrap_around = (self.base_seq_num + MAX_WINDOW_SIZE) % MAX_SEQ_NUM
         if self.base_seq_num < wrap_around:
             # If not wrapped around
             return self.base_seq_num <= seq_num < wrap_around
@@ -127,16 +279,16 @@ class GoBackN(Protocol):
 
     async def _timeout_handler(self) -> None:
         try:
-            await asyncio.sleep(TIMEOUT_INTERVAL)
-            self.logger.debug(
-                f"[TIMEOUT] Retransmitting window: {self.base_seq_num} to {self.next_seq_num}"
-            )
+            await asyncio.sleep(self.rtt.get_rto())
+            self.rtt.backoff()
+            self.congestion.on_timeout()
+            self.recover_seq = (self.next_seq_num - 1) % MAX_SEQ_NUM
+            self.dup_acks = 0
+            self.logger.debug(f"[CC] Retransmission timeout, {self.congestion}")
 
-            # Create a local copy of unacked packets to avoid mutation during send
-            packets_to_resend = list(self.unacked_pkts)
-            for pkt in packets_to_resend:
-                self.logger.debug(f"Resending packet seq={pkt.get_seq_num()}")
-                await self.socket.send(pkt)
+            # The window is down to one packet: only the first hole is sent
+            # again, the ACKs of the recovery retransmit the next ones
+            await self._retransmit_hole()
 
             self._start_timer()  # Restart timer
         except asyncio.CancelledError:
@@ -144,8 +296,10 @@ class GoBackN(Protocol):
 
     async def _send_ack(self, ack_num: int) -> None:
         ack = Packet(
+            seq_num=self._advertised_window(),
             ack_num=ack_num,
-            flags=HeaderFlags.GBN.value | HeaderFlags.ACK.value | self.mode.value,
+            data=encode_sack_blocks(self._sack_blocks()),
+            flags=self.ack_flags,
         )
         await self.socket.send(ack)
 
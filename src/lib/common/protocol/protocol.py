@@ -1,14 +1,51 @@
 import asyncio
+import os
+import tempfile
+import time
 from abc import ABC, abstractmethod
+from typing import Any, Coroutine
 
 from lib.common.config import Config
+from lib.common.file_ops.batch import BATCH_FILE, extract_batch, write_batch
+from lib.common.file_ops.delta import (
+    DELTA_FILE,
+    SIGNATURES_FILE,
+    apply_delta,
+    write_signatures,
+)
 from lib.common.file_ops.file_manager import FileManager, FileOperation
+from lib.common.file_ops.stripes import (
+    SIZE_FILE,
+    complete_stripe,
+    fail_stripe,
+    staging_name,
+    stripe_range,
+    write_size,
+)
 from lib.common.logger import Logger
+from lib.common.protocol.read_ahead import ReadAhead
+from lib.common.protocol.rtt_estimator import RTTEstimator
 from lib.common.skt.connection_socket import ConnectionSocket
-from lib.common.skt.packet import HeaderFlags, Packet
+from lib.common.skt.packet import (
+    FileRequest,
+    HeaderFlags,
+    Packet,
+    Stripe,
+    ack_flags,
+    data_flags,
+    decode_file_request,
+    decode_identity,
+    decode_offset,
+    encode_file_request,
+    encode_offset,
+    payload_buffer,
+    payload_view,
+    request_mode,
+)
 
-TIMEOUT_INTERVAL: float = 0.01
 RETRANSMISSION_RETRIES: int = 10
+# A transfer is aborted when the peer is not heard from for this long
+IDLE_TIMEOUT: float = 30.0
 
 
 class Protocol(ABC):
@@ -19,6 +56,16 @@ class Protocol(ABC):
         self.config = config
         self.logger: Logger = logger
         self.mode: HeaderFlags = HeaderFlags.NONE
+        # Flag words of the data packets and ACKs, known once mode is set
+        self.data_flags: int = 0
+        self.ack_flags: int = 0
+        self.rtt: RTTEstimator = RTTEstimator(
+            config.initial_rto, config.min_rto, config.max_rto
+        )
+        # Started by the first _read_data_packet, if enabled
+        self.read_ahead: ReadAhead | None = None
+        # Server reply to the filename packet, sent again if it is repeated
+        self.handshake_ack: Packet | None = None
 
     @classmethod
     def from_connection(
@@ -26,6 +73,7 @@ class Protocol(ABC):
     ) -> "Protocol":
         # In-line import to avoid circular dependency
         from lib.common.protocol.go_back_n import GoBackN
+        from lib.common.protocol.selective_repeat import SelectiveRepeat
         from lib.common.protocol.stop_and_wait import StopAndWait
 
         match config.protocol_type:
@@ -33,6 +81,8 @@ class Protocol(ABC):
                 return StopAndWait(conn, config, logger)
             case HeaderFlags.GBN:
                 return GoBackN(conn, config, logger)
+            case HeaderFlags.SR:
+                return SelectiveRepeat(conn, config, logger)
             case _:
                 raise ValueError("Invalid protocol type")
 
@@ -44,34 +94,90 @@ class Protocol(ABC):
     async def send_file(self, file_manager: FileManager) -> None:
         raise NotImplementedError("Must implement send_file method")
 
-    async def initiate_transaction(self) -> None:
-        file_name_pkt = Packet(
-            data=self.config.client_filename.encode(),
-            flags=self.config.protocol_type.value | self.config.client_mode.value,
-        )
+    def _set_mode(self, mode: HeaderFlags) -> None:
+        self.mode = mode
+        self.data_flags = data_flags(self.config.protocol_type, mode)
+        self.ack_flags = ack_flags(self.config.protocol_type, mode)
 
-        for _ in range(RETRANSMISSION_RETRIES):
-            try:
-                await self.socket.send(file_name_pkt)
-                ack_pkt = await asyncio.wait_for(
-                    self.socket.recv(), timeout=TIMEOUT_INTERVAL
-                )
+    async def _read_data_packet(
+        self, file_manager: FileManager, seq_num: int, flags: int
+    ) -> Packet | None:
+        """
+        Reads the next chunk of the file as a packet ready to be sent. The
+        chunk is read in place into the packet buffer, after the header, or
+        for mapped files the packet only holds a view of the mapping.
+        Unless disabled, chunks come from the read-ahead and this only waits
+        when none is ready (see _is_data_ready).
+        Returns None at the end of the file.
+        """
+        if file_manager.is_mapped():
+            data = file_manager.read_chunk()
+            if not data:
+                return None
+            return Packet(seq_num=seq_num, data=data, flags=flags)
 
-                if self.socket.is_closed():
-                    return
+        if self.config.read_ahead:
+            if self.read_ahead is None:
+                self.read_ahead = ReadAhead(file_manager, self.config.read_ahead)
+            buffer, length = await self.read_ahead.next_chunk()
+        else:
+            buffer = payload_buffer(file_manager.block_size)
+            length = file_manager.read_chunk_into(payload_view(buffer))
+        if not length:
+            return None
+        return Packet.from_payload_buffer(buffer, length, seq_num=seq_num, flags=flags)
 
-                if ack_pkt.is_ack() or ack_pkt.get_length() > 0:
-                    break
-            except asyncio.TimeoutError:
-                pass
+    def _is_data_ready(self) -> bool:
+        """
+        Whether _read_data_packet can return without waiting on the disk.
+        """
+        return self.read_ahead is None or self.read_ahead.has_ready()
 
-            await asyncio.sleep(0.5)
-        else:
-            await self.socket.disconnect()
-            raise TimeoutError("Failed to receive ACK for filename packet")
+    async def _close_file(
+        self, file_manager: FileManager, commit: bool = True, resumable: bool = True
+    ) -> None:
+        if self.read_ahead is not None:
+            await self.read_ahead.close()
+            self.read_ahead = None
+        await file_manager.wait_writes()
+        file_manager.close(commit, resumable)
 
-        self.mode = self.config.client_mode
-        file_manager = FileManager(
+    async def _check_digest(self, file_manager: FileManager) -> None:
+        """
+        With checksums on, compares the digest of the received data with the
+        sender's, carried by its FIN. On a mismatch the file is discarded
+        (not kept to be resumed) and ValueError raised.
+        """
+        if not self.socket.has_checksum():
+            return
+        if file_manager.get_digest() == self.socket.get_fin_data():
+            return
+        await self._close_file(file_manager, commit=False, resumable=False)
+        raise ValueError("Received data does not match the sender's digest")
+
+    def _advertised_window(self) -> int:
+        """
+        Receive window (in packets) advertised in the ACKs sent, see
+        Packet.get_window. Only protocols with flow control read it.
+        """
+        return 0
+
+    async def _ack_handshake_retry(self, packet: Packet) -> bool:
+        """
+        Answers a filename packet sent again because our ACK to it was lost,
+        returns whether packet was one. Once data arrives (seq_num 1
+        onwards) the handshake is over and no packet is taken for one.
+        """
+        if self.handshake_ack is None:
+            return False
+        if packet.get_seq_num() != 0:
+            self.handshake_ack = None
+            return False
+        await self.socket.send(self.handshake_ack)
+        return True
+
+    def _open_client_file(self) -> FileManager:
+        return FileManager(
             self.config.client_dst,
             self.config.client_filename,
             (
@@ -79,47 +185,240 @@ class Protocol(ABC):
                 if self.mode == HeaderFlags.UPLOAD
                 else FileOperation.WRITE
             ),
+            self.socket.get_mss(),
+            self.config.mmap,
+            self.config.resume,
+        )
+
+    async def initiate_transaction(self) -> bool:
+        """
+        Transfers config.client_filename, returns whether it completed.
+        """
+        self._set_mode(self.config.client_mode)
+        file_manager = self._open_client_file()
+        # Downloads resume from what we have, uploads from what the server has
+        offset: int | None = None
+        if self.config.resume and self.mode == HeaderFlags.DOWNLOAD:
+            offset = file_manager.get_offset()
+        elif self.config.resume:
+            offset = 0
+
+        # Uploads send the identity of the file, downloads the one their
+        # partial copy was checkpointed with
+        request = encode_file_request(
+            self.config.client_filename,
+            offset,
+            identity=file_manager.get_identity() if self.config.resume else None,
         )
+        return await self._run_client_transfer(file_manager, request, offset)
 
+    async def request_file(
+        self, request: FileRequest, dir_path: str, file_name: str
+    ) -> bool:
+        """
+        Makes a SIGNATURES, SIZE, DELTA or BATCH request about
+        config.client_filename, its data (see FileRequest) is transferred
+        from or to file_name in dir_path. Returns whether it completed.
+        """
+        mode = request_mode(request)
+        self._set_mode(self.config.client_mode if mode is None else mode)
+        file_manager = FileManager(
+            dir_path,
+            file_name,
+            (
+                FileOperation.READ
+                if self.mode == HeaderFlags.UPLOAD
+                else FileOperation.WRITE
+            ),
+            self.socket.get_mss(),
+            self.config.mmap,
+        )
+        return await self._run_client_transfer(
+            file_manager,
+            encode_file_request(self.config.client_filename, request=request),
+            None,
+        )
+
+    async def transfer_stripe(self, stripe: Stripe) -> bool:
+        """
+        Transfers a stripe of config.client_filename (see file_ops.stripes),
+        returns whether it completed. Downloaded stripes are written into
+        the staging file of the transfer, stored as the file once all are in.
+        """
+        self._set_mode(self.config.client_mode)
+        index, count, size, transfer_id = stripe
+        start, end = stripe_range(size, index, count)
+        staging = staging_name(self.config.client_filename, transfer_id)
         if self.mode == HeaderFlags.UPLOAD:
-            await self.send_file(file_manager)
-        elif self.mode == HeaderFlags.DOWNLOAD:
-            await self.recv_file(file_manager)
+            file_manager = FileManager(
+                self.config.client_dst,
+                self.config.client_filename,
+                FileOperation.READ,
+                self.socket.get_mss(),
+                self.config.mmap,
+            )
+            file_manager.set_end(end)
         else:
-            raise ValueError(f"Invalid mode in packet {self.config.client_mode}")
+            file_manager = FileManager(
+                self.config.client_dst,
+                staging,
+                FileOperation.WRITE,
+                self.socket.get_mss(),
+                in_place=True,
+            )
+        file_manager.seek(start)
 
-    async def handle_connection(self) -> None:
-        for _ in range(RETRANSMISSION_RETRIES):
+        request = encode_file_request(
+            self.config.client_filename, request=FileRequest.STRIPE, stripe=stripe
+        )
+        if not await self._run_client_transfer(file_manager, request, None):
+            return False
+        if self.mode == HeaderFlags.DOWNLOAD:
+            complete_stripe(
+                os.path.join(self.config.client_dst, staging),
+                os.path.join(self.config.client_dst, self.config.client_filename),
+                index,
+                count,
+                size,
+            )
+        return True
+
+    async def _run_client_transfer(
+        self, file_manager: FileManager, request: bytes, offset: int | None
+    ) -> bool:
+        """
+        Sends the filename packet carrying request and transfers the file,
+        from offset if resuming. Returns whether the transfer completed.
+        """
+        file_name_pkt = Packet(data=request, flags=self.data_flags)
+
+        ack_pkt: Packet | None = None
+        try:
+            if not self.socket.is_connected() and not self.socket.is_closed():
+                # Left to us by the client, so the SYN carries the filename
+                # packet (fast open). The file was opened for the mss the
+                # client proposed, the server may have taken a smaller one
+                await self.socket.connect(self.config.pmtu_discovery, file_name_pkt)
+                file_manager.set_block_size(self.socket.get_mss())
+            if not self.socket.is_fast_open() and not self.socket.is_closed():
+                ack_pkt = await self._send_file_request(file_name_pkt)
+        except BaseException:
+            await self._close_file(file_manager, commit=False)
+            raise
+        if self.socket.is_closed():
+            await self._close_file(file_manager, commit=False)
+            return False
+
+        if offset is not None:
+            # Anything but the filename ACK means it was lost, the server
+            # then started where we asked
+            ack_data = ack_pkt.get_data() if ack_pkt is not None else b""
+            start = (
+                decode_offset(ack_data)
+                if ack_pkt is not None and ack_pkt.is_ack()
+                else None
+            )
+            file_manager.seek(offset if start is None else start)
+            identity = decode_identity(ack_data) if start is not None else None
+            if self.mode == HeaderFlags.DOWNLOAD and identity is not None:
+                # Saved with the checkpoints of the partial copy
+                file_manager.set_identity(identity)
+            self.logger.info(
+                f"[Protocol] Resuming transfer at byte {file_manager.get_offset()}"
+            )
+        if self.socket.has_checksum():
+            file_manager.track_digest()
+        compression = self.socket.get_compression()
+        if compression is not None:
+            file_manager.set_compression(*compression)
+
+        try:
+            if self.mode == HeaderFlags.UPLOAD:
+                await self._transfer(self.send_file(file_manager))
+            elif self.mode == HeaderFlags.DOWNLOAD:
+                await self._transfer(self.recv_file(file_manager))
+                await self._check_digest(file_manager)
+            else:
+                raise ValueError(f"Invalid mode in packet {self.config.client_mode}")
+            await file_manager.flush()
+        except BaseException:
+            await self._close_file(file_manager, commit=False)
+            raise
+        await self._close_file(file_manager)
+
+        self.logger.debug(f"[Protocol] Transfer finished with {self.rtt}")
+        return True
+
+    async def _transfer(self, transfer: Coroutine[Any, Any, None]) -> None:
+        """
+        Runs send_file or recv_file, raising TimeoutError if the peer goes
+        silent for IDLE_TIMEOUT. The transfer then fails like any other, so
+        its file is closed (and checkpointed) instead of hanging forever.
+        """
+        task = asyncio.create_task(transfer)
+        try:
+            while not task.done():
+                remaining = IDLE_TIMEOUT - self.socket.idle_time()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"No packets from {self.socket.addr} in {IDLE_TIMEOUT}s"
+                    )
+                await asyncio.wait([task], timeout=remaining)
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        task.result()
+
+    async def _send_file_request(self, file_name_pkt: Packet) -> Packet | None:
+        """
+        Sends the filename packet until it is answered, returns the answer or
+        None if the server closed the connection.
+        """
+        for attempt in range(RETRANSMISSION_RETRIES):
             try:
-                file_name_pkt = await asyncio.wait_for(
-                    self.socket.recv(), timeout=TIMEOUT_INTERVAL
+                sent_at = time.monotonic()
+                await self.socket.send(file_name_pkt)
+                ack_pkt = await asyncio.wait_for(
+                    self.socket.recv(), timeout=self.rtt.get_rto()
                 )
 
                 if self.socket.is_closed():
-                    return
+                    return None
 
-                if file_name_pkt.get_protocol_type() != self.config.protocol_type:
-                    await self.socket.disconnect()
-                    return
+                if ack_pkt.is_ack() or ack_pkt.get_length() > 0:
+                    if attempt == 0:
+                        self.rtt.add_sample(time.monotonic() - sent_at)
+                    return ack_pkt
+            except asyncio.TimeoutError:
+                self.rtt.backoff()
 
-                file_name = file_name_pkt.get_data().decode().strip()
-                self.mode = file_name_pkt.get_mode()
+        await self.socket.disconnect()
+        raise TimeoutError("Failed to receive ACK for filename packet")
 
-                ack = Packet(
-                    flags=self.config.protocol_type.value
-                    | HeaderFlags.ACK.value
-                    | self.mode.value,
-                )
-                await self.socket.send(ack)
-                break
-            except asyncio.TimeoutError:
-                pass
+    async def handle_connection(self) -> None:
+        # Carried by the SYN with fast open
+        file_name_pkt = self.socket.get_syn_request()
+        if file_name_pkt is None:
+            file_name_pkt = await self._recv_file_request()
+        if file_name_pkt is None:
+            return
 
-            await asyncio.sleep(0.5)
-        else:
-            self.logger.error("Failed to receive file name packet")
+        try:
+            file_name, offset, request, stripe, identity = decode_file_request(
+                file_name_pkt.get_data()
+            )
+        except ValueError as e:
+            self.logger.error(f"Invalid file request: {e}")
             await self.socket.disconnect()
             return
+        self._set_mode(file_name_pkt.get_mode())
+        if stripe is not None:
+            await self._handle_stripe_request(file_name, stripe)
+            return
+        if request != FileRequest.FILE:
+            await self._handle_derived_request(file_name, request)
+            return
 
         try:
             file_manager = FileManager(
@@ -130,14 +429,255 @@ class Protocol(ABC):
                     if self.mode == HeaderFlags.UPLOAD
                     else FileOperation.READ
                 ),
+                self.socket.get_mss(),
+                self.config.mmap,
+                offset is not None,
+                identity=identity,
+            )
+        except FileNotFoundError:
+            self.logger.error("File not found")
+            await self.socket.disconnect()
+            return
+        task = asyncio.current_task()
+        if task is not None:
+            # A resumed upload of the same file takes the .part over from us
+            file_manager.set_abort_handler(task.cancel)
+
+        if self.mode == HeaderFlags.DOWNLOAD and offset is not None:
+            # A partial copy of another version of the file starts over
+            same = identity == file_manager.get_identity()
+            file_manager.seek(offset if same else 0)
+        if file_manager.get_offset():
+            self.logger.info(
+                f"[Protocol] Resuming {file_name} at byte {file_manager.get_offset()}"
+            )
+        await self._serve_file(file_manager, file_name)
+
+    async def _recv_file_request(self) -> Packet | None:
+        """
+        Waits for the filename packet, returns None if the connection ended
+        instead.
+        """
+        for _ in range(RETRANSMISSION_RETRIES):
+            try:
+                file_name_pkt = await asyncio.wait_for(
+                    self.socket.recv(), timeout=self.rtt.get_rto()
+                )
+
+                if self.socket.is_closed():
+                    return None
+
+                if file_name_pkt.get_protocol_type() != self.config.protocol_type:
+                    await self.socket.disconnect()
+                    return None
+
+                return file_name_pkt
+            except asyncio.TimeoutError:
+                pass
+
+        self.logger.error("Failed to receive file name packet")
+        await self.socket.disconnect()
+        return None
+
+    async def _handle_derived_request(
+        self, file_name: str, request: FileRequest
+    ) -> None:
+        """
+        Sends the signatures or the size of the stored file_name, or
+        receives a delta against it and rebuilds the file from it, or sends
+        or stores the files under the directory file_name (see
+        file_ops.delta, file_ops.stripes and file_ops.batch).
+        """
+        if request_mode(request) not in (self.mode, None):
+            self.logger.error(f"Invalid mode for a {request.name} request")
+            await self.socket.disconnect()
+            return
+
+        loop = asyncio.get_running_loop()
+        filepath = os.path.join(self.config.server_dirpath, file_name)
+        # Next to the stored files, the delta may be as large as the file
+        with tempfile.TemporaryDirectory(
+            dir=self.config.server_dirpath,
+            prefix=f".{os.path.basename(file_name)}.",
+        ) as tmp_dir:
+            if self.mode == HeaderFlags.DOWNLOAD:
+                reply, write_reply = {
+                    FileRequest.SIGNATURES: (SIGNATURES_FILE, write_signatures),
+                    FileRequest.SIZE: (SIZE_FILE, write_size),
+                    FileRequest.BATCH: (BATCH_FILE, write_batch),
+                }[request]
+                try:
+                    await loop.run_in_executor(
+                        None, write_reply, filepath, os.path.join(tmp_dir, reply)
+                    )
+                except FileNotFoundError:
+                    self.logger.error("File not found")
+                    await self.socket.disconnect()
+                    return
+                except ValueError as e:
+                    self.logger.error(f"[Protocol] Cannot send {file_name}: {e}")
+                    await self.socket.disconnect()
+                    return
+                await self._serve_file(
+                    FileManager(
+                        tmp_dir,
+                        reply,
+                        FileOperation.READ,
+                        self.socket.get_mss(),
+                        self.config.mmap,
+                    ),
+                    file_name,
+                )
+                return
+
+            received = DELTA_FILE if request == FileRequest.DELTA else BATCH_FILE
+            file_manager = FileManager(
+                tmp_dir,
+                received,
+                FileOperation.WRITE,
+                self.socket.get_mss(),
+                self.config.mmap,
+            )
+            # The client learns from the answer to its FIN whether the
+            # received data could be used
+            if not await self._serve_file(file_manager, file_name, answer_fin=False):
+                return
+            if request == FileRequest.BATCH:
+                try:
+                    count = await loop.run_in_executor(
+                        None, extract_batch, os.path.join(tmp_dir, received), filepath
+                    )
+                except ValueError as e:
+                    self.logger.error(f"[Protocol] Batch for {file_name} rejected: {e}")
+                    await self.socket.answer_fin(f"Batch rejected: {e}")
+                    return
+                await self.socket.answer_fin()
+                self.logger.info(f"[Protocol] Stored {count} files under {file_name}")
+                return
+            try:
+                size = await loop.run_in_executor(
+                    None,
+                    apply_delta,
+                    filepath,
+                    os.path.join(tmp_dir, DELTA_FILE),
+                    filepath,
+                )
+            except ValueError as e:
+                self.logger.error(f"[Protocol] Delta for {file_name} rejected: {e}")
+                await self.socket.answer_fin(f"Delta rejected: {e}")
+                return
+            await self.socket.answer_fin()
+            self.logger.info(
+                f"[Protocol] Rebuilt {file_name} from a delta ({size} bytes)"
             )
 
+    async def _handle_stripe_request(self, file_name: str, stripe: Stripe) -> None:
+        """
+        Sends a stripe of the stored file_name, or receives one into the
+        staging file of the transfer, stored as file_name once all are in.
+        """
+        index, count, size, transfer_id = stripe
+        start, end = stripe_range(size, index, count)
+        if self.mode == HeaderFlags.DOWNLOAD:
+            try:
+                file_manager = FileManager(
+                    self.config.server_dirpath,
+                    file_name,
+                    FileOperation.READ,
+                    self.socket.get_mss(),
+                    self.config.mmap,
+                )
+            except FileNotFoundError:
+                self.logger.error("File not found")
+                await self.socket.disconnect()
+                return
+            if file_manager.get_size() != size:
+                # Changed since the client asked for its size
+                self.logger.error(f"Stripe of {file_name} for another version")
+                file_manager.close()
+                await self.socket.disconnect()
+                return
+            file_manager.set_end(end)
+        else:
+            file_manager = FileManager(
+                self.config.server_dirpath,
+                staging_name(file_name, transfer_id),
+                FileOperation.WRITE,
+                self.socket.get_mss(),
+                in_place=True,
+            )
+        file_manager.seek(start)
+
+        staging = os.path.join(
+            self.config.server_dirpath, staging_name(file_name, transfer_id)
+        )
+        if not await self._serve_file(file_manager, file_name):
+            if self.mode == HeaderFlags.UPLOAD:
+                # The client gave up on the transfer, no stripe will be resent
+                fail_stripe(staging, index, count)
+            return
+        filepath = os.path.join(self.config.server_dirpath, file_name)
+        if self.mode == HeaderFlags.UPLOAD and complete_stripe(
+            staging, filepath, index, count, size
+        ):
+            self.logger.info(f"[Protocol] Reassembled {file_name} from {count} stripes")
+
+    async def _serve_file(
+        self, file_manager: FileManager, file_name: str, answer_fin: bool = True
+    ) -> bool:
+        """
+        Acknowledges the filename packet, or takes the request carried by
+        the SYN with the SYN-ACK, and transfers the file. Returns whether
+        the transfer completed.
+        The FIN ending an upload is only acknowledged once the file is
+        stored, or rejected if it cannot be. Without answer_fin a completed
+        upload leaves that to the caller (see ConnectionSocket.answer_fin).
+        """
+        if self.socket.get_syn_request() is None:
+            self.handshake_ack = Packet(
+                seq_num=self._advertised_window(),
+                data=encode_offset(
+                    file_manager.get_offset(),
+                    (
+                        file_manager.get_identity()
+                        if self.mode == HeaderFlags.DOWNLOAD
+                        else None
+                    ),
+                ),
+                flags=self.ack_flags,
+            )
+        if self.socket.has_checksum():
+            file_manager.track_digest()
+        compression = self.socket.get_compression()
+        if compression is not None:
+            file_manager.set_compression(*compression)
+        try:
+            if self.handshake_ack is None:
+                await self.socket.accept_request()
+            else:
+                await self.socket.send(self.handshake_ack)
             if self.mode == HeaderFlags.UPLOAD:
-                await self.recv_file(file_manager)
+                self.socket.defer_fin_ack()
+                await self._transfer(self.recv_file(file_manager))
+                await self._check_digest(file_manager)
             elif self.mode == HeaderFlags.DOWNLOAD:
-                await self.send_file(file_manager)
+                await self._transfer(self.send_file(file_manager))
             else:
                 raise ValueError("Invalid mode in packet")
-        except FileNotFoundError:
-            self.logger.error("File not found")
-            await self.socket.disconnect()
+            await file_manager.flush()
+        except (TimeoutError, ValueError) as e:
+            # The client is gone (a resumable upload keeps its checkpoint) or
+            # the data is corrupt
+            await self._close_file(file_manager, commit=False)
+            self.logger.error(f"[Protocol] Transfer of {file_name} aborted: {e}")
+            await self.socket.answer_fin(str(e))
+            return False
+        except BaseException:
+            await self._close_file(file_manager, commit=False)
+            raise
+        await self._close_file(file_manager)
+        if answer_fin:
+            await self.socket.answer_fin()
+
+        self.logger.debug(f"[Protocol] Transfer finished with {self.rtt}")
+        return True
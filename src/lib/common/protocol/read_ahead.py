@@ -0,0 +1,65 @@
+import asyncio
+from typing import Tuple
+
+from lib.common.file_ops.file_manager import FileManager
+from lib.common.skt.packet import payload_buffer, payload_view
+
+# A payload_buffer and the length of the chunk read into it, 0 at the end
+Chunk = Tuple[bytearray, int]
+
+
+class ReadAhead:
+    def __init__(self, file_manager: FileManager, depth: int) -> None:
+        """
+        Reads the upcoming chunks of file_manager on the event loop's thread
+        pool and keeps up to depth of them ready, so a sender only waits on
+        the disk when it is faster than it and never blocks the event loop.
+        Chunks are read in place into payload buffers, like
+        Protocol._read_data_packet does.
+        """
+        self.file_manager = file_manager
+        self.ready: asyncio.Queue[Chunk | BaseException] = asyncio.Queue(maxsize=depth)
+        self.eof: bool = False
+        # Read running on the thread pool, if any
+        self.reading: asyncio.Future[Chunk] | None = None
+        self.producer: asyncio.Task[None] = asyncio.create_task(self._produce())
+
+    def has_ready(self) -> bool:
+        return self.eof or not self.ready.empty()
+
+    async def next_chunk(self) -> Chunk:
+        if self.eof:
+            return bytearray(), 0
+        chunk = await self.ready.get()
+        if isinstance(chunk, BaseException):
+            raise chunk
+        self.eof = chunk[1] == 0
+        return chunk
+
+    async def close(self) -> None:
+        """
+        Stops reading ahead. A read already running on the thread pool
+        cannot be cancelled, it is waited for so the file can be closed.
+        """
+        self.producer.cancel()
+        if self.reading is not None:
+            await asyncio.gather(self.reading, return_exceptions=True)
+
+    def _read(self) -> Chunk:
+        buffer = payload_buffer(self.file_manager.block_size)
+        return buffer, self.file_manager.read_chunk_into(payload_view(buffer))
+
+    async def _produce(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self.reading = loop.run_in_executor(None, self._read)
+            try:
+                # Cancelling the producer must not cancel the read (see close)
+                chunk = await asyncio.shield(self.reading)
+            except Exception as e:
+                # Raised to the sender by next_chunk
+                await self.ready.put(e)
+                return
+            await self.ready.put(chunk)
+            if chunk[1] == 0:
+                return
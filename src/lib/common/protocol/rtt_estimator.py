@@ -0,0 +1,59 @@
+# RFC 6298 asks for 1s (initial and minimum) and at least 60s (maximum),
+# meant for Internet paths and delayed ACKs. Every packet here is ACKed at
+# once and the links are LANs with RTTs of a few ms, where a 1s minimum
+# stalls each loss for hundreds of RTTs. --initial-rto 1 --min-rto 1
+# --max-rto 60 gives the RFC's bounds
+INITIAL_RTO: float = 0.1
+MIN_RTO: float = 0.005
+MAX_RTO: float = 2.0
+
+ALPHA: float = 1 / 8  # SRTT gain
+BETA: float = 1 / 4  # RTTVAR gain
+K: int = 4
+
+
+class RTTEstimator:
+    def __init__(
+        self,
+        initial_rto: float = INITIAL_RTO,
+        min_rto: float = MIN_RTO,
+        max_rto: float = MAX_RTO,
+    ) -> None:
+        """
+        Per-connection round-trip time estimator (Jacobson/Karels, RFC 6298).
+        Callers apply Karn's rule: only packets that were never retransmitted
+        are fed as samples, and every retransmission timeout calls backoff().
+        """
+        self.srtt: float | None = None
+        self.rttvar: float = 0.0
+        self.rto: float = initial_rto
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+
+    def __repr__(self) -> str:
+        srtt = f"{self.srtt * 1000:.3f}ms" if self.srtt is not None else "None"
+        return (
+            f"RTTEstimator(srtt={srtt}, "
+            f"rttvar={self.rttvar * 1000:.3f}ms, "
+            f"rto={self.rto * 1000:.3f}ms)"
+        )
+
+    def add_sample(self, rtt: float) -> None:
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+
+        # A fresh sample also discards any exponential backoff
+        self.rto = min(max(self.srtt + K * self.rttvar, self.min_rto), self.max_rto)
+
+    def backoff(self) -> None:
+        self.rto = min(self.rto * 2, self.max_rto)
+
+    def get_rto(self) -> float:
+        return self.rto
+
+    def get_srtt(self) -> float | None:
+        return self.srtt
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from asyncio.tasks import Task
+from typing import Any, Dict
+
+from lib.common.config import Config
+from lib.common.file_ops.file_manager import FileManager
+from lib.common.logger import Logger
+from lib.common.protocol.protocol import Protocol
+from lib.common.skt.connection_socket import ConnectionSocket
+from lib.common.skt.packet import MAX_SEQ_NUM, Packet, seq_distance
+
+WINDOW_SIZE: int = 8
+
+
+class SelectiveRepeat(Protocol):
+    def __init__(
+        self, socket: ConnectionSocket, config: Config, logger: Logger
+    ) -> None:
+        super().__init__(socket, config, logger)
+        # Receiver side
+        self.rcv_base = 1
+        self.reorder_buffer: Dict[int, bytes | memoryview] = dict()
+        # Sender side
+        self.send_base = 1
+        self.next_seq_num = 1
+        self.unacked_pkts: Dict[int, Packet] = dict()
+        self.timers: Dict[int, Task[Any]] = dict()
+        self.send_times: Dict[int, float] = dict()
+
+    async def recv_file(self, file_manager: FileManager) -> None:
+        try:
+            while True:
+                packet = await self.socket.recv()
+                if self.socket.is_closed():
+                    break
+                if await self._ack_handshake_retry(packet):
+                    continue
+
+                seq_num = packet.get_seq_num()
+                if seq_distance(self.rcv_base, seq_num) < WINDOW_SIZE:
+                    await self._send_ack(seq_num)
+                    if seq_num not in self.reorder_buffer:
+                        self.logger.debug(f"Buffering packet seq={seq_num}")
+                        self.reorder_buffer[seq_num] = packet.get_data()
+                    await self._deliver_in_order(file_manager)
+                elif 0 < seq_distance(seq_num, self.rcv_base) <= WINDOW_SIZE:
+                    # Already delivered, the ACK must have been lost so it
+                    # is sent again
+                    self.logger.debug(f"Received duplicate packet seq={seq_num}")
+                    await self._send_ack(seq_num)
+
+        except Exception as e:
+            self.logger.error(f"Receive failed: {e}")
+            raise
+
+    async def send_file(self, file_manager: FileManager) -> None:
+        try:
+            while True:
+                window = self.socket.cap_window(WINDOW_SIZE)
+                if seq_distance(self.send_base, self.next_seq_num) < window:
+                    packet = await self._read_data_packet(
+                        file_manager, self.next_seq_num, self.data_flags
+                    )
+                    if packet is None:
+                        break
+
+                    self.send_times[self.next_seq_num] = time.monotonic()
+                    await self.socket.send(packet)
+
+                    self.unacked_pkts[self.next_seq_num] = packet
+                    self._start_timer(self.next_seq_num)
+
+                    self.next_seq_num = (self.next_seq_num + 1) % MAX_SEQ_NUM
+                else:
+                    await self._process_acks()
+
+            while self.unacked_pkts:
+                await self._process_acks()
+
+            # Only a complete transfer ends with a FIN (see GoBackN)
+            await self.socket.disconnect(file_manager.get_digest())
+        except Exception as e:
+            self.logger.error(f"Send failed: {e}")
+            raise
+        finally:
+            self.unacked_pkts.clear()
+            self.send_times.clear()
+            for seq_num in list(self.timers):
+                self._stop_timer(seq_num)
+
+    async def _deliver_in_order(self, file_manager: FileManager) -> None:
+        while self.rcv_base in self.reorder_buffer:
+            self.logger.debug(f"Delivering packet seq={self.rcv_base}")
+            await file_manager.write_chunk(self.reorder_buffer.pop(self.rcv_base))
+            self.rcv_base = (self.rcv_base + 1) % MAX_SEQ_NUM
+
+    async def _process_acks(self) -> None:
+        ack_packet = await self.socket.recv()
+        if not ack_packet.is_ack():
+            return
+
+        ack_num = ack_packet.get_ack_num()
+        if ack_num not in self.unacked_pkts:
+            return
+
+        self.logger.debug(f"[ACK] Received ACK for packet ack={ack_num}")
+        del self.unacked_pkts[ack_num]
+        self._stop_timer(ack_num)
+
+        sent_at = self.send_times.pop(ack_num, None)
+        if sent_at is not None:
+            self.rtt.add_sample(time.monotonic() - sent_at)
+
+        # Slide the window up to the oldest packet still waiting for its ACK
+        while (
+            self.send_base != self.next_seq_num
+            and self.send_base not in self.unacked_pkts
+        ):
+            self.send_base = (self.send_base + 1) % MAX_SEQ_NUM
+
+    def _start_timer(self, seq_num: int) -> None:
+        self._stop_timer(seq_num)
+        self.timers[seq_num] = asyncio.create_task(self._timeout_handler(seq_num))
+
+    def _stop_timer(self, seq_num: int) -> None:
+        timer = self.timers.pop(seq_num, None)
+        if timer:
+            timer.cancel()
+
+    async def _timeout_handler(self, seq_num: int) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.rtt.get_rto())
+                packet = self.unacked_pkts.get(seq_num)
+                if packet is None:
+                    return
+                # Back off once per loss episode, not once per timed out packet
+                if seq_num == self.send_base:
+                    self.rtt.backoff()
+                self.logger.debug(f"[TIMEOUT] Resending packet seq={seq_num}")
+                # Karn's rule: never sample the RTT of a retransmitted packet
+                self.send_times.pop(seq_num, None)
+                await self.socket.send(packet)
+        except asyncio.CancelledError:
+            pass
+
+    async def _send_ack(self, ack_num: int) -> None:
+        ack = Packet(
+            ack_num=ack_num,
+            flags=self.ack_flags,
+        )
+        await self.socket.send(ack)
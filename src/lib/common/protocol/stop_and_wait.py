@@ -1,14 +1,12 @@
 import asyncio
+import time
 
 from lib.common.config import Config
 from lib.common.file_ops.file_manager import FileManager
 from lib.common.logger import Logger
-from lib.common.protocol.protocol import (
-    TIMEOUT_INTERVAL,
-    Protocol,
-)
+from lib.common.protocol.protocol import Protocol
 from lib.common.skt.connection_socket import ConnectionSocket
-from lib.common.skt.packet import HeaderFlags, Packet
+from lib.common.skt.packet import Packet
 
 
 class StopAndWait(Protocol):
@@ -21,14 +19,16 @@ class StopAndWait(Protocol):
         while True:
             try:
                 packet = await asyncio.wait_for(
-                    self.socket.recv(), timeout=TIMEOUT_INTERVAL
+                    self.socket.recv(), timeout=self.rtt.get_rto()
                 )
                 if self.socket.is_closed():
                     break
+                if await self._ack_handshake_retry(packet):
+                    continue
 
                 if packet.get_seq_num() == self.ack_num:
                     self.logger.debug(f"Received valid packet seq={self.ack_num}")
-                    file_manager.write_chunk(packet.get_data())
+                    await file_manager.write_chunk(packet.get_data())
                     self.ack_num = 1 - self.ack_num
 
                 await self._send_ack()
@@ -37,40 +37,47 @@ class StopAndWait(Protocol):
 
     async def send_file(self, file_manager: FileManager) -> None:
         while True:
-            block = file_manager.read_chunk()
-            if not block:
+            packet = await self._read_data_packet(
+                file_manager, self.seq_num, self.data_flags
+            )
+            if packet is None:
                 break
 
+            retransmission = False
             while True:
                 try:
-                    await self._send_data(block)
+                    await self._send_data(packet, retransmission)
                     break
                 except TimeoutError:
-                    continue
+                    self.rtt.backoff()
+                    retransmission = True
 
             self.seq_num = 1 - self.seq_num
 
-        await self.socket.disconnect()
+        await self.socket.disconnect(file_manager.get_digest())
 
     async def _send_ack(self) -> None:
         ack = Packet(
             ack_num=self.ack_num,
-            flags=HeaderFlags.SW.value | HeaderFlags.ACK.value | self.mode.value,
+            flags=self.ack_flags,
         )
         await self.socket.send(ack)
 
-    async def _send_data(self, data: bytes) -> None:
+    async def _send_data(self, packet: Packet, retransmission: bool) -> None:
         self.logger.debug(f"Sending packet seq={self.seq_num}")
-        packet = Packet(
-            seq_num=self.seq_num,
-            data=data,
-            flags=HeaderFlags.SW.value | self.mode.value,
-        )
+        sent_at = time.monotonic()
         await self.socket.send(packet)
-        ack_packet = await asyncio.wait_for(
-            self.socket.recv(), timeout=TIMEOUT_INTERVAL
-        )
-        if not ack_packet.is_ack() or (
-            ack_packet.is_ack() and ack_packet.get_ack_num() == self.seq_num
-        ):
-            raise TimeoutError("Failed to receive ACK for packet")
+
+        deadline = sent_at + self.rtt.get_rto()
+        while True:
+            ack_packet = await asyncio.wait_for(
+                self.socket.recv(), timeout=max(deadline - time.monotonic(), 0)
+            )
+            if ack_packet.is_ack() and ack_packet.get_ack_num() != self.seq_num:
+                break
+            # Duplicated ACK of the previous packet, keep waiting for ours
+            # instead of retransmitting (and backing off) right away
+
+        # Karn's rule: an ACK for a retransmitted packet is ambiguous
+        if not retransmission:
+            self.rtt.add_sample(time.monotonic() - sent_at)
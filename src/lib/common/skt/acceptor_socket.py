@@ -1,32 +1,68 @@
 import asyncio
-from typing import Tuple
+from collections import deque
+from typing import Tuple, Type
 
 from lib.common.flow_manager import FlowManager
 from lib.common.logger import Logger
 from lib.common.skt.connection_socket import ConnectionSocket
-from lib.common.skt.packet import HeaderFlags, Packet
-from lib.common.skt.udp_socket import UDPSocket
+from lib.common.skt.packet import (
+    DEFAULT_SEGMENT_SIZE,
+    PROTOCOL_MASK,
+    SYN_MASK,
+    Codec,
+    HeaderFlags,
+    Packet,
+    SynOption,
+    SynOptions,
+    encode_compression_option,
+    encode_size_option,
+    encode_syn_options,
+)
+from lib.common.skt.udp_socket import Datagram, UDPSocket
+from lib.common.skt.udp_transport import UDPTransport
 
 
 class AcceptorSocket:
     def __init__(
-        self, protocol: HeaderFlags, flow_manager: FlowManager, logger: Logger
+        self,
+        protocol: HeaderFlags,
+        flow_manager: FlowManager,
+        logger: Logger,
+        mss: int = DEFAULT_SEGMENT_SIZE,
+        udp_backend: Type[UDPSocket] = UDPSocket,
+        shared_socket: bool = True,
     ) -> None:
         """
         AcceptorSocket is responsible for accepting incoming connections
         and demultiplexing packets to the appropriate flow queue.
+        mss is the largest segment size the server agrees to.
+        With the UDPTransport backend, data for established flows is
+        demultiplexed from the transport callback and never reaches accept.
+        With shared_socket, accepted connections also send through the bound
+        socket, so every flow uses the server port in both directions.
         """
-        if protocol not in (HeaderFlags.GBN, HeaderFlags.SW):
+        if protocol not in (HeaderFlags.GBN, HeaderFlags.SW, HeaderFlags.SR):
             raise ValueError("Invalid protocol type")
         self.protocol = protocol
-        self.udp_skt = UDPSocket()
+        self.protocol_flags: int = protocol.value
+        self.mss = mss
+        self.udp_backend = udp_backend
+        self.shared_socket = shared_socket
+        self.udp_skt = udp_backend(mss)
+        if isinstance(self.udp_skt, UDPTransport):
+            self.udp_skt.set_datagram_handler(self._dispatch)
+        # Datagrams read in the last batch and not yet demultiplexed
+        self.pending: deque[Datagram] = deque()
         self.flow_manager = flow_manager
         self.logger = logger
 
-    def bind(self, host: str, port: int) -> None:
+    def bind(self, host: str, port: int, reuse_port: bool = False) -> None:
         """
         Binds the socket to the specified host and port.
+        With reuse_port other acceptors (worker processes) may bind it too.
         """
+        if reuse_port:
+            self.udp_skt.set_reuse_port()
         self.udp_skt.bind(host, port)
 
     async def accept(self) -> ConnectionSocket:
@@ -38,41 +74,124 @@ class AcceptorSocket:
         Demultiplexes incomming messages from conneted processes
         """
         while True:
-            data, sender = await self.udp_skt.recv_all()
+            if not self.pending:
+                self.pending.extend(await self.udp_skt.recv_batch())
+            data, sender = self.pending.popleft()
             pkt = Packet.from_bytes(data)
 
             if self._is_protocol_invalid(pkt):
                 await self._send_fin(sender)
+            elif pkt.is_syn() and pkt.get_pmtu_probe() is not None:
+                await self._send_probe_echo(sender, pkt)
             elif pkt.is_syn():
                 self.logger.debug(f"[AcceptorSocket] SYN packet received from {sender}")
+                mss = min(pkt.get_mss(), self.mss)
+                options = pkt.get_syn_options()
+                # Checksums, compression and fast open are always agreed to
+                # when proposed
+                checksum = SynOption.CHECKSUM in options
+                compression = pkt.get_compression()
+                request = options.get(SynOption.REQUEST)
                 if self.flow_manager.does_flow_exist(sender):
-                    # Resend syn-ack if packet was lost
-                    await self._send_syn_ack(sender)
+                    if request is not None:
+                        # Answered by the connection, once it took the request
+                        self.flow_manager.demultiplex_packet(sender, pkt)
+                    else:
+                        # Resend syn-ack if packet was lost
+                        await self._send_syn_ack(sender, mss, checksum, compression)
                     continue
 
-                # Hanshake the new connection
+                # Hanshake the new connection, with fast open the connection
+                # sends the syn-ack once it takes the request
                 q: asyncio.Queue[Packet] = self.flow_manager.add_flow(sender)
-                await self._send_syn_ack(sender)
+                if request is None:
+                    await self._send_syn_ack(sender, mss, checksum, compression)
                 return await ConnectionSocket.for_server(
-                    sender, q, self.protocol, self.logger
+                    sender,
+                    q,
+                    self.protocol,
+                    self.logger,
+                    mss,
+                    self.udp_backend,
+                    self.udp_skt if self.shared_socket else None,
+                    checksum,
+                    (
+                        None
+                        if request is None
+                        else Packet(data=request, flags=pkt.get_flags() & ~SYN_MASK)
+                    ),
+                    compression,
                 )
+            elif not self.flow_manager.does_flow_exist(sender):
+                # Late packet from an already closed connection
+                continue
             elif pkt.is_fin():
-                if not self.flow_manager.does_flow_exist(sender):
-                    continue
-                await self.flow_manager.demultiplex_packet(sender, pkt)
+                self.flow_manager.demultiplex_packet(sender, pkt)
+                self.logger.debug(
+                    f"[AcceptorSocket] Flow {sender} closed: "
+                    f"{self.flow_manager.get_stats(sender)}"
+                )
                 self.flow_manager.remove_flow(sender)
-            else:
-                await self.flow_manager.demultiplex_packet(sender, pkt)
+            elif not self.flow_manager.demultiplex_packet(sender, pkt):
+                self.logger.debug(
+                    f"[AcceptorSocket] Flow {sender} queue full, packet dropped"
+                )
+
+    def _dispatch(self, data: bytes, sender: Tuple[str, int]) -> bool:
+        """
+        Fast path called by the transport for every datagram: packets of an
+        established flow go straight to its queue. Handshakes, FINs and
+        unknown senders are left for accept to handle.
+        """
+        if not self.flow_manager.does_flow_exist(sender):
+            return False
+        pkt = Packet.from_bytes(data)
+        if self._is_protocol_invalid(pkt) or pkt.is_syn() or pkt.is_fin():
+            return False
+        if not self.flow_manager.demultiplex_packet(sender, pkt):
+            self.logger.debug(
+                f"[AcceptorSocket] Flow {sender} queue full, packet dropped"
+            )
+        return True
 
     def _is_protocol_invalid(self, pkt: Packet) -> bool:
-        return pkt.get_protocol_type() != self.protocol
+        return pkt.get_flags() & PROTOCOL_MASK != self.protocol_flags
 
-    async def _send_syn_ack(self, sender: Tuple[str, int]) -> None:
+    async def _send_syn_ack(
+        self,
+        sender: Tuple[str, int],
+        mss: int,
+        checksum: bool,
+        compression: Tuple[Codec, int] | None,
+    ) -> None:
+        options: SynOptions = {SynOption.MSS: encode_size_option(mss)}
+        if checksum:
+            options[SynOption.CHECKSUM] = b""
+        if compression is not None:
+            options[SynOption.COMPRESSION] = encode_compression_option(*compression)
         syn_ack_pkt = Packet(
+            data=encode_syn_options(options),
             flags=HeaderFlags.SYN.value | HeaderFlags.ACK.value | self.protocol.value,
         )
         await self.udp_skt.send_all(syn_ack_pkt.to_bytes(), sender)
 
+    async def _send_probe_echo(self, sender: Tuple[str, int], probe: Packet) -> None:
+        """
+        Echoes a path MTU probe with the same size, so both directions are
+        tested. Probes above our mss are answered unpadded: the client learns
+        our mss from the option instead of timing out.
+        """
+        size = probe.get_pmtu_probe()
+        if size is None:
+            return
+        echo = Packet.for_pmtu_probe(
+            size,
+            HeaderFlags.SYN.value | HeaderFlags.ACK.value | self.protocol.value,
+            mss=self.mss,
+            padded=size <= self.mss,
+        )
+        await self.udp_skt.send_all(echo.to_bytes(), sender)
+
     async def _send_fin(self, sender: Tuple[str, int]) -> None:
         fin_pkt = Packet(
             flags=HeaderFlags.FIN.value | self.protocol.value,
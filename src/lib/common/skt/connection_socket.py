@@ -1,20 +1,67 @@
 import asyncio
-from typing import Optional, Tuple
+import errno
+import time
+from collections import deque
+from collections.abc import Buffer
+from typing import List, Optional, Tuple, Type
 
 from lib.common.logger import Logger
-from lib.common.skt.packet import HeaderFlags, Packet
-from lib.common.skt.udp_socket import UDPSocket
+from lib.common.protocol.rtt_estimator import RTTEstimator
+from lib.common.skt.packet import (
+    CHECKSUM_SIZE,
+    DEFAULT_SEGMENT_SIZE,
+    MAX_SYN_OPTION_LENGTH,
+    MIN_SEGMENT_SIZE,
+    Codec,
+    HeaderFlags,
+    Packet,
+    SynOption,
+    SynOptions,
+    encode_compression_option,
+    encode_size_option,
+    encode_syn_options,
+)
+from lib.common.skt.udp_socket import Datagram, UDPSocket
 
 HANDSHAKE_TIMEOUT_INTERVAL: float = 0.5
 HANDSHAKE_RETRIES: int = 10
 
+PMTU_PROBE_RETRIES: int = 3
+# Stop the binary search once the bounds are this close (in bytes)
+PMTU_PROBE_PRECISION: int = 16
+
+# Packets in flight a server answering a fast open request sends until the
+# peer answers one, so a SYN with a spoofed address gets little sent to it
+FAST_OPEN_WINDOW: int = 2
+
 
 class ConnectionSocket:
     @classmethod
     def for_client(
-        cls, addr: Tuple[str, int], protocol: HeaderFlags, logger: Logger
+        cls,
+        addr: Tuple[str, int],
+        protocol: HeaderFlags,
+        logger: Logger,
+        mss: int = DEFAULT_SEGMENT_SIZE,
+        udp_backend: Type[UDPSocket] = UDPSocket,
+        checksum: bool = False,
+        compression: Tuple[Codec, int] | None = None,
     ) -> "ConnectionSocket":
-        return cls(addr, None, protocol, logger)
+        """
+        Client side of a connection. With checksum, per-packet checksums
+        are proposed on connect, used if the server agrees. So is
+        compression, the codec and level transfers are compressed with.
+        """
+        return cls(
+            addr,
+            None,
+            protocol,
+            logger,
+            mss,
+            udp_backend,
+            checksum=checksum,
+            compression=compression,
+        )
 
     @classmethod
     async def for_server(
@@ -23,8 +70,34 @@ class ConnectionSocket:
         queue: asyncio.Queue[Packet],
         protocol: HeaderFlags,
         logger: Logger,
+        mss: int = DEFAULT_SEGMENT_SIZE,
+        udp_backend: Type[UDPSocket] = UDPSocket,
+        udp_socket: Optional[UDPSocket] = None,
+        checksum: bool = False,
+        request: Packet | None = None,
+        compression: Tuple[Codec, int] | None = None,
     ) -> "ConnectionSocket":
-        return cls(addr, queue, protocol, logger)
+        """
+        Server side of a connection, packets are read from queue. If
+        udp_socket is given (the acceptor's bound socket) packets are sent
+        through it, otherwise a socket with an ephemeral port is created.
+        checksum tells whether the handshake agreed on per-packet checksums,
+        compression on the codec and level of the transfer's sender.
+        request is the filename packet carried by the SYN (fast open), the
+        SYN-ACK is then left to accept_request.
+        """
+        return cls(
+            addr,
+            queue,
+            protocol,
+            logger,
+            mss,
+            udp_backend,
+            udp_socket,
+            checksum,
+            request,
+            compression,
+        )
 
     def __init__(
         self,
@@ -32,88 +105,397 @@ class ConnectionSocket:
         queue: Optional[asyncio.Queue[Packet]],
         protocol: HeaderFlags,
         logger: Logger,
+        mss: int = DEFAULT_SEGMENT_SIZE,
+        udp_backend: Type[UDPSocket] = UDPSocket,
+        udp_socket: Optional[UDPSocket] = None,
+        checksum: bool = False,
+        request: Packet | None = None,
+        compression: Tuple[Codec, int] | None = None,
     ):
         self.addr: Tuple[str, int] = addr
         self.protocol: HeaderFlags = protocol
-        self.udp_socket: UDPSocket = UDPSocket()
+        # Proposed by the client on connect, already negotiated on the server
+        self.mss: int = mss
+        self.udp_socket: UDPSocket = (
+            udp_socket if udp_socket is not None else udp_backend(mss)
+        )
         self.queue: Optional[asyncio.Queue[Packet]] = queue
+        # Datagrams read in the last batch and not yet returned by recv
+        self.pending: deque[Datagram] = deque()
         self.closed: bool = False
+        # Server sockets are handed over already connected
+        self.connected: bool = queue is not None
+        # Like mss, proposed by the client and already negotiated on the server.
+        # Packets but SYNs then end with a checksum (see Packet.strip_checksum)
+        self.checksum: bool = checksum
+        # Negotiated like checksum (see FileManager.set_compression)
+        self.compression: Tuple[Codec, int] | None = compression
+        # Filename packet carried by the SYN (fast open), on the server. The
+        # client learns on connect whether the server took the one it sent
+        self.request: Packet | None = request
+        self.fast_open: bool = request is not None
+        # Whether the peer sent anything but SYNs, see cap_window
+        self.peer_answered: bool = request is None
+        # Our answer to the request, sent again if the SYN is
+        self.syn_ack: Packet | None = None
+        # Payload of the FIN received from the peer
+        self.fin_data: bytes = b""
+        # Whether the FIN of the peer waits for answer_fin to be acknowledged,
+        # and whether one is waiting
+        self.fin_deferred: bool = False
+        self.fin_pending: bool = False
+        self.last_recv: float = time.monotonic()
         self.logger: Logger = logger
 
-    async def connect(self) -> None:
+    async def connect(
+        self, pmtu_discovery: bool = False, request: Packet | None = None
+    ) -> None:
+        """
+        With request (a filename packet), the SYN carries it (fast open) and
+        the server answers it with its SYN-ACK, see is_fast_open. It may
+        refuse it with a FIN instead, the socket is then closed.
+        """
+        if pmtu_discovery:
+            await self.discover_path_mtu()
+            if self.closed:
+                # The server refused the probes with a FIN
+                return
+
+        options: SynOptions = {SynOption.MSS: encode_size_option(self.mss)}
+        if self.checksum:
+            options[SynOption.CHECKSUM] = b""
+        if self.compression is not None:
+            options[SynOption.COMPRESSION] = encode_compression_option(
+                *self.compression
+            )
+        flags = HeaderFlags.SYN.value | self.protocol.value
+        if request is not None and len(request.get_data()) <= MAX_SYN_OPTION_LENGTH:
+            options[SynOption.REQUEST] = bytes(request.get_data())
+            flags |= request.get_flags()
+        syn = Packet(data=encode_syn_options(options), flags=flags)
         for attempt in range(HANDSHAKE_RETRIES):
-            await self.send(Packet(flags=HeaderFlags.SYN.value | self.protocol.value))
+            await self.send(syn)
+            deadline = time.monotonic() + HANDSHAKE_TIMEOUT_INTERVAL
             try:
-                pkt = await asyncio.wait_for(
-                    self.recv(), timeout=HANDSHAKE_TIMEOUT_INTERVAL
-                )
-                if pkt.is_syn() and pkt.is_ack():
-                    self.logger.debug(
-                        f"[ConnectionSocket] Connection established with {self.addr}"
-                    )
-                    break
-                elif pkt.is_fin():
-                    self.logger.debug(
-                        f"[ConnectionSocket] Connection closed by {self.addr}"
+                while True:
+                    pkt = await asyncio.wait_for(
+                        self.recv(), timeout=max(deadline - time.monotonic(), 0)
                     )
-                    break
+                    if pkt.is_fin():
+                        self.logger.debug(
+                            f"[ConnectionSocket] Connection closed by {self.addr}"
+                        )
+                        return
+                    if pkt.is_syn() and pkt.is_ack() and pkt.get_pmtu_probe() is None:
+                        self._establish(pkt, SynOption.REQUEST in options)
+                        return
+                    # Late probe echo, or data sent right after a SYN-ACK we
+                    # lost (fast open): the server sends it again once the
+                    # SYN we retry gets the SYN-ACK through
             except TimeoutError:
                 self.logger.debug(f"[ConnectionSocket] Retrying... (Attempt {attempt})")
-                await asyncio.sleep(0.5)
-        else:
-            raise TimeoutError(
-                f"[ConnectionSocket] Failed to establish connection with {self.addr}"
+
+        raise TimeoutError(
+            f"[ConnectionSocket] Failed to establish connection with {self.addr}"
+        )
+
+    def _establish(self, syn_ack: Packet, fast_open: bool) -> None:
+        options = syn_ack.get_syn_options()
+        self.mss = min(syn_ack.get_mss(), self.mss)
+        self.udp_socket.set_segment_size(self.mss)
+        self.checksum = self.checksum and SynOption.CHECKSUM in options
+        if self.compression is not None:
+            self.compression = syn_ack.get_compression()
+        self.fast_open = fast_open and SynOption.REQUEST in options
+        self.connected = True
+        self.logger.debug(
+            f"[ConnectionSocket] Connection established with {self.addr}"
+            f" (mss={self.mss}, checksum={self.checksum},"
+            f" compression={self.compression}, fast_open={self.fast_open})"
+        )
+
+    async def accept_request(self) -> None:
+        """
+        Takes the request carried by the SYN (see get_syn_request), the
+        SYN-ACK answering it is sent. Data may follow it right away.
+        """
+        options: SynOptions = {
+            SynOption.MSS: encode_size_option(self.mss),
+            SynOption.REQUEST: b"",
+        }
+        if self.checksum:
+            options[SynOption.CHECKSUM] = b""
+        if self.compression is not None:
+            options[SynOption.COMPRESSION] = encode_compression_option(
+                *self.compression
             )
+        self.syn_ack = Packet(
+            data=encode_syn_options(options),
+            flags=HeaderFlags.SYN.value | HeaderFlags.ACK.value | self.protocol.value,
+        )
+        await self.send(self.syn_ack)
+
+    async def discover_path_mtu(self) -> None:
+        """
+        Lowers the proposed mss to the largest segment that travels to the
+        peer and back without fragmentation. DF-marked probes of a given size
+        are echoed by the server with the same size, the size is binary
+        searched between MIN_SEGMENT_SIZE and the proposed mss. Probes
+        nobody answers leave the mss as found so far.
+        """
+        if not self.udp_socket.supports_dont_fragment() or self.mss <= MIN_SEGMENT_SIZE:
+            return
+
+        self.udp_socket.set_dont_fragment(True)
+        # The echoes time the probes, which wait for one RTO
+        rtt = RTTEstimator()
+        try:
+            # Most of the time the proposed mss already fits the path
+            proposed = self.mss
+            fits = await self._probe(proposed, rtt)
+            if fits is False and self.mss < proposed:
+                # The server only takes a smaller mss, that one is tried next
+                fits = await self._probe(self.mss, rtt)
+            if fits is None:
+                self.logger.debug("[ConnectionSocket] Probes unanswered, mss kept")
+                return
+            if fits:
+                return
+
+            low, high = MIN_SEGMENT_SIZE, self.mss - 1
+            while high - low > PMTU_PROBE_PRECISION:
+                size = (low + high + 1) // 2
+                fits = await self._probe(size, rtt)
+                if fits is None:
+                    break
+                if fits:
+                    low = size
+                else:
+                    high = min(size, self.mss) - 1
+
+            self.mss = low
+        finally:
+            self.udp_socket.set_dont_fragment(False)
+            self.udp_socket.set_segment_size(self.mss)
+            self.logger.debug(f"[ConnectionSocket] Path MTU allows mss={self.mss}")
+
+    async def _probe(self, size: int, rtt: RTTEstimator) -> bool | None:
+        """
+        Sends a probe of size bytes and waits for its echo. Only EMSGSIZE
+        (the kernel got an ICMP "fragmentation needed" for the path) or a
+        shorter echo means it does not fit. Returns None if it is unknown:
+        no echo came back (lost, or dropped somewhere unreported), the
+        peer answered without echoing the probe (no PMTU support) or it
+        closed the connection.
+        The server also announces its own mss, lowering ours if needed.
+        """
+        probe = Packet.for_pmtu_probe(size, HeaderFlags.SYN.value | self.protocol.value)
+        for attempt in range(PMTU_PROBE_RETRIES):
+            try:
+                await self.send(probe)
+            except OSError as e:
+                if e.errno == errno.EMSGSIZE:
+                    # Already known to be larger than the path MTU
+                    return False
+                raise
+
+            sent_at = time.monotonic()
+            deadline = sent_at + rtt.get_rto()
+            try:
+                while True:
+                    pkt = await asyncio.wait_for(
+                        self.recv(), timeout=max(deadline - time.monotonic(), 0)
+                    )
+                    if pkt.is_fin():
+                        self.logger.debug(
+                            f"[ConnectionSocket] Connection closed by {self.addr}"
+                        )
+                        return None
+                    if not (pkt.is_syn() and pkt.is_ack()):
+                        continue
+                    echoed = pkt.get_pmtu_probe()
+                    if echoed is None:
+                        return None
+                    if echoed != size:
+                        # Late echo of a previous probe
+                        continue
+                    if attempt == 0:
+                        # Karn's rule: the echo of a retry may answer any try
+                        rtt.add_sample(time.monotonic() - sent_at)
+                    self.mss = min(self.mss, pkt.get_mss())
+                    return len(pkt.get_data()) == size
+            except TimeoutError:
+                rtt.backoff()
+
+        return None
 
     async def send(self, packet: Packet) -> None:
         if self.closed:
             raise RuntimeError("[ConnectionSocket] Cannot send on a closed socket")
-        await self.udp_socket.send_all(packet.to_bytes(), self.addr)
+        await self.udp_socket.send_batch([(self._encode(packet), self.addr)])
+
+    async def send_batch(self, packets: List[Packet]) -> None:
+        if self.closed:
+            raise RuntimeError("[ConnectionSocket] Cannot send on a closed socket")
+        await self.udp_socket.send_batch(
+            [(self._encode(packet), self.addr) for packet in packets]
+        )
+
+    def _encode(self, packet: Packet) -> List[Buffer]:
+        if self.checksum and not packet.is_syn():
+            return packet.to_checksummed_buffers()
+        return packet.to_buffers()
 
     async def recv(self) -> Packet:
         if self.closed:
             raise RuntimeError("[ConnectionSocket] Cannot receive on a closed socket")
 
-        recv_pkt = None
-        if not self.queue:
-            response, _ = await self.udp_socket.recv_all()
-            recv_pkt = Packet.from_bytes(response)
-        else:
-            recv_pkt = await self.queue.get()
+        while True:
+            if not self.queue:
+                if not self.pending:
+                    self.pending.extend(await self.udp_socket.recv_batch())
+                response, _ = self.pending.popleft()
+                recv_pkt = Packet.from_bytes(response)
+            else:
+                recv_pkt = await self.queue.get()
+            if recv_pkt.is_syn() and self.connected:
+                # The handshake is over, a SYN sent again because our SYN-ACK
+                # was lost (fast open) or a duplicated SYN-ACK
+                if self.syn_ack is not None and not recv_pkt.is_ack():
+                    await self.send(self.syn_ack)
+                continue
+            if not self.checksum or recv_pkt.is_syn() or recv_pkt.strip_checksum():
+                break
+            # Handled like a lost packet, the peer sends it again
+            self.logger.debug(
+                f"[ConnectionSocket] Dropped corrupted packet: {recv_pkt}"
+            )
+        self.last_recv = time.monotonic()
+        if not recv_pkt.is_syn():
+            self.peer_answered = True
 
         if recv_pkt.is_fin():
             self.logger.debug(
                 f"[ConnectionSocket] Received FIN packet from {self.addr}"
             )
             if not recv_pkt.is_ack():
-                fin_ack = Packet(
-                    flags=self.protocol.value
-                    | HeaderFlags.FIN.value
-                    | HeaderFlags.ACK.value
-                )
-                await self.send(fin_ack)
+                self.fin_data = bytes(recv_pkt.get_data())
+                if self.fin_deferred:
+                    self.fin_pending = True
+                else:
+                    await self.send(self._fin_ack())
             self.closed = True
 
         self.logger.debug(f"[ConnectionSocket] Received packet: {recv_pkt}")
         return recv_pkt
 
-    async def disconnect(self, retries: int = 5, timeout: float = 1.0) -> None:
+    async def disconnect(
+        self, data: bytes = b"", retries: int = 5, timeout: float = 1.0
+    ) -> None:
+        """
+        Closes the connection with a FIN carrying data (the peer reads it
+        with get_fin_data). Raises ValueError if the peer rejects what the
+        FIN ends (see answer_fin), a peer deferring its answer has to give
+        it before the retries run out.
+        """
         if self.closed:
             return
 
-        fin = Packet(flags=self.protocol.value | HeaderFlags.FIN.value)
+        fin = Packet(data=data, flags=self.protocol.value | HeaderFlags.FIN.value)
 
+        rejection = b""
         for _ in range(retries):
             await self.send(fin)
 
             try:
                 response = await asyncio.wait_for(self.recv(), timeout=timeout)
                 if response.is_fin() and response.is_ack():
+                    rejection = bytes(response.get_data())
                     break
             except asyncio.TimeoutError:
                 continue
 
         self.closed = True
+        if rejection:
+            reason = rejection.decode(errors="replace")
+            raise ValueError(f"[ConnectionSocket] Rejected by {self.addr}: {reason}")
+
+    def defer_fin_ack(self) -> None:
+        """
+        The FIN of the peer is then only acknowledged by answer_fin, once
+        what it ends has been checked.
+        """
+        self.fin_deferred = True
+
+    async def answer_fin(self, error: str | None = None) -> None:
+        """
+        Acknowledges the FIN deferred by defer_fin_ack, or with error
+        rejects it: the peer's disconnect raises it. Does nothing if no FIN
+        is waiting for an answer.
+        """
+        if not self.fin_pending:
+            return
+        self.fin_pending = False
+        data = b"" if error is None else error.encode()[: self.get_mss()]
+        # The socket is already closed for anything else
+        await self.udp_socket.send_batch(
+            [(self._encode(self._fin_ack(data)), self.addr)]
+        )
+
+    def _fin_ack(self, data: bytes = b"") -> Packet:
+        return Packet(
+            data=data,
+            flags=self.protocol.value | HeaderFlags.FIN.value | HeaderFlags.ACK.value,
+        )
+
+    def get_mss(self) -> int:
+        """
+        Largest payload of a packet, besides the checksum if there is one.
+        """
+        return self.mss - CHECKSUM_SIZE if self.checksum else self.mss
+
+    def has_checksum(self) -> bool:
+        return self.checksum
+
+    def get_compression(self) -> Tuple[Codec, int] | None:
+        return self.compression
+
+    def is_fast_open(self) -> bool:
+        """
+        Whether the filename packet went in the SYN, answered by the SYN-ACK.
+        """
+        return self.fast_open
+
+    def get_syn_request(self) -> Packet | None:
+        """
+        Filename packet carried by the SYN of a fast open, on the server.
+        """
+        return self.request
+
+    def cap_window(self, window: int) -> int:
+        """
+        Send window (in packets) allowed out of window: at most
+        FAST_OPEN_WINDOW until the peer of a fast open answers.
+        """
+        return window if self.peer_answered else min(window, FAST_OPEN_WINDOW)
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def get_fin_data(self) -> bytes:
+        return self.fin_data
+
+    def backlog(self) -> int:
+        """
+        Number of received packets waiting to be read from the flow queue.
+        """
+        return self.queue.qsize() if self.queue else 0
+
+    def idle_time(self) -> float:
+        """
+        Seconds since the last packet was received from the peer.
+        """
+        return time.monotonic() - self.last_recv
 
     def is_closed(self) -> bool:
         return self.closed
@@ -1,11 +1,42 @@
 import struct
+import zlib
+from collections.abc import Buffer
 from enum import Enum
-from typing import NamedTuple
+from typing import Dict, List, Tuple
 
 HEADER_PACK_FORMAT: str = "!HHH"  # Big-endian unsigned short (2 bytes)
+EXTENDED_LEN_FORMAT: str = "!H"  # Real length when the LEN field is all ones
+EXTENDED_HEADER_PACK_FORMAT: str = HEADER_PACK_FORMAT + EXTENDED_LEN_FORMAT[1:]
+HEADER_SIZE: int = struct.calcsize(HEADER_PACK_FORMAT)
+EXTENDED_HEADER_SIZE: int = HEADER_SIZE + struct.calcsize(EXTENDED_LEN_FORMAT)
+SYN_OPTION_FORMAT: str = "!BB"  # Option kind and value length
+SYN_OPTION_SIZE: int = struct.calcsize(SYN_OPTION_FORMAT)
+MAX_SYN_OPTION_LENGTH: int = 0xFF
+SIZE_OPTION_FORMAT: str = "!H"  # Value of options holding a segment size
+COMPRESSION_OPTION_FORMAT: str = "!BB"  # Codec and level of the sender
+SACK_BLOCK_FORMAT: str = "!HH"  # First and last seq_num of a received range
+SACK_BLOCK_SIZE: int = struct.calcsize(SACK_BLOCK_FORMAT)
+OFFSET_FORMAT: str = "!Q"  # Byte offset a resumed transfer starts at
+OFFSET_SIZE: int = struct.calcsize(OFFSET_FORMAT)
+# Size and mtime (ns) of the file a resumed transfer continues, see FileIdentity
+IDENTITY_FORMAT: str = "!QQ"
+IDENTITY_SIZE: int = struct.calcsize(IDENTITY_FORMAT)
+# Index and count of a stripe, file size (uploads) and transfer id
+STRIPE_FORMAT: str = "!HHQQ"
+STRIPE_SIZE: int = struct.calcsize(STRIPE_FORMAT)
+MAX_STRIPES: int = 65535
+CHECKSUM_FORMAT: str = "!I"  # CRC-32 ending the payload on checksummed connections
+CHECKSUM_SIZE: int = struct.calcsize(CHECKSUM_FORMAT)
 
 MAX_SEQ_NUM: int = 65536
 
+# Segment size assumed when the peer does not negotiate one in the handshake
+DEFAULT_SEGMENT_SIZE: int = 1000
+# Every IPv4 path carries 576 bytes datagrams (20 IP + 8 UDP header bytes)
+MIN_SEGMENT_SIZE: int = 576 - 20 - 8 - EXTENDED_HEADER_SIZE
+# Largest payload that fits in a single UDP/IPv4 datagram
+MAX_SEGMENT_SIZE: int = 65507 - EXTENDED_HEADER_SIZE
+
 
 class HeaderMasks(Enum):
     PROTOCOLTYPE = 0xC000  # 1100_0000_0000_0000
@@ -19,6 +50,7 @@ class HeaderMasks(Enum):
 class HeaderFlags(Enum):
     SW = 0x0000
     GBN = 0x4000
+    SR = 0x8000
     UPLOAD = 0x2000
     DOWNLOAD = 0x0000
     SYN = 0x1000
@@ -27,42 +59,323 @@ class HeaderFlags(Enum):
     NONE = 0xFFFF
 
 
-class HeaderData(NamedTuple):
+class SynOption(Enum):
+    END = 0x00  # Stops option parsing, the rest of the payload is padding
+    MSS = 0x01
+    PMTU_PROBE = 0x02
+    CHECKSUM = 0x03  # No value, every packet carries a CRC-32 (see Packet)
+    # Payload of the filename packet (fast open), echoed empty once taken
+    REQUEST = 0x04
+    COMPRESSION = 0x05  # Codec and level, echoed if agreed to
+
+
+class Codec(Enum):
+    """
+    Compression of the transferred data (see file_ops.compression).
+    """
+
+    NONE = 0
+    ZLIB = 1
+    LZMA = 2
+
+
+SYN_OPTION_KINDS = {option.value for option in SynOption}
+
+
+# Plain int copies of the masks and flags: Enum attribute lookups and
+# constructor calls are too slow for per-packet work
+PROTOCOL_MASK: int = HeaderMasks.PROTOCOLTYPE.value
+MODE_MASK: int = HeaderMasks.MODE.value
+SYN_MASK: int = HeaderMasks.SYN.value
+FIN_MASK: int = HeaderMasks.FIN.value
+ACK_MASK: int = HeaderMasks.ACK.value
+LEN_MASK: int = HeaderMasks.LEN.value
+
+PROTOCOL_TYPES: Dict[int, HeaderFlags] = {
+    protocol.value: protocol
+    for protocol in (HeaderFlags.SW, HeaderFlags.GBN, HeaderFlags.SR)
+}
+MODES: Dict[int, HeaderFlags] = {
+    mode.value: mode for mode in (HeaderFlags.UPLOAD, HeaderFlags.DOWNLOAD)
+}
+# Codecs a COMPRESSION option may announce
+CODECS: Dict[int, Codec] = {
+    codec.value: codec for codec in Codec if codec != Codec.NONE
+}
+
+SackBlocks = List[Tuple[int, int]]
+SynOptions = Dict[SynOption, bytes]
+# Index, count, file size and transfer id of a stripe (see FileRequest)
+Stripe = Tuple[int, int, int, int]
+
+
+def header_size(data_len: int) -> int:
+    """
+    Size of the header in front of a payload of data_len bytes.
+    """
+    return EXTENDED_HEADER_SIZE if data_len >= LEN_MASK else HEADER_SIZE
+
+
+def payload_buffer(size: int) -> bytearray:
+    """
+    Allocates a buffer for a payload of up to size bytes, with room for the
+    largest header in front so the packet can be encoded in place.
+    The payload goes at payload_view(buffer).
+    """
+    return bytearray(EXTENDED_HEADER_SIZE + size)
+
+
+def payload_view(buffer: bytearray) -> memoryview:
+    return memoryview(buffer)[EXTENDED_HEADER_SIZE:]
+
+
+def seq_distance(base: int, seq_num: int) -> int:
+    """
+    Number of sequence numbers from base up to seq_num, modulo MAX_SEQ_NUM.
+    """
+    return (seq_num - base) % MAX_SEQ_NUM
+
+
+def encode_sack_blocks(blocks: SackBlocks) -> bytes:
+    """
+    Encodes the out-of-order ranges held by a receiver as an ACK payload.
+    """
+    return b"".join(struct.pack(SACK_BLOCK_FORMAT, *block) for block in blocks)
+
+
+def encode_size_option(size: int) -> bytes:
+    return struct.pack(SIZE_OPTION_FORMAT, size)
+
+
+def encode_compression_option(codec: Codec, level: int) -> bytes:
+    return struct.pack(COMPRESSION_OPTION_FORMAT, codec.value, level)
+
+
+def encode_syn_options(options: SynOptions) -> bytes:
+    """
+    Encodes the options carried by SYN and SYN-ACK packets as kind-length-value.
+    """
+    return b"".join(
+        struct.pack(SYN_OPTION_FORMAT, kind.value, len(value)) + value
+        for kind, value in options.items()
+    )
+
+
+def data_flags(protocol: HeaderFlags, mode: HeaderFlags) -> int:
+    """
+    Flag word of the data packets of a transfer, computed once per transfer.
+    """
+    return protocol.value | mode.value
+
+
+def ack_flags(protocol: HeaderFlags, mode: HeaderFlags) -> int:
+    return data_flags(protocol, mode) | ACK_MASK
+
+
+# Tells whether a resumed transfer still continues the same file: the
+# sender's size and mtime when its partial copy was checkpointed
+FileIdentity = Tuple[int, int]
+
+
+def encode_offset(offset: int, identity: FileIdentity | None = None) -> bytes:
+    """
+    Payload of a filename ACK, with the identity of the file sent if any.
+    """
+    data = struct.pack(OFFSET_FORMAT, offset)
+    if identity is not None:
+        data += struct.pack(IDENTITY_FORMAT, *identity)
+    return data
+
+
+def decode_offset(data: Buffer) -> int | None:
+    """
+    Returns the offset carried by a filename ACK, None if it has none.
+    """
+    if len(memoryview(data)) not in (OFFSET_SIZE, OFFSET_SIZE + IDENTITY_SIZE):
+        return None
+    (offset,) = struct.unpack_from(OFFSET_FORMAT, data)
+    return int(offset)
+
+
+def decode_identity(data: Buffer) -> FileIdentity | None:
+    """
+    Returns the file identity carried by a filename ACK, None if it has none.
+    """
+    if len(memoryview(data)) != OFFSET_SIZE + IDENTITY_SIZE:
+        return None
+    size, mtime = struct.unpack_from(IDENTITY_FORMAT, data, OFFSET_SIZE)
+    return int(size), int(mtime)
+
+
+class FileRequest(Enum):
+    """
+    What a filename packet asks for, sent after the offset.
+    """
+
+    FILE = 0  # The file itself (the byte is omitted)
+    SIGNATURES = 1  # Block signatures of the server's copy, downloaded
+    DELTA = 2  # Delta against the server's copy, uploaded
+    STRIPE = 3  # A byte range of the file, followed by the Stripe
+    SIZE = 4  # Size of the server's copy, downloaded before its stripes
+    BATCH = 5  # The files under a directory, in either direction
+
+
+def request_mode(request: FileRequest) -> HeaderFlags | None:
+    """
+    Mode of the transfers carrying SIGNATURES, SIZE and DELTA requests,
+    None for the ones going either way.
+    """
+    if request in (FileRequest.SIGNATURES, FileRequest.SIZE):
+        return HeaderFlags.DOWNLOAD
+    if request == FileRequest.DELTA:
+        return HeaderFlags.UPLOAD
+    return None
+
+
+def encode_file_request(
+    file_name: str,
+    offset: int | None = None,
+    request: FileRequest = FileRequest.FILE,
+    stripe: Stripe | None = None,
+    identity: FileIdentity | None = None,
+) -> bytes:
+    """
+    Payload of the filename packet. Resumable requests append a NUL and the
+    offset the client already has (0 for uploads, the server knows it),
+    other requests than FILE a NUL, offset 0 and their kind (and stripe).
+    A resumable request with the identity of the file it continues sends
+    it after its kind, FILE.
+    """
+    if request == FileRequest.FILE and identity is None:
+        if offset is None:
+            return file_name.encode()
+        return file_name.encode() + b"\0" + encode_offset(offset)
+    data = file_name.encode() + b"\0" + encode_offset(offset or 0)
+    data += bytes([request.value])
+    if stripe is not None:
+        data += struct.pack(STRIPE_FORMAT, *stripe)
+    if identity is not None:
+        data += struct.pack(IDENTITY_FORMAT, *identity)
+    return data
+
+
+def decode_file_request(
+    data: Buffer,
+) -> Tuple[str, int | None, FileRequest, Stripe | None, FileIdentity | None]:
+    """
+    Returns the file name, the offset (None unless resuming), the kind, the
+    stripe of STRIPE requests and the identity of the file a resumed FILE
+    request continues, if sent. Raises ValueError for unknown kinds and
+    invalid stripes or identities.
+    """
+    file_name, _, options = bytes(data).partition(b"\0")
+    name = file_name.decode().strip()
+    if len(options) <= OFFSET_SIZE:
+        return name, decode_offset(options), FileRequest.FILE, None, None
+
+    request = FileRequest(options[OFFSET_SIZE])
+    fields = options[OFFSET_SIZE + 1 :]
+    if request == FileRequest.FILE:
+        if len(fields) != IDENTITY_SIZE:
+            raise ValueError("Truncated file identity")
+        size, mtime = struct.unpack(IDENTITY_FORMAT, fields)
+        offset = decode_offset(options[:OFFSET_SIZE])
+        return name, offset, request, None, (size, mtime)
+    if request != FileRequest.STRIPE:
+        return name, None, request, None, None
+    if len(fields) != STRIPE_SIZE:
+        raise ValueError("Truncated stripe")
+    index, count, size, transfer_id = struct.unpack(STRIPE_FORMAT, fields)
+    if not index < count:
+        raise ValueError(f"Invalid stripe {index} of {count}")
+    return name, None, request, (index, count, size, transfer_id), None
+
+
+class Packet:
     """
     Represents a header of 6 bytes that includes:
     - flags: 6 bits
     - length: 10 bits
     - seq_number: 16 bits
     - ACK_number: 16 bits
+    Payloads of 1023 bytes or more set every length bit and are preceded by
+    an extended 16 bits length, making the header 8 bytes long.
+    Fields are plain slots, packets are created for every datagram.
     """
 
+    __slots__ = ("flags", "length", "seq_num", "ack_num", "data", "buffer")
     flags: int
     length: int
     seq_num: int
     ack_num: int
+    data: bytes | memoryview
+    # Set when the payload lives in a payload_buffer
+    buffer: bytearray | None
 
-
-class Packet:
     @classmethod
     def for_ack(cls, seq_num: int, ack_num: int, protocol: HeaderFlags) -> "Packet":
         return cls(seq_num, ack_num, b"", HeaderFlags.ACK.value | protocol.value)
 
     @classmethod
-    def from_bytes(cls, packet: bytes) -> "Packet":
+    def for_pmtu_probe(
+        cls, size: int, flags: int, mss: int | None = None, padded: bool = True
+    ) -> "Packet":
+        """
+        SYN carrying the probed size as an option, padded so that its payload
+        is exactly size bytes long.
+        """
+        options: SynOptions = {SynOption.PMTU_PROBE: encode_size_option(size)}
+        if mss is not None:
+            options[SynOption.MSS] = encode_size_option(mss)
+        data = encode_syn_options(options)
+        if padded:
+            data = data.ljust(size, b"\x00")
+        return cls(data=data, flags=flags)
+
+    @classmethod
+    def from_payload_buffer(
+        cls,
+        buffer: bytearray,
+        length: int,
+        seq_num: int = 0,
+        ack_num: int = 0,
+        flags: int = 0,
+    ) -> "Packet":
+        """
+        Creates a Packet whose payload is the first length bytes already
+        written at payload_view(buffer). It is never copied: to_buffer packs
+        the header right in front of it.
+        """
+        data = payload_view(buffer)[:length]
+        packet = cls(seq_num, ack_num, data, flags=flags)
+        packet.buffer = buffer
+        return packet
+
+    @classmethod
+    def from_bytes(cls, packet: Buffer) -> "Packet":
         """
         Creates a Packet instance from a byte array (from network).
+        The payload is a view into packet, not a copy.
         """
-        if len(packet) < 6:
+        view = memoryview(packet)
+        if len(view) < HEADER_SIZE:
             raise ValueError("Packet too short to contain a header.")
 
-        data: bytes = packet[6:]
-
-        flags_and_length, seq_num, ack_num = struct.unpack(
-            HEADER_PACK_FORMAT, packet[:6]
+        flags_and_length, seq_num, ack_num = struct.unpack_from(
+            HEADER_PACK_FORMAT, view
         )
 
-        flags = flags_and_length & (~HeaderMasks.LEN.value)
-        length = flags_and_length & HeaderMasks.LEN.value
+        flags = flags_and_length & ~LEN_MASK
+        length = flags_and_length & LEN_MASK
+
+        data: memoryview
+        if length == LEN_MASK:
+            if len(view) < EXTENDED_HEADER_SIZE:
+                raise ValueError("Packet too short to contain an extended header.")
+            (length,) = struct.unpack_from(EXTENDED_LEN_FORMAT, view, HEADER_SIZE)
+            data = view[EXTENDED_HEADER_SIZE:]
+        else:
+            data = view[HEADER_SIZE:]
 
         return cls(seq_num, ack_num, data, flags=flags, length=length)
 
@@ -70,72 +383,230 @@ class Packet:
         """
         Coverts Self to bytes (ready to send over network).
         """
+        data_len: int = len(self.data)
+        header = bytearray(header_size(data_len))
+        self._pack_header_into(header, 0, data_len)
+
+        # Return the header followed by the data
+        return bytes(header) + self.data
+
+    def to_buffer(self) -> memoryview:
+        """
+        Encodes Self for the network like to_bytes, but packets built with
+        from_payload_buffer are encoded in place, without copying the payload.
+        """
+        if self.buffer is None:
+            return memoryview(self.to_bytes())
 
         data_len: int = len(self.data)
-        if data_len > HeaderMasks.LEN.value:
-            raise ValueError("Data exceeds the maximum size [2^10B].")
+        offset = EXTENDED_HEADER_SIZE - header_size(data_len)
+        self._pack_header_into(self.buffer, offset, data_len)
+        return memoryview(self.buffer)[offset : EXTENDED_HEADER_SIZE + data_len]
 
-        flags_and_length = self.header_data.flags | data_len
+    def to_buffers(self) -> List[Buffer]:
+        """
+        Encodes Self as the parts of a scatter/gather send (sendmsg): the
+        header and the payload, which is not copied even if it is a view of
+        a mapped file. Packets encoded in place are a single part.
+        """
+        if self.buffer is not None or not self.data:
+            return [self.to_buffer()]
+
+        data_len: int = len(self.data)
+        header = bytearray(header_size(data_len))
+        self._pack_header_into(header, 0, data_len)
+        return [header, self.data]
+
+    def to_checksummed_buffers(self) -> List[Buffer]:
+        """
+        Encodes Self like to_buffers, followed by the CRC-32 of its flags,
+        sequence numbers and payload. The checksum is sent as the last bytes
+        of the payload, so it is counted in the length.
+        """
+        trailer = struct.pack(CHECKSUM_FORMAT, self._checksum())
+        data_len: int = len(self.data) + CHECKSUM_SIZE
+        header = bytearray(header_size(data_len))
+        self._pack_header_into(header, 0, data_len)
+        if not self.data:
+            return [header, trailer]
+        return [header, self.data, trailer]
+
+    def strip_checksum(self) -> bool:
+        """
+        Removes the checksum ending the payload of a packet received on a
+        checksummed connection, returns whether it matched.
+        """
+        data_len = len(self.data) - CHECKSUM_SIZE
+        if data_len < 0:
+            return False
+        (checksum,) = struct.unpack_from(CHECKSUM_FORMAT, self.data, data_len)
+        self.data = self.data[:data_len]
+        self.length = data_len
+        return int(checksum) == self._checksum()
+
+    def _checksum(self) -> int:
+        # The length is left out, it differs with and without the checksum
+        header = struct.pack(HEADER_PACK_FORMAT, self.flags, self.seq_num, self.ack_num)
+        return zlib.crc32(self.data, zlib.crc32(header))
+
+    def _pack_header_into(self, buffer: bytearray, offset: int, data_len: int) -> None:
+        if data_len > MAX_SEGMENT_SIZE:
+            raise ValueError(f"Data exceeds the maximum size [{MAX_SEGMENT_SIZE}B].")
+
+        if data_len >= LEN_MASK:
+            # Pack the header in 8 bytes, the length goes in the extension
+            struct.pack_into(
+                EXTENDED_HEADER_PACK_FORMAT,
+                buffer,
+                offset,
+                self.flags | LEN_MASK,
+                self.seq_num,
+                self.ack_num,
+                data_len,
+            )
+            return
 
         # Pack the header in 6 bytes
-        packed_header: bytes = struct.pack(
+        struct.pack_into(
             HEADER_PACK_FORMAT,
-            flags_and_length,
-            self.header_data.seq_num,
-            self.header_data.ack_num,
+            buffer,
+            offset,
+            self.flags | data_len,
+            self.seq_num,
+            self.ack_num,
         )
 
-        # Return the header followed by the data
-        return packed_header + self.data
-
     def __init__(
         self,
         seq_num: int = 0,
         ack_num: int = 0,
-        data: bytes = b"",
+        data: bytes | memoryview = b"",
         flags: int = 0,
         length: int = 0,
     ) -> None:
-        self.header_data = HeaderData(
-            flags=flags,
-            length=length if length else len(data),
-            seq_num=seq_num,
-            ack_num=ack_num,
-        )
+        self.flags = flags
+        self.length = length if length else len(data)
+        self.seq_num = seq_num
+        self.ack_num = ack_num
         self.data = data
+        self.buffer = None
 
     def __repr__(self) -> str:
         return (
-            f"Packet(flags={hex(self.header_data.flags)}, "
-            f"length={self.header_data.length}, "
-            f"seq_num={self.header_data.seq_num}, "
-            f"ack_num={self.header_data.ack_num}, "
-            f"data={self.data[:8]!r})"
+            f"Packet(flags={hex(self.flags)}, "
+            f"length={self.length}, "
+            f"seq_num={self.seq_num}, "
+            f"ack_num={self.ack_num}, "
+            f"data={bytes(self.data[:8])!r})"
         )
 
     def is_syn(self) -> bool:
-        return bool(self.header_data.flags & HeaderMasks.SYN.value)
+        return bool(self.flags & SYN_MASK)
 
     def is_fin(self) -> bool:
-        return bool(self.header_data.flags & HeaderMasks.FIN.value)
+        return bool(self.flags & FIN_MASK)
 
     def is_ack(self) -> bool:
-        return bool(self.header_data.flags & HeaderMasks.ACK.value)
+        return bool(self.flags & ACK_MASK)
+
+    def get_flags(self) -> int:
+        return self.flags
 
     def get_mode(self) -> HeaderFlags:
-        return HeaderFlags(self.header_data.flags & HeaderMasks.MODE.value)
+        return MODES[self.flags & MODE_MASK]
 
     def get_protocol_type(self) -> HeaderFlags:
-        return HeaderFlags(self.header_data.flags & HeaderMasks.PROTOCOLTYPE.value)
+        """
+        Returns HeaderFlags.NONE for the unassigned protocol bits.
+        """
+        return PROTOCOL_TYPES.get(self.flags & PROTOCOL_MASK, HeaderFlags.NONE)
 
     def get_ack_num(self) -> int:
-        return self.header_data.ack_num
+        return self.ack_num
 
     def get_seq_num(self) -> int:
-        return self.header_data.seq_num
+        return self.seq_num
 
-    def get_data(self) -> bytes:
+    def get_data(self) -> bytes | memoryview:
         return self.data
 
     def get_length(self) -> int:
-        return self.header_data.length
+        return self.length
+
+    def get_window(self) -> int:
+        """
+        ACKs carry no data of their own, so their seq_num field is reused to
+        advertise the receive window (in packets) of the peer.
+        """
+        return self.seq_num
+
+    def get_syn_options(self) -> SynOptions:
+        """
+        Returns the options carried by a SYN or SYN-ACK. Unknown kinds are
+        skipped so that newer peers can add options.
+        """
+        options: SynOptions = dict()
+        if not self.is_syn():
+            return options
+
+        offset = 0
+        while offset + SYN_OPTION_SIZE <= len(self.data):
+            kind, length = struct.unpack_from(SYN_OPTION_FORMAT, self.data, offset)
+            if kind == SynOption.END.value:
+                break
+            offset += SYN_OPTION_SIZE
+            value = bytes(self.data[offset : offset + length])
+            offset += length
+            if kind in SYN_OPTION_KINDS:
+                options[SynOption(kind)] = value
+        return options
+
+    def get_mss(self) -> int:
+        """
+        Returns the maximum segment size announced in a SYN or SYN-ACK,
+        clamped to the sizes any path carries and a datagram fits.
+        """
+        mss = self._get_size_option(SynOption.MSS)
+        if mss is None:
+            return DEFAULT_SEGMENT_SIZE
+        return min(max(mss, MIN_SEGMENT_SIZE), MAX_SEGMENT_SIZE)
+
+    def get_pmtu_probe(self) -> int | None:
+        """
+        Returns the segment size being probed if this is a path MTU probe
+        (or its echo), None otherwise.
+        """
+        return self._get_size_option(SynOption.PMTU_PROBE)
+
+    def get_compression(self) -> Tuple[Codec, int] | None:
+        """
+        Returns the codec and level announced in a SYN or SYN-ACK, None if
+        there are none or the codec is unknown.
+        """
+        value = self.get_syn_options().get(SynOption.COMPRESSION)
+        if value is None or len(value) != struct.calcsize(COMPRESSION_OPTION_FORMAT):
+            return None
+        codec, level = struct.unpack(COMPRESSION_OPTION_FORMAT, value)
+        if codec not in CODECS:
+            return None
+        return CODECS[codec], int(level)
+
+    def _get_size_option(self, kind: SynOption) -> int | None:
+        value = self.get_syn_options().get(kind)
+        if value is None or len(value) != struct.calcsize(SIZE_OPTION_FORMAT):
+            return None
+        (size,) = struct.unpack(SIZE_OPTION_FORMAT, value)
+        return int(size)
+
+    def get_sack_blocks(self) -> SackBlocks:
+        """
+        Returns the selective acknowledgement blocks carried by an ACK.
+        Plain ACKs have no payload, hence no blocks.
+        """
+        if not self.is_ack():
+            return []
+        usable = len(self.data) - len(self.data) % SACK_BLOCK_SIZE
+        return [
+            (start, end)
+            for start, end in struct.iter_unpack(SACK_BLOCK_FORMAT, self.data[:usable])
+        ]
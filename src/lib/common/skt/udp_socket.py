@@ -1,12 +1,39 @@
 import asyncio
 import socket
-from typing import Tuple
+import sys
+from collections.abc import Buffer
+from typing import List, Tuple
+
+from lib.common.skt.packet import DEFAULT_SEGMENT_SIZE, EXTENDED_HEADER_SIZE
+
+# Datagrams the kernel buffers should be able to hold, one full window
+SOCKET_BUFFER_PACKETS: int = 256
+
+# Linux <netinet/in.h> values, not every Python build exposes them
+IP_MTU_DISCOVER: int = getattr(socket, "IP_MTU_DISCOVER", 10)
+IP_PMTUDISC_WANT: int = getattr(socket, "IP_PMTUDISC_WANT", 1)
+IP_PMTUDISC_DO: int = getattr(socket, "IP_PMTUDISC_DO", 2)
+
+# Most datagrams moved per event loop wakeup
+MAX_BATCH_SIZE: int = 64
+
+Datagram = Tuple[bytes, Tuple[str, int]]
+# Outgoing datagrams are sent from a list of parts (see Packet.to_buffers)
+OutgoingDatagram = Tuple[List[Buffer], Tuple[str, int]]
+
+# Scatter/gather sends, not available on every platform (e.g. Windows)
+HAS_SENDMSG: bool = hasattr(socket.socket, "sendmsg")
+
+
+def join_parts(parts: List[Buffer]) -> Buffer:
+    return parts[0] if len(parts) == 1 else b"".join(parts)
 
 
 class UDPSocket:
-    def __init__(self) -> None:
+    def __init__(self, segment_size: int = DEFAULT_SEGMENT_SIZE) -> None:
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setblocking(False)
+        self.set_segment_size(segment_size)
 
     def __del__(self) -> None:
         self.sock.close()
@@ -14,11 +41,80 @@ class UDPSocket:
     def bind(self, host: str, port: int) -> None:
         self.sock.bind((host, port))
 
+    def set_reuse_port(self) -> None:
+        """
+        Lets several processes bind the same address. The kernel hashes the
+        source address of every datagram, so each peer sticks to one socket.
+        """
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    def set_segment_size(self, segment_size: int) -> None:
+        """
+        Sizes reads and kernel buffers for datagrams carrying up to
+        segment_size bytes of payload.
+        """
+        self.recv_size = EXTENDED_HEADER_SIZE + segment_size
+        buffer_size = self.recv_size * SOCKET_BUFFER_PACKETS
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_size)
+
+    def supports_dont_fragment(self) -> bool:
+        return sys.platform.startswith("linux")
+
+    def set_dont_fragment(self, enabled: bool) -> None:
+        """
+        Sets the DF bit on every datagram (Linux only). Datagrams larger than
+        the known path MTU then fail to send with EMSGSIZE instead of being
+        fragmented.
+        """
+        if not self.supports_dont_fragment():
+            return
+        self.sock.setsockopt(
+            socket.IPPROTO_IP,
+            IP_MTU_DISCOVER,
+            IP_PMTUDISC_DO if enabled else IP_PMTUDISC_WANT,
+        )
+
+    async def recv_batch(self, max_batch: int = MAX_BATCH_SIZE) -> List[Datagram]:
+        """
+        Waits for a datagram, then drains the ones already queued in the kernel
+        with plain non-blocking reads, without going back to the event loop.
+        Python has no recvmmsg, this gets the same one-wakeup-per-burst effect.
+        """
+        batch = [await self.recv_all()]
+        while len(batch) < max_batch:
+            try:
+                batch.append(self.sock.recvfrom(self.recv_size))
+            except (BlockingIOError, InterruptedError):
+                break
+        return batch
+
+    async def send_batch(self, datagrams: List[OutgoingDatagram]) -> None:
+        """
+        Flushes datagrams with plain non-blocking writes (sendmmsg-like) and
+        only waits on the event loop when the kernel buffer is full.
+        """
+        for parts, addr in datagrams:
+            try:
+                self._send_parts(parts, addr)
+            except (BlockingIOError, InterruptedError):
+                await self.send_all(join_parts(parts), addr)
+
+    def _send_parts(self, parts: List[Buffer], addr: Tuple[str, int]) -> None:
+        """
+        Sends the parts as one datagram, gathered by the kernel (sendmsg)
+        instead of joined into a new bytes object.
+        """
+        if len(parts) > 1 and HAS_SENDMSG:
+            self.sock.sendmsg(parts, [], 0, addr)
+        else:
+            self.sock.sendto(join_parts(parts), addr)
+
     async def recv_all(self) -> Tuple[bytes, Tuple[str, int]]:
         loop = asyncio.get_running_loop()
-        data, addr = await loop.sock_recvfrom(self.sock, 1006)
+        data, addr = await loop.sock_recvfrom(self.sock, self.recv_size)
         return data, addr
 
-    async def send_all(self, data: bytes, addr: Tuple[str, int]) -> None:
+    async def send_all(self, data: Buffer, addr: Tuple[str, int]) -> None:
         loop = asyncio.get_running_loop()
         await loop.sock_sendto(self.sock, data, addr)
@@ -0,0 +1,142 @@
+import asyncio
+import errno
+from collections import deque
+from collections.abc import Buffer
+from typing import Callable, Dict, List, Tuple, Type
+
+from lib.common.skt.packet import DEFAULT_SEGMENT_SIZE
+from lib.common.skt.udp_socket import (
+    MAX_BATCH_SIZE,
+    Datagram,
+    OutgoingDatagram,
+    UDPSocket,
+    join_parts,
+)
+
+# Returns True when the datagram was fully handled and must not be queued
+DatagramHandler = Callable[[bytes, Tuple[str, int]], bool]
+
+
+class UDPTransport(UDPSocket, asyncio.DatagramProtocol):
+    def __init__(self, segment_size: int = DEFAULT_SEGMENT_SIZE) -> None:
+        """
+        UDPSocket backend built on loop.create_datagram_endpoint: the event
+        loop keeps the socket registered for reading and calls
+        datagram_received for every datagram, instead of adding and removing
+        a reader (and allocating a future) per sock_recvfrom call.
+        Send errors are reported to error_received rather than raised, so
+        they look like a lost datagram to the caller. EMSGSIZE is raised by
+        the send that hit it, as UDPSocket does (PMTU probes rely on it).
+        """
+        super().__init__(segment_size)
+        self.transport: asyncio.DatagramTransport | None = None
+        self.transport_loop: asyncio.AbstractEventLoop | None = None
+        self.transport_lock = asyncio.Lock()
+        self.received: deque[Datagram] = deque()
+        self.waiter: asyncio.Future[None] | None = None
+        self.handler: DatagramHandler | None = None
+        # EMSGSIZE reported by the last sendto, see _raise_send_error
+        self.send_error: OSError | None = None
+
+    def __del__(self) -> None:
+        # Closing the transport needs its loop, after that the socket is ours
+        loop = self.transport_loop
+        if self.transport and loop and not loop.is_closed():
+            self.transport.close()
+        else:
+            super().__del__()
+
+    def set_datagram_handler(self, handler: DatagramHandler) -> None:
+        """
+        Lets the owner consume datagrams right from the event loop callback,
+        only the ones it rejects are queued for recv_all/recv_batch.
+        """
+        self.handler = handler
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        assert isinstance(transport, asyncio.DatagramTransport)
+        self.transport = transport
+        self.transport_loop = asyncio.get_running_loop()
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self._deliver(data, addr)
+        # The transport reads a single datagram per wakeup, drain the rest of
+        # the burst here like recv_batch does
+        for _ in range(MAX_BATCH_SIZE - 1):
+            try:
+                data, addr = self.sock.recvfrom(self.recv_size)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                self.error_received(e)
+                break
+            self._deliver(data, addr)
+
+    def _deliver(self, data: bytes, addr: Tuple[str, int]) -> None:
+        if self.handler is not None and self.handler(data, addr):
+            return
+        self.received.append((data, addr))
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP errors and failed sends, the protocols retransmit on their own
+        if isinstance(exc, OSError) and exc.errno == errno.EMSGSIZE:
+            self.send_error = exc
+
+    async def recv_all(self) -> Tuple[bytes, Tuple[str, int]]:
+        await self._wait_for_datagrams()
+        return self.received.popleft()
+
+    async def recv_batch(self, max_batch: int = MAX_BATCH_SIZE) -> List[Datagram]:
+        await self._wait_for_datagrams()
+        batch: List[Datagram] = []
+        while self.received and len(batch) < max_batch:
+            batch.append(self.received.popleft())
+        return batch
+
+    async def send_all(self, data: Buffer, addr: Tuple[str, int]) -> None:
+        transport = await self._get_transport()
+        self.send_error = None
+        transport.sendto(memoryview(data), addr)
+        self._raise_send_error()
+
+    async def send_batch(self, datagrams: List[OutgoingDatagram]) -> None:
+        transport = await self._get_transport()
+        for parts, addr in datagrams:
+            # Datagram transports have no scatter/gather send
+            self.send_error = None
+            transport.sendto(memoryview(join_parts(parts)), addr)
+            self._raise_send_error()
+
+    def _raise_send_error(self) -> None:
+        # The transport reports a failed sendto before returning from it, a
+        # queued datagram failing later is left as lost
+        error, self.send_error = self.send_error, None
+        if error is not None:
+            raise error
+
+    async def _wait_for_datagrams(self) -> None:
+        await self._get_transport()
+        while not self.received:
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+
+    async def _get_transport(self) -> asyncio.DatagramTransport:
+        # The endpoint is created lazily, it needs a running loop and the
+        # socket may still have to be bound by its owner
+        async with self.transport_lock:
+            if self.transport is None:
+                loop = asyncio.get_running_loop()
+                await loop.create_datagram_endpoint(lambda: self, sock=self.sock)
+        assert self.transport is not None
+        return self.transport
+
+
+io_backend_mapping: Dict[str, Type[UDPSocket]] = {
+    "socket": UDPSocket,
+    "transport": UDPTransport,
+}
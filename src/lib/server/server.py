@@ -1,4 +1,5 @@
 import asyncio
+import multiprocessing
 from argparse import Namespace
 from asyncio.queues import Queue
 
@@ -17,8 +18,16 @@ class Server:
             self.config.verbose, self.config.quiet, self.config.log_file
         )
         self.flow_manager = FlowManager()
-        self.acceptor_skt = AcceptorSocket(
-            self.config.protocol_type, self.flow_manager, self.logger
+        self.acceptor_skt = self._create_acceptor()
+
+    def _create_acceptor(self) -> AcceptorSocket:
+        return AcceptorSocket(
+            self.config.protocol_type,
+            self.flow_manager,
+            self.logger,
+            self.config.mss,
+            self.config.io_backend,
+            self.config.shared_socket,
         )
 
     def run(self) -> None:
@@ -27,10 +36,50 @@ class Server:
             f"[Server] Host: {self.config.host}\n"
             f"[Server] Port: {self.config.port}\n"
             f"[Server] Storage folder dir path: {self.config.server_dirpath}\n"
-            f"[Server] Protocol: {self.config.protocol_type}"
+            f"[Server] Protocol: {self.config.protocol_type}\n"
+            f"[Server] Workers: {self.config.workers}"
         )
         self.logger.info("[Server] Starting server...")
 
+        if self.config.workers > 1:
+            self._run_workers()
+        else:
+            self._run_loop()
+
+    def _run_workers(self) -> None:
+        """
+        Forks one process per worker, each one serving its share of the
+        clients on the same port (SO_REUSEPORT) with its own event loop.
+        """
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=self._run_worker, args=(worker_id,))
+            for worker_id in range(self.config.workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            # Workers got the SIGINT too and are shutting down on their own
+            for worker in workers:
+                worker.join()
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+    def _run_worker(self, worker_id: int) -> None:
+        # The acceptor socket inherited from the parent is shared with the
+        # other workers, each one binds a socket of its own
+        self.flow_manager = FlowManager()
+        self.acceptor_skt = self._create_acceptor()
+        self.logger.debug(f"[Server] Worker {worker_id} started")
+        self._run_loop()
+
+    def _run_loop(self) -> None:
         loop = asyncio.get_event_loop()
 
         try:
@@ -48,7 +97,9 @@ class Server:
             loop.close()
 
     async def start_server(self) -> None:
-        self.acceptor_skt.bind(self.config.host, self.config.port)
+        self.acceptor_skt.bind(
+            self.config.host, self.config.port, reuse_port=self.config.workers > 1
+        )
         incoming_connections: Queue[ConnectionSocket] = asyncio.Queue()
 
         async def acceptor_callback() -> None:
@@ -1,3 +1,5 @@
+import sys
+
 from lib.client.client import Client
 from lib.common.args_parser import ArgsParser
 from lib.common.timer import timer
@@ -12,7 +14,8 @@ def upload() -> None:
         include_filename=True,
     )
     client = Client(args_parser.get_arguments(), "upload")
-    client.run()
+    if not client.run():
+        sys.exit(1)
     print(f"[UPLOAD] successfully uploaded {args_parser.get_arguments().name}.")
 
 
@@ -0,0 +1,96 @@
+import os
+import struct
+from pathlib import Path
+
+import pytest
+
+from lib.common.file_ops.batch import (
+    ENTRY_FORMAT,
+    _validate_path,
+    extract_batch,
+    list_files,
+    write_batch,
+)
+from lib.common.file_ops.file_manager import FILE_MODE
+
+FILES = {
+    "a.txt": b"first",
+    "empty": b"",
+    "sub/b.bin": bytes(range(256)) * 100,
+    "sub/deeper/c": b"third",
+}
+
+
+def make_tree(root: Path) -> None:
+    for path, data in FILES.items():
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_bytes(data)
+
+
+def test_round_trip(tmp_path: Path) -> None:
+    make_tree(tmp_path / "src")
+    (tmp_path / "src" / ".hidden").write_bytes(b"skipped")
+    assert write_batch(str(tmp_path / "src"), str(tmp_path / "batch")) == len(FILES)
+    assert extract_batch(str(tmp_path / "batch"), str(tmp_path / "dst")) == len(FILES)
+    assert list_files(str(tmp_path / "dst")) == sorted(FILES)
+    for path, data in FILES.items():
+        assert (tmp_path / "dst" / path).read_bytes() == data
+
+
+def test_extracted_file_mode(tmp_path: Path) -> None:
+    make_tree(tmp_path / "src")
+    write_batch(str(tmp_path / "src"), str(tmp_path / "batch"))
+    extract_batch(str(tmp_path / "batch"), str(tmp_path / "dst"))
+    umask = os.umask(0)
+    os.umask(umask)
+    assert (tmp_path / "dst" / "a.txt").stat().st_mode & 0o777 == FILE_MODE & ~umask
+
+
+def test_symbolic_links_are_skipped(tmp_path: Path) -> None:
+    make_tree(tmp_path / "src")
+    (tmp_path / "outside").write_bytes(b"secret")
+    (tmp_path / "src" / "link").symlink_to(tmp_path / "outside")
+    (tmp_path / "src" / "dir_link").symlink_to(tmp_path / "src" / "sub")
+    assert list_files(str(tmp_path / "src")) == sorted(FILES)
+
+
+def test_path_leaving_the_directory(tmp_path: Path) -> None:
+    name = b"../escaped"
+    batch = struct.pack(ENTRY_FORMAT, len(name), 4) + name + b"data"
+    (tmp_path / "batch").write_bytes(batch + struct.pack(ENTRY_FORMAT, 0, 0))
+    with pytest.raises(ValueError):
+        extract_batch(str(tmp_path / "batch"), str(tmp_path / "dst"))
+    assert not (tmp_path / "escaped").exists()
+
+
+def test_truncated_batch(tmp_path: Path) -> None:
+    make_tree(tmp_path / "src")
+    write_batch(str(tmp_path / "src"), str(tmp_path / "batch"))
+    batch = (tmp_path / "batch").read_bytes()
+    (tmp_path / "batch").write_bytes(batch[: len(batch) // 2])
+    with pytest.raises(ValueError):
+        extract_batch(str(tmp_path / "batch"), str(tmp_path / "dst"))
+
+
+@pytest.mark.parametrize("path", [b"a", b"dir/a", b"dir/sub/a.txt"])
+def test_valid_paths(path: bytes) -> None:
+    assert _validate_path(path) == os.path.join(*path.decode().split("/"))
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        b"/etc/passwd",
+        b"..",
+        b"../a",
+        b"dir/../../a",
+        b"dir/..",
+        b"./a",
+        b"dir//a",
+        b"dir/",
+        b"",
+    ],
+)
+def test_invalid_paths(path: bytes) -> None:
+    with pytest.raises(ValueError):
+        _validate_path(path)
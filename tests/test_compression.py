@@ -0,0 +1,123 @@
+import asyncio
+import io
+import random
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from lib.common.file_ops.compression import (
+    MAX_OUTPUT,
+    SAMPLE_SIZE,
+    Compressor,
+    Decompressor,
+    is_compressible,
+)
+from lib.common.file_ops.file_manager import FileManager, FileOperation
+from lib.common.skt.packet import Codec
+
+PACKET_SIZE = 1400
+TEXT = b"the quick brown fox jumps over the lazy dog\n" * 5000
+
+
+def random_bytes(size: int) -> bytes:
+    return random.Random(0).randbytes(size)
+
+
+def compress(data: bytes, codec: Codec, level: int = 6) -> List[bytes]:
+    """
+    Packet payloads of the compressed stream of data.
+    """
+    source = io.BytesIO(data)
+    compressor = Compressor(lambda: source.read(4096), codec, level)
+    buffer = memoryview(bytearray(PACKET_SIZE))
+    packets = []
+    while length := compressor.read_into(buffer):
+        packets.append(bytes(buffer[:length]))
+    return packets
+
+
+def decompress(packets: List[bytes]) -> bytes:
+    decompressor = Decompressor()
+    data = b"".join(
+        bytes(piece) for packet in packets for piece in decompressor.decompress(packet)
+    )
+    assert decompressor.is_done()
+    return data
+
+
+@pytest.mark.parametrize("codec", list(Codec))
+@pytest.mark.parametrize("data", [b"", b"x", TEXT, random_bytes(100_000)])
+def test_round_trip(codec: Codec, data: bytes) -> None:
+    packets = compress(data, codec)
+    # The stream starts with its codec
+    assert packets[0][0] == codec.value
+    assert decompress(packets) == data
+
+
+@pytest.mark.parametrize("codec", [Codec.ZLIB, Codec.LZMA])
+def test_compresses(codec: Codec) -> None:
+    assert sum(map(len, compress(TEXT, codec))) < len(TEXT) // 10
+
+
+@pytest.mark.parametrize("codec", [Codec.ZLIB, Codec.LZMA])
+def test_output_is_bounded(codec: Codec) -> None:
+    data = bytes(20 * MAX_OUTPUT)
+    decompressor = Decompressor()
+    size = 0
+    for packet in compress(data, codec, level=9):
+        for piece in decompressor.decompress(packet):
+            assert len(piece) <= MAX_OUTPUT
+            size += len(piece)
+    assert size == len(data)
+
+
+def test_corrupt_stream() -> None:
+    packets = compress(TEXT, Codec.ZLIB)
+    with pytest.raises(ValueError):
+        decompress([packets[0][:1] + b"\xff" * 10])
+
+
+def test_truncated_stream() -> None:
+    packets = compress(TEXT, Codec.LZMA)
+    decompressor = Decompressor()
+    for packet in packets[:-1]:
+        list(decompressor.decompress(packet))
+    assert not decompressor.is_done()
+
+
+def test_is_compressible() -> None:
+    assert is_compressible(TEXT, Codec.ZLIB, 6)
+    assert not is_compressible(random_bytes(SAMPLE_SIZE), Codec.ZLIB, 6)
+    assert not is_compressible(b"", Codec.ZLIB, 6)
+    assert not is_compressible(TEXT, Codec.NONE, 6)
+
+
+@pytest.mark.parametrize(
+    "data, codec",
+    [(TEXT, Codec.ZLIB), (random_bytes(200_000), Codec.NONE)],
+)
+def test_file_transfer(tmp_path: Path, data: bytes, codec: Codec) -> None:
+    """
+    Incompressible files are sent as they are, whatever the codec asked.
+    """
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "file").write_bytes(data)
+    reader = FileManager(str(tmp_path / "src"), "file", FileOperation.READ)
+    reader.set_compression(Codec.ZLIB, 6)
+    writer = FileManager(str(tmp_path / "dst"), "file", FileOperation.WRITE)
+    writer.set_compression(Codec.ZLIB, 6)
+
+    async def transfer() -> None:
+        first = True
+        while chunk := reader.read_chunk():
+            if first:
+                assert chunk[0] == codec.value
+                first = False
+            await writer.write_chunk(chunk)
+        await writer.flush()
+
+    asyncio.run(transfer())
+    reader.close()
+    writer.close()
+    assert (tmp_path / "dst" / "file").read_bytes() == data
@@ -0,0 +1,103 @@
+import time
+from typing import List, Type
+
+import pytest
+
+from lib.common.protocol.congestion_control import (
+    CUBIC_BETA,
+    INITIAL_CWND,
+    INITIAL_SSTHRESH,
+    MIN_SSTHRESH,
+    CongestionControl,
+    Cubic,
+    Reno,
+)
+
+
+@pytest.mark.parametrize("algorithm", [Reno, Cubic])
+def test_slow_start_doubles_every_window(algorithm: Type[CongestionControl]) -> None:
+    control = algorithm()
+    assert control.get_window() == INITIAL_CWND
+    for _ in range(4):
+        control.on_ack(control.get_window())
+    assert control.get_window() == 16 * INITIAL_CWND
+
+
+@pytest.mark.parametrize("algorithm", [Reno, Cubic])
+def test_timeout_restarts_slow_start(algorithm: Type[CongestionControl]) -> None:
+    control = algorithm()
+    control.on_ack(31)
+    control.on_timeout()
+    assert control.get_window() == INITIAL_CWND
+    assert control.in_slow_start()
+
+
+def test_reno_halves_on_triple_dup_ack() -> None:
+    reno = Reno()
+    reno.on_ack(31)
+    reno.on_triple_dup_ack()
+    assert reno.cwnd == reno.ssthresh == 16
+    assert not reno.in_slow_start()
+
+
+def test_reno_grows_one_packet_per_window() -> None:
+    reno = Reno()
+    reno.cwnd = reno.ssthresh = 10
+    reno.on_ack(10)
+    assert reno.cwnd == pytest.approx(11, abs=0.1)
+
+
+def test_ssthresh_has_a_floor() -> None:
+    reno = Reno()
+    reno.on_triple_dup_ack()
+    assert reno.ssthresh == MIN_SSTHRESH
+    assert reno.get_window() == MIN_SSTHRESH
+
+
+def test_window_is_whole_packets() -> None:
+    reno = Reno()
+    reno.cwnd = 0.5
+    assert reno.get_window() == 1
+    reno.cwnd = 7.9
+    assert reno.get_window() == 7
+
+
+def cubic_after_loss(elapsed: List[float]) -> Cubic:
+    """
+    Cubic that lost a packet at a window of 100, then gets one ACK at each
+    of elapsed (seconds since the first ACK after the loss).
+    """
+    cubic = Cubic()
+    cubic.cwnd = 100
+    cubic.on_triple_dup_ack()
+    cubic.on_ack(1)
+    for seconds in elapsed:
+        cubic.epoch_start = time.monotonic() - seconds
+        cubic.on_ack(1)
+    return cubic
+
+
+def test_cubic_reduces_by_beta() -> None:
+    cubic = Cubic()
+    cubic.cwnd = 100
+    cubic.on_triple_dup_ack()
+    assert cubic.cwnd == cubic.ssthresh == 100 * CUBIC_BETA
+    assert cubic.w_max == 100
+
+
+def test_cubic_plateaus_around_the_last_maximum() -> None:
+    # K, the time the curve takes back to w_max: (100 * (1 - beta) / C) ** (1/3)
+    cubic = cubic_after_loss([2.0, 4.0, 4.2])
+    assert cubic.k == pytest.approx(4.22, abs=0.01)
+    assert 70 < cubic.cwnd < 100
+
+
+def test_cubic_grows_past_the_plateau() -> None:
+    cubic = cubic_after_loss([10.0 + i for i in range(200)])
+    assert cubic.cwnd > 100
+
+
+def test_initial_ssthresh() -> None:
+    reno = Reno()
+    reno.on_ack(int(INITIAL_SSTHRESH))
+    assert not reno.in_slow_start()
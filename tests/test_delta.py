@@ -0,0 +1,100 @@
+import os
+import random
+from pathlib import Path
+from typing import Tuple
+
+import pytest
+
+from lib.common.file_ops import delta
+from lib.common.file_ops.delta import (
+    FILE_DIGEST_SIZE,
+    apply_delta,
+    write_delta,
+    write_signatures,
+)
+from lib.common.file_ops.file_manager import FILE_MODE
+
+
+def random_bytes(size: int, seed: int = 0) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+def sync(tmp_path: Path, basis: bytes | None, source: bytes) -> Tuple[int, int]:
+    """
+    Uploads source over basis (None if the server has no copy) through a
+    delta, returns how many bytes it reused and carried.
+    """
+    basis_path = tmp_path / "basis"
+    if basis is not None:
+        basis_path.write_bytes(basis)
+    (tmp_path / "source").write_bytes(source)
+    write_signatures(str(basis_path), str(tmp_path / "signatures"))
+    reused, sent = write_delta(
+        str(tmp_path / "source"), str(tmp_path / "signatures"), str(tmp_path / "delta")
+    )
+    size = apply_delta(str(basis_path), str(tmp_path / "delta"), str(basis_path))
+    assert size == len(source)
+    assert basis_path.read_bytes() == source
+    return reused, sent
+
+
+def test_unchanged_file_is_not_sent(tmp_path: Path) -> None:
+    data = random_bytes(300_000)
+    assert sync(tmp_path, data, data) == (len(data), 0)
+
+
+def test_only_changes_are_sent(tmp_path: Path) -> None:
+    basis = random_bytes(300_000)
+    source = basis[:1000] + b"inserted" + basis[1000:200_000] + basis[200_500:]
+    reused, sent = sync(tmp_path, basis, source + b"appended")
+    assert reused + sent == len(source) + len(b"appended")
+    assert sent < 10_000
+
+
+def test_rolling_is_bounded(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Past MAX_ROLL bytes without a match the blocks are still found, later
+    monkeypatch.setattr(delta, "MAX_ROLL", 4096)
+    monkeypatch.setattr(delta, "ROLL_SKIP", 2)
+    basis = random_bytes(300_000)
+    prefix = random_bytes(50_000, seed=1)
+    reused, sent = sync(tmp_path, basis, prefix + basis)
+    assert reused + sent == len(prefix) + len(basis)
+    assert sent < len(prefix) + 10_000
+
+
+def test_missing_basis_sends_everything(tmp_path: Path) -> None:
+    source = random_bytes(50_000)
+    assert sync(tmp_path, None, source) == (0, len(source))
+
+
+def test_empty_files(tmp_path: Path) -> None:
+    assert sync(tmp_path, b"", b"") == (0, 0)
+    assert sync(tmp_path, random_bytes(5000), b"") == (0, 0)
+
+
+def test_bad_digest_is_rejected(tmp_path: Path) -> None:
+    basis = random_bytes(100_000)
+    (tmp_path / "basis").write_bytes(basis)
+    (tmp_path / "source").write_bytes(random_bytes(100_000, seed=1))
+    write_signatures(str(tmp_path / "basis"), str(tmp_path / "signatures"))
+    write_delta(
+        str(tmp_path / "source"), str(tmp_path / "signatures"), str(tmp_path / "delta")
+    )
+    delta = bytearray((tmp_path / "delta").read_bytes())
+    delta[-FILE_DIGEST_SIZE] ^= 0xFF
+    (tmp_path / "delta").write_bytes(delta)
+
+    with pytest.raises(ValueError):
+        apply_delta(
+            str(tmp_path / "basis"), str(tmp_path / "delta"), str(tmp_path / "basis")
+        )
+    # The copy is left as it was, and no partial file behind
+    assert (tmp_path / "basis").read_bytes() == basis
+    assert sorted(os.listdir(tmp_path)) == ["basis", "delta", "signatures", "source"]
+
+
+def test_rebuilt_file_mode(tmp_path: Path) -> None:
+    sync(tmp_path, None, b"data")
+    umask = os.umask(0)
+    os.umask(umask)
+    assert (tmp_path / "basis").stat().st_mode & 0o777 == FILE_MODE & ~umask
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from lib.common.logger import Logger
+from lib.common.skt.connection_socket import FAST_OPEN_WINDOW, ConnectionSocket
+from lib.common.skt.packet import HeaderFlags, Packet, encode_file_request
+
+FLAGS = HeaderFlags.SR.value | HeaderFlags.DOWNLOAD.value
+
+
+async def server_socket(
+    queue: asyncio.Queue[Packet], request: Packet | None
+) -> ConnectionSocket:
+    return await ConnectionSocket.for_server(
+        ("127.0.0.1", 9), queue, HeaderFlags.SR, Logger(), request=request
+    )
+
+
+def test_window_is_capped_until_the_peer_answers() -> None:
+    async def answer() -> None:
+        queue: asyncio.Queue[Packet] = asyncio.Queue()
+        request = Packet(data=encode_file_request("file.bin", None), flags=FLAGS)
+        socket = await server_socket(queue, request)
+        assert socket.cap_window(8) == FAST_OPEN_WINDOW
+        assert socket.cap_window(1) == 1
+
+        # The SYN sent again does not tell the address is the peer's
+        await queue.put(Packet(flags=FLAGS | HeaderFlags.SYN.value))
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(socket.recv(), 0.05)
+        assert socket.cap_window(8) == FAST_OPEN_WINDOW
+
+        await queue.put(Packet(ack_num=1, flags=FLAGS | HeaderFlags.ACK.value))
+        await socket.recv()
+        assert socket.cap_window(8) == 8
+
+    asyncio.run(answer())
+
+
+def test_window_is_not_capped_without_fast_open() -> None:
+    async def plain() -> None:
+        socket = await server_socket(asyncio.Queue(), None)
+        assert socket.cap_window(8) == 8
+
+    asyncio.run(plain())
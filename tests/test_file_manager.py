@@ -0,0 +1,92 @@
+import asyncio
+import os
+from pathlib import Path
+from typing import List
+
+from lib.common.file_ops.file_manager import (
+    CHECKPOINT_SUFFIX,
+    PARTIAL_SUFFIX,
+    FileManager,
+    FileOperation,
+)
+from lib.common.skt.packet import FileIdentity
+
+IDENTITY: FileIdentity = (100, 1_700_000_000_000_000_000)
+
+
+def write(file_manager: FileManager, data: bytes, commit: bool) -> None:
+    async def transfer() -> None:
+        await file_manager.write_chunk(data)
+        await file_manager.flush()
+
+    asyncio.run(transfer())
+    file_manager.close(commit)
+
+
+def open_upload(
+    tmp_path: Path, identity: FileIdentity | None, resume: bool = True
+) -> FileManager:
+    return FileManager(
+        str(tmp_path), "file.bin", FileOperation.WRITE, resume=resume, identity=identity
+    )
+
+
+def test_failed_transfer_is_not_kept_without_resume(tmp_path: Path) -> None:
+    write(open_upload(tmp_path, None, resume=False), b"x" * 10, commit=False)
+    assert os.listdir(tmp_path) == []
+
+
+def test_resumed_transfer_continues_from_the_checkpoint(tmp_path: Path) -> None:
+    write(open_upload(tmp_path, IDENTITY), b"x" * 10, commit=False)
+    assert sorted(os.listdir(tmp_path)) == [
+        f".file.bin{PARTIAL_SUFFIX}",
+        f".file.bin{PARTIAL_SUFFIX}{CHECKPOINT_SUFFIX}",
+    ]
+
+    file_manager = open_upload(tmp_path, IDENTITY)
+    assert file_manager.get_offset() == 10
+    write(file_manager, b"y" * 5, commit=True)
+    assert (tmp_path / "file.bin").read_bytes() == b"x" * 10 + b"y" * 5
+    assert os.listdir(tmp_path) == ["file.bin"]
+
+
+def test_another_file_is_not_resumed(tmp_path: Path) -> None:
+    write(open_upload(tmp_path, IDENTITY), b"x" * 10, commit=False)
+    file_manager = open_upload(tmp_path, (IDENTITY[0], IDENTITY[1] + 1))
+    assert file_manager.get_offset() == 0
+    file_manager.close(commit=False)
+
+
+def test_identity_comes_from_the_checkpoint(tmp_path: Path) -> None:
+    # Downloads learn it from the server's answer, then resume with it
+    file_manager = open_upload(tmp_path, None)
+    file_manager.set_identity(IDENTITY)
+    write(file_manager, b"x" * 10, commit=False)
+    file_manager = open_upload(tmp_path, None)
+    assert file_manager.get_identity() == IDENTITY
+    assert file_manager.get_offset() == 10
+    file_manager.close(commit=False)
+
+
+def test_resumed_transfer_takes_the_partial_over(tmp_path: Path) -> None:
+    aborted: List[bool] = []
+    owner = open_upload(tmp_path, IDENTITY)
+    owner.set_abort_handler(lambda: aborted.append(True))
+
+    async def transfer() -> None:
+        await owner.write_chunk(b"x" * 10)
+        await owner.flush()
+
+    # Still writing, e.g. for a client that dropped
+    asyncio.run(transfer())
+
+    file_manager = open_upload(tmp_path, IDENTITY)
+    assert aborted == [True]
+    assert file_manager.get_offset() == 10
+    file_manager.close(commit=False)
+
+
+def test_commit_removes_the_leftover_partial(tmp_path: Path) -> None:
+    write(open_upload(tmp_path, IDENTITY), b"x" * 10, commit=False)
+    write(open_upload(tmp_path, None, resume=False), b"y" * 5, commit=True)
+    assert os.listdir(tmp_path) == ["file.bin"]
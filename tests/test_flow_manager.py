@@ -0,0 +1,59 @@
+import pytest
+
+from lib.common.flow_manager import FlowManager
+from lib.common.skt.packet import HeaderFlags, Packet
+
+FLOW = ("127.0.0.1", 5000)
+
+
+def data(seq_num: int) -> Packet:
+    return Packet(seq_num=seq_num, flags=HeaderFlags.GBN.value)
+
+
+def test_full_queue_drops_new_data() -> None:
+    flows = FlowManager(max_queue_size=2)
+    queue = flows.add_flow(FLOW)
+    assert [flows.demultiplex_packet(FLOW, data(n)) for n in range(3)] == [
+        True,
+        True,
+        False,
+    ]
+    assert [queue.get_nowait().get_seq_num() for _ in range(2)] == [0, 1]
+    stats = flows.get_stats(FLOW)
+    assert (stats.received, stats.dropped, stats.max_occupancy) == (3, 1, 2)
+
+
+def test_fin_evicts_the_oldest_packet() -> None:
+    flows = FlowManager(max_queue_size=2)
+    queue = flows.add_flow(FLOW)
+    for n in range(2):
+        flows.demultiplex_packet(FLOW, data(n))
+    fin = Packet(flags=HeaderFlags.GBN.value | HeaderFlags.FIN.value)
+    assert flows.demultiplex_packet(FLOW, fin)
+    assert queue.get_nowait().get_seq_num() == 1
+    assert queue.get_nowait().is_fin()
+    assert flows.get_stats(FLOW).dropped == 1
+
+
+def test_flows_are_bounded_on_their_own() -> None:
+    flows = FlowManager(max_queue_size=1)
+    other = ("127.0.0.1", 5001)
+    flows.add_flow(FLOW)
+    flows.add_flow(other)
+    flows.demultiplex_packet(FLOW, data(0))
+    assert not flows.demultiplex_packet(FLOW, data(1))
+    assert flows.demultiplex_packet(other, data(0))
+    assert flows.get_occupancy(FLOW) == flows.get_occupancy(other) == 1
+
+
+def test_unknown_and_duplicate_flows() -> None:
+    flows = FlowManager()
+    with pytest.raises(ValueError):
+        flows.demultiplex_packet(FLOW, data(0))
+    flows.add_flow(FLOW)
+    with pytest.raises(ValueError):
+        flows.add_flow(FLOW)
+    flows.remove_flow(FLOW)
+    assert not flows.does_flow_exist(FLOW)
+    with pytest.raises(ValueError):
+        flows.get_stats(FLOW)
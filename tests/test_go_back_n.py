@@ -0,0 +1,84 @@
+import asyncio
+
+from lib.common.args_parser import ArgsParser
+from lib.common.config import Config
+from lib.common.logger import Logger
+from lib.common.protocol.go_back_n import MAX_WINDOW_SIZE, GoBackN
+from lib.common.skt.connection_socket import ConnectionSocket
+from lib.common.skt.packet import MAX_SEQ_NUM, HeaderFlags, Packet
+from lib.common.skt.udp_socket import UDPSocket
+
+
+def config() -> Config:
+    parser = ArgsParser("", "", include_storage=True)
+    return Config(parser.parser.parse_args(["-H", "127.0.0.1", "-s", "."]), server=True)
+
+
+async def go_back_n(peer: UDPSocket) -> GoBackN:
+    """
+    Uploading GBN that sends to peer, with packets 1 to 4 in flight.
+    """
+    socket = await ConnectionSocket.for_server(
+        peer.sock.getsockname(), asyncio.Queue(), HeaderFlags.GBN, Logger()
+    )
+    gbn = GoBackN(socket, config(), Logger())
+    gbn._set_mode(HeaderFlags.UPLOAD)
+    for seq_num in range(1, 5):
+        gbn.unacked_pkts.append(Packet(seq_num=seq_num, flags=gbn.data_flags))
+    gbn.next_seq_num = 5
+    return gbn
+
+
+def test_sack_blocks_group_buffered_packets() -> None:
+    async def blocks() -> None:
+        gbn = await go_back_n(UDPSocket())
+        gbn.ack_num = 2
+        for seq_num in (6, 3, 4):
+            gbn.out_of_order[seq_num] = b"x"
+        assert gbn._sack_blocks() == [(3, 4), (6, 6)]
+
+        # Across the wrap around of the sequence numbers
+        gbn.ack_num = MAX_SEQ_NUM - 2
+        gbn.out_of_order = {seq_num: b"x" for seq_num in (1, 0, MAX_SEQ_NUM - 1)}
+        assert gbn._sack_blocks() == [(MAX_SEQ_NUM - 1, 1)]
+
+    asyncio.run(blocks())
+
+
+def test_sacked_packets_in_the_window_are_marked() -> None:
+    async def mark() -> None:
+        gbn = await go_back_n(UDPSocket())
+        gbn._mark_sacked([(2, 3), (MAX_WINDOW_SIZE + 10, MAX_WINDOW_SIZE + 11)])
+        assert gbn.sacked_seqs == {2, 3}
+        # Longer than any window, bogus
+        gbn._mark_sacked([(1, 0)])
+        assert gbn.sacked_seqs == {2, 3}
+
+    asyncio.run(mark())
+
+
+def test_only_the_first_hole_is_retransmitted() -> None:
+    async def retransmit() -> None:
+        peer = UDPSocket()
+        peer.bind("127.0.0.1", 0)
+        gbn = await go_back_n(peer)
+        gbn._mark_sacked([(1, 2)])
+        await gbn._retransmit_hole()
+        ((data, _),) = await peer.recv_batch()
+        assert Packet.from_bytes(data).get_seq_num() == 3
+
+    asyncio.run(retransmit())
+
+
+def test_acks_carry_the_sack_blocks() -> None:
+    async def ack() -> None:
+        peer = UDPSocket()
+        peer.bind("127.0.0.1", 0)
+        gbn = await go_back_n(peer)
+        gbn.ack_num = 2
+        gbn.out_of_order = {3: b"x", 4: b"x"}
+        await gbn._send_ack(1)
+        ((data, _),) = await peer.recv_batch()
+        assert Packet.from_bytes(data).get_sack_blocks() == [(3, 4)]
+
+    asyncio.run(ack())
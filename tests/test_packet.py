@@ -0,0 +1,189 @@
+import pytest
+
+from lib.common.skt.packet import (
+    CHECKSUM_SIZE,
+    EXTENDED_HEADER_SIZE,
+    HEADER_SIZE,
+    MAX_SEGMENT_SIZE,
+    MAX_SEQ_NUM,
+    MIN_SEGMENT_SIZE,
+    SACK_BLOCK_SIZE,
+    FileRequest,
+    HeaderFlags,
+    Packet,
+    SynOption,
+    decode_file_request,
+    decode_identity,
+    decode_offset,
+    encode_file_request,
+    encode_offset,
+    encode_sack_blocks,
+    encode_size_option,
+    encode_syn_options,
+    payload_buffer,
+    payload_view,
+)
+
+FLAGS = HeaderFlags.GBN.value | HeaderFlags.UPLOAD.value
+
+
+def payload(size: int) -> bytes:
+    return bytes(i % 251 for i in range(size))
+
+
+@pytest.mark.parametrize("size", [0, 1, 1022, 1023, 1024, 1464, MAX_SEGMENT_SIZE])
+def test_round_trip(size: int) -> None:
+    data = payload(size)
+    encoded = Packet(seq_num=7, ack_num=9, data=data, flags=FLAGS).to_bytes()
+    # Payloads of 1023 bytes or more need the extended length
+    expected_header = EXTENDED_HEADER_SIZE if size >= 1023 else HEADER_SIZE
+    assert len(encoded) == expected_header + size
+
+    packet = Packet.from_bytes(encoded)
+    assert packet.get_seq_num() == 7
+    assert packet.get_ack_num() == 9
+    assert packet.get_length() == size
+    assert packet.get_protocol_type() == HeaderFlags.GBN
+    assert packet.get_mode() == HeaderFlags.UPLOAD
+    assert bytes(packet.get_data()) == data
+
+
+@pytest.mark.parametrize("size", [10, 1023, 4000])
+def test_payload_buffer_encodes_like_to_bytes(size: int) -> None:
+    data = payload(size)
+    buffer = payload_buffer(size)
+    payload_view(buffer)[:size] = data
+    in_place = Packet.from_payload_buffer(buffer, size, seq_num=3, flags=FLAGS)
+    assert bytes(in_place.to_buffer()) == Packet(3, 0, data, FLAGS).to_bytes()
+
+
+def test_payload_too_large() -> None:
+    with pytest.raises(ValueError):
+        Packet(data=bytes(MAX_SEGMENT_SIZE + 1)).to_bytes()
+
+
+def test_truncated_extended_header() -> None:
+    encoded = Packet(data=bytes(2000)).to_bytes()
+    with pytest.raises(ValueError):
+        Packet.from_bytes(encoded[: HEADER_SIZE + 1])
+
+
+@pytest.mark.parametrize(
+    "announced, mss",
+    [(0, MIN_SEGMENT_SIZE), (1, MIN_SEGMENT_SIZE), (1464, 1464), (0xFFFF, 0xFFFF)],
+)
+def test_announced_mss_is_clamped(announced: int, mss: int) -> None:
+    options = encode_syn_options({SynOption.MSS: encode_size_option(announced)})
+    syn = Packet(data=options, flags=HeaderFlags.SYN.value)
+    assert syn.get_mss() == min(mss, MAX_SEGMENT_SIZE)
+
+
+def test_plain_file_request_is_the_name() -> None:
+    assert encode_file_request("file.bin") == b"file.bin"
+    assert decode_file_request(b"file.bin") == (
+        "file.bin",
+        None,
+        FileRequest.FILE,
+        None,
+        None,
+    )
+
+
+@pytest.mark.parametrize("offset", [0, 1, 123456789, 1 << 40])
+def test_resumed_file_request(offset: int) -> None:
+    data = encode_file_request("dir name.bin", offset)
+    assert decode_file_request(data) == (
+        "dir name.bin",
+        offset,
+        FileRequest.FILE,
+        None,
+        None,
+    )
+
+
+def test_resumed_file_request_with_identity() -> None:
+    identity = (1 << 33, 1_700_000_000_123_456_789)
+    data = encode_file_request("file.bin", 0, identity=identity)
+    assert decode_file_request(data) == (
+        "file.bin",
+        0,
+        FileRequest.FILE,
+        None,
+        identity,
+    )
+    with pytest.raises(ValueError):
+        decode_file_request(data[:-1])
+
+
+@pytest.mark.parametrize(
+    "kind", [FileRequest.SIGNATURES, FileRequest.DELTA, FileRequest.SIZE]
+)
+def test_file_request_kinds(kind: FileRequest) -> None:
+    data = encode_file_request("file.bin", request=kind)
+    assert decode_file_request(data) == ("file.bin", None, kind, None, None)
+
+
+def test_unknown_file_request_kind() -> None:
+    data = encode_file_request("file.bin", request=FileRequest.SIZE)
+    with pytest.raises(ValueError):
+        decode_file_request(data[:-1] + bytes([0xFF]))
+
+
+def test_offset_round_trip() -> None:
+    assert decode_offset(encode_offset(1 << 33)) == 1 << 33
+    # Plain filename ACKs carry no offset
+    assert decode_offset(b"") is None
+    assert decode_identity(encode_offset(1 << 33)) is None
+
+
+def test_offset_with_identity_round_trip() -> None:
+    data = encode_offset(12345, (1 << 40, 987654321))
+    assert decode_offset(data) == 12345
+    assert decode_identity(data) == (1 << 40, 987654321)
+
+
+def checksummed(packet: Packet) -> bytearray:
+    return bytearray(b"".join(packet.to_checksummed_buffers()))
+
+
+@pytest.mark.parametrize("size", [0, 100, 1020, 1464])
+def test_checksum_round_trip(size: int) -> None:
+    data = payload(size)
+    encoded = checksummed(Packet(seq_num=5, ack_num=6, data=data, flags=FLAGS))
+    packet = Packet.from_bytes(encoded)
+    assert packet.get_length() == size + CHECKSUM_SIZE
+    assert packet.strip_checksum()
+    assert bytes(packet.get_data()) == data
+    assert packet.get_length() == size
+
+
+@pytest.mark.parametrize("position", [0, 2, -CHECKSUM_SIZE - 1, -1])
+def test_checksum_detects_corruption(position: int) -> None:
+    # The flags, the sequence numbers, the payload and the checksum itself
+    encoded = checksummed(Packet(seq_num=5, ack_num=6, data=payload(100)))
+    encoded[position] ^= 0x10
+    assert not Packet.from_bytes(encoded).strip_checksum()
+
+
+def test_checksum_missing() -> None:
+    packet = Packet.from_bytes(Packet(data=b"ab").to_bytes())
+    assert not packet.strip_checksum()
+
+
+def test_sack_blocks_round_trip() -> None:
+    blocks = [(3, 4), (6, 6), (MAX_SEQ_NUM - 1, 1)]
+    ack = Packet(
+        ack_num=1, data=encode_sack_blocks(blocks), flags=FLAGS | HeaderFlags.ACK.value
+    )
+    assert Packet.from_bytes(ack.to_bytes()).get_sack_blocks() == blocks
+
+
+def test_sack_blocks_only_in_acks() -> None:
+    data = encode_sack_blocks([(3, 4)])
+    assert Packet(data=data, flags=FLAGS).get_sack_blocks() == []
+
+
+def test_truncated_sack_block_is_ignored() -> None:
+    data = encode_sack_blocks([(3, 4), (6, 6)])[: 2 * SACK_BLOCK_SIZE - 1]
+    ack = Packet(ack_num=1, data=data, flags=FLAGS | HeaderFlags.ACK.value)
+    assert ack.get_sack_blocks() == [(3, 4)]
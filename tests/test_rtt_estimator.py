@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from lib.common.args_parser import ArgsParser
+from lib.common.config import Config
+from lib.common.logger import Logger
+from lib.common.protocol.go_back_n import GoBackN
+from lib.common.protocol.rtt_estimator import (
+    INITIAL_RTO,
+    MAX_RTO,
+    MIN_RTO,
+    RTTEstimator,
+)
+from lib.common.skt.connection_socket import ConnectionSocket
+from lib.common.skt.packet import HeaderFlags, Packet
+
+
+def test_first_sample_sets_the_estimate() -> None:
+    rtt = RTTEstimator()
+    assert rtt.get_srtt() is None
+    assert rtt.get_rto() == INITIAL_RTO
+    rtt.add_sample(0.1)
+    assert rtt.get_srtt() == 0.1
+    # srtt + 4 * rttvar, rttvar starting at half the sample
+    assert rtt.get_rto() == pytest.approx(0.3)
+
+
+def test_samples_are_smoothed() -> None:
+    rtt = RTTEstimator()
+    rtt.add_sample(0.1)
+    rtt.add_sample(0.2)
+    srtt = 7 / 8 * 0.1 + 1 / 8 * 0.2
+    rttvar = 3 / 4 * 0.05 + 1 / 4 * 0.1
+    assert rtt.get_srtt() == pytest.approx(srtt)
+    assert rtt.get_rto() == pytest.approx(srtt + 4 * rttvar)
+
+
+def test_rto_is_clamped() -> None:
+    rtt = RTTEstimator()
+    rtt.add_sample(0.0001)
+    assert rtt.get_rto() == MIN_RTO
+    rtt = RTTEstimator()
+    rtt.add_sample(10.0)
+    assert rtt.get_rto() == MAX_RTO
+
+
+def test_backoff_doubles_up_to_the_maximum() -> None:
+    rtt = RTTEstimator()
+    rtos = []
+    for _ in range(10):
+        rtt.backoff()
+        rtos.append(rtt.get_rto())
+    assert rtos[:3] == pytest.approx(
+        [2 * INITIAL_RTO, 4 * INITIAL_RTO, 8 * INITIAL_RTO]
+    )
+    assert rtos[-1] == MAX_RTO
+
+
+def test_sample_discards_the_backoff() -> None:
+    rtt = RTTEstimator()
+    rtt.add_sample(0.01)
+    rto = rtt.get_rto()
+    rtt.backoff()
+    rtt.backoff()
+    rtt.add_sample(0.01)
+    assert rtt.get_rto() < rto
+
+
+def test_configured_bounds() -> None:
+    # RFC 6298's
+    rtt = RTTEstimator(1.0, 1.0, 60.0)
+    assert rtt.get_rto() == 1.0
+    rtt.add_sample(0.001)
+    assert rtt.get_rto() == 1.0
+    for _ in range(10):
+        rtt.backoff()
+    assert rtt.get_rto() == 60.0
+
+
+def config() -> Config:
+    parser = ArgsParser("", "", include_storage=True)
+    return Config(parser.parser.parse_args(["-H", "127.0.0.1", "-s", "."]), server=True)
+
+
+async def acknowledge(retransmit: bool) -> RTTEstimator:
+    """
+    Sends packets 1 and 2 over GBN, the first one again if retransmit, and
+    acknowledges both with one cumulative ACK.
+    """
+    queue: asyncio.Queue[Packet] = asyncio.Queue()
+    socket = await ConnectionSocket.for_server(
+        ("127.0.0.1", 9), queue, HeaderFlags.GBN, Logger()
+    )
+    gbn = GoBackN(socket, config(), Logger())
+    gbn._set_mode(HeaderFlags.UPLOAD)
+    for seq_num in (1, 2):
+        gbn.unacked_pkts.append(
+            Packet(seq_num=seq_num, data=b"x", flags=gbn.data_flags)
+        )
+        gbn.send_times[seq_num] = time.monotonic()
+    gbn.next_seq_num = 3
+    if retransmit:
+        await gbn._retransmit_hole()
+
+    await queue.put(Packet(ack_num=2, flags=gbn.ack_flags))
+    await gbn._process_acks()
+    gbn._stop_timer()
+    assert not gbn.unacked_pkts
+    return gbn.rtt
+
+
+def test_ack_is_sampled() -> None:
+    assert asyncio.run(acknowledge(retransmit=False)).get_srtt() is not None
+
+
+def test_ack_covering_a_retransmission_is_not_sampled() -> None:
+    # Karn's rule: the ACK may answer either copy of packet 1
+    assert asyncio.run(acknowledge(retransmit=True)).get_srtt() is None
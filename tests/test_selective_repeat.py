@@ -0,0 +1,68 @@
+import asyncio
+import os
+import socket
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from lib.client.client import Client
+from lib.common.args_parser import ArgsParser
+from lib.server.server import Server
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def transfer(server_dir: Path, client_dir: Path, mode: str, extra: List[str]) -> bool:
+    """
+    Serves server_dir over SR on the loopback and runs one client transfer
+    of file.bin in client_dir, with the extra client arguments. Returns
+    whether it completed.
+    """
+    common = ["-H", "127.0.0.1", "-p", str(free_port()), "-r", "SR", "-q"]
+    server_args = ArgsParser("", "", include_storage=True).parser.parse_args(
+        [*common, "-s", str(server_dir)]
+    )
+    client_args = ArgsParser(
+        "", "", include_destination=True, include_filename=True
+    ).parser.parse_args([*common, *extra, "-d", str(client_dir), "-n", "file.bin"])
+
+    async def run() -> bool:
+        serving = asyncio.create_task(Server(server_args).start_server())
+        # Bound once it first runs
+        await asyncio.sleep(0)
+        try:
+            return await Client(client_args, mode).start_client()
+        finally:
+            serving.cancel()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "extra", [[], ["--read-ahead", "0"], ["--checksum"], ["--fast-open"]]
+)
+def test_loopback_round_trip(tmp_path: Path, extra: List[str]) -> None:
+    server_dir, client_dir, download_dir = (
+        tmp_path / "server",
+        tmp_path / "client",
+        tmp_path / "download",
+    )
+    client_dir.mkdir()
+    # Several windows of packets, the last one partial
+    data = os.urandom(300_000 + 7)
+    (client_dir / "file.bin").write_bytes(data)
+
+    assert transfer(server_dir, client_dir, "upload", extra)
+    assert (server_dir / "file.bin").read_bytes() == data
+    assert transfer(server_dir, download_dir, "download", extra)
+    assert (download_dir / "file.bin").read_bytes() == data
+
+
+def test_missing_file_is_refused(tmp_path: Path) -> None:
+    assert not transfer(tmp_path / "server", tmp_path / "client", "download", [])
+    assert not (tmp_path / "client" / "file.bin").exists()
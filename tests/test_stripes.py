@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import pytest
+
+from lib.common.file_ops.stripes import (
+    complete_stripe,
+    fail_stripe,
+    staging_name,
+    stripe_range,
+)
+from lib.common.skt.packet import (
+    MAX_STRIPES,
+    FileRequest,
+    decode_file_request,
+    encode_file_request,
+)
+
+
+@pytest.mark.parametrize("size", [0, 1, 7, 1000, 1 << 20, (1 << 40) + 3])
+@pytest.mark.parametrize("count", [1, 2, 3, 8, 17])
+def test_stripes_cover_the_file(size: int, count: int) -> None:
+    ranges = [stripe_range(size, index, count) for index in range(count)]
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == size
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+    # As even as possible
+    lengths = [end - start for start, end in ranges]
+    assert max(lengths) - min(lengths) <= 1
+
+
+def test_stripe_request_round_trip() -> None:
+    stripe = (2, 5, 1 << 33, 0x1234_5678_9ABC_DEF0)
+    data = encode_file_request("big.bin", request=FileRequest.STRIPE, stripe=stripe)
+    assert decode_file_request(data) == (
+        "big.bin",
+        None,
+        FileRequest.STRIPE,
+        stripe,
+        None,
+    )
+
+
+@pytest.mark.parametrize("index, count", [(5, 5), (MAX_STRIPES, 1)])
+def test_invalid_stripe_request(index: int, count: int) -> None:
+    data = encode_file_request(
+        "big.bin", request=FileRequest.STRIPE, stripe=(index, count, 100, 1)
+    )
+    with pytest.raises(ValueError):
+        decode_file_request(data)
+
+
+def test_truncated_stripe_request() -> None:
+    data = encode_file_request(
+        "big.bin", request=FileRequest.STRIPE, stripe=(0, 2, 100, 1)
+    )
+    with pytest.raises(ValueError):
+        decode_file_request(data[:-1])
+
+
+def test_last_stripe_completes_the_file(tmp_path: Path) -> None:
+    staging = tmp_path / ".big.bin.stripes"
+    target = tmp_path / "big.bin"
+    # Stripes are written in place, the staging file may end up longer
+    staging.write_bytes(b"0123456789" + b"stale")
+    assert not complete_stripe(str(staging), str(target), 2, 3, 10)
+    assert not complete_stripe(str(staging), str(target), 0, 3, 10)
+    assert not target.exists()
+    assert complete_stripe(str(staging), str(target), 1, 3, 10)
+    assert target.read_bytes() == b"0123456789"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["big.bin"]
+
+
+def test_failed_stripe_removes_the_staging_file(tmp_path: Path) -> None:
+    staging = tmp_path / ".big.bin.stripes"
+    target = tmp_path / "big.bin"
+    staging.write_bytes(b"0123456789")
+    fail_stripe(str(staging), 1, 3)
+    assert not complete_stripe(str(staging), str(target), 0, 3, 10)
+    assert staging.exists()
+    # Once the others are done
+    assert not complete_stripe(str(staging), str(target), 2, 3, 10)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_staging_file_is_next_to_the_file() -> None:
+    assert staging_name("dir/big.bin", 1) == "dir/.big.bin.0000000000000001.stripes"
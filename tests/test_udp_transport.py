@@ -0,0 +1,24 @@
+import asyncio
+import errno
+
+import pytest
+
+from lib.common.skt.udp_transport import UDPTransport
+
+# Larger than any IPv4 datagram, always fails with EMSGSIZE
+OVERSIZED = 70_000
+
+
+def test_emsgsize_is_raised() -> None:
+    async def send() -> None:
+        transport = UDPTransport()
+        transport.bind("127.0.0.1", 0)
+        address = transport.sock.getsockname()
+        with pytest.raises(OSError) as e:
+            await transport.send_batch([([b"x" * OVERSIZED], address)])
+        assert e.value.errno == errno.EMSGSIZE
+        # Only the send that hit it
+        await transport.send_batch([([b"x"], address)])
+        assert await transport.recv_batch() == [(b"x", address)]
+
+    asyncio.run(send())